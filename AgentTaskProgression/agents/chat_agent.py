@@ -9,7 +9,6 @@ import json
 import threading
 import time
 import logging
-from concurrent.futures import ThreadPoolExecutor
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -50,9 +49,13 @@ Failure Handling
 - If any agent fails validation twice → re-plan from scratch
 """
 
-def chat_agent(message, api_url, model, api_provider="openai", token=None, context=None, execute_actions=True, conversation_history=None, on_tasks_update=None, on_phase_update=None, stop_event=None):
-    """Enhanced chat agent following the Agent Workflow Optimizer rules"""
-    from core.llm import call_llm
+def chat_agent(message, api_url, model, api_provider="openai", token=None, context=None, execute_actions=True, conversation_history=None, on_tasks_update=None, on_phase_update=None, stop_event=None, on_stream=None):
+    """Enhanced chat agent following the Agent Workflow Optimizer rules.
+
+    on_stream: optional callback receiving text deltas for general chat replies;
+    when given, the reply is streamed and the result carries "streamed": True.
+    """
+    from core.llm import call_llm, stream_llm
     
     if stop_event and stop_event.is_set():
         return {"response": "Task cancelled.", "status": "cancelled"}
@@ -89,6 +92,22 @@ def chat_agent(message, api_url, model, api_provider="openai", token=None, conte
     else:
         # Structured General Chat
         prompt = f"{SYSTEM_PROMPT}\n\nContext: {context if context else 'No context'}\nUser: {message}"
+        if on_stream:
+            chunks = []
+            for delta in stream_llm(prompt, api_url, model, api_provider, token, stop_event=stop_event, system_prompt=SYSTEM_PROMPT):
+                if stop_event and stop_event.is_set():
+                    break
+                chunks.append(delta)
+                on_stream(delta)
+            if stop_event and stop_event.is_set():
+                return {"response": "Task cancelled.", "status": "cancelled", "streamed": True}
+            return {
+                "response": "".join(chunks).strip(),
+                "actions_performed": [],
+                "requires_approval": False,
+                "streamed": True
+            }
+
         response = call_llm(prompt, api_url, model, api_provider, token, stop_event=stop_event, system_prompt=SYSTEM_PROMPT)
         
         return {
@@ -241,7 +260,8 @@ def apply_patch(filepath, original_content, patch_text, dry_run=False, backup_mg
 
 def handle_modification_request(message, context, api_url, model, api_provider, token, execute_actions=True, on_tasks_update=None, on_phase_update=None, stop_event=None):
     """Handle file modification requests using a 6-phase multi-agent pipeline"""
-    from core.llm import call_llm
+    from core.llm import call_llm, _resolve_tier_model
+    from core.token_budget import PromptBudget, PRIORITY_TASK, PRIORITY_CURRENT_FILE
     from utils.backup import BackupManager
     
     # Check for cancellation
@@ -325,7 +345,12 @@ def handle_modification_request(message, context, api_url, model, api_provider,
                     except: pass
                 break
 
-    file_preview = current_content[:8000] if len(current_content) > 8000 else current_content
+    # Give the current file whatever the planner model's context window leaves after the request
+    # (planner reply plus ~1k tokens of fixed instructions are reserved)
+    budget = PromptBudget(_resolve_tier_model(model, api_provider, "small"), api_provider, reserve_output=512 + 1024)
+    budget.add("task", message, PRIORITY_TASK)
+    budget.add("current_file", current_content, PRIORITY_CURRENT_FILE)
+    file_preview = budget.fit()[0].get("current_file", "")
     filename = os.path.basename(current_file)
 
     hardware_info = context.get("hardware_info", {})
@@ -542,7 +567,7 @@ def handle_modification_request(message, context, api_url, model, api_provider,
             target_files = [os.path.basename(f) for f in file_to_tasks.keys()]
             on_phase_update("Coding", f"💻 **PHASE 2: EXECUTION** (Attempt {loop_count}/{max_loops}, Tier: {current_tier})\nFiles: {', '.join(target_files)}")
 
-        def execute_task_group(file_path, task_list, tier, hardware_desc="CPU"):
+        def build_executor_prompt(file_path, task_list, hardware_desc="CPU"):
             # Read current content of the file
             content = ""
             if os.path.exists(file_path):
@@ -571,7 +596,7 @@ Instructions:
 """},
                 {"role": "user", "content": f"File: {file_path}\n\n[Current Content]\n```\n{content}\n```\n\n[Tasks to Perform]\n{json.dumps(task_list, indent=2)}\n\n[Context Request]\n{message}\n\n[Previous Failures]\n{json.dumps(failed_attempts[-2:], indent=2)}"}
             ]
-            return call_llm(executor_prompt, api_url, model, api_provider, token, stop_event=stop_event, system_prompt=SYSTEM_PROMPT, tier=tier)
+            return executor_prompt
 
         # Run executors in parallel for different files
         current_patches = {}
@@ -580,53 +605,62 @@ Instructions:
             current_tier = "large"
             continue
 
-        with ThreadPoolExecutor(max_workers=max(1, min(len(file_to_tasks), 4))) as pool:
-            future_to_file = {pool.submit(execute_task_group, f, ts, current_tier, hardware_desc): f for f, ts in file_to_tasks.items()}
-            for future in future_to_file:
-                path = future_to_file[future]
-                try:
-                    resp = future.result()
-                    
-                    # Parse patches from response
-                    if resp:
-                        logger.info(f"LLM Response length: {len(resp)}")
-                        if 'error' in resp.lower():
-                            logger.warning(f"LLM returned an error: {resp}")
-                    else:
-                        logger.warning(f"LLM returned empty response for {path}")
-                        continue
-                    
-                    # Robust patch extraction (matches working IDE)
-                    patch_pattern = r'<patch(?:\s+[^>]*?file=["\'](.*?)["\'][^>]*?)?\s*>(.*?)</patch>'
-                    patch_matches = list(re.finditer(patch_pattern, resp, re.DOTALL))
-                    found = False
-                    for m in patch_matches:
-                        p = m.group(1) or path
-                        if not os.path.isabs(p) and project_path:
-                            p = os.path.join(project_path, p)
-                        current_patches[p] = m.group(2).strip()
+        # Fan out one executor prompt per file concurrently on a single event loop
+        from core.llm_async import run_llm_batch
+        file_groups = list(file_to_tasks.items())
+        batch = [{
+            "prompt": build_executor_prompt(f, ts, hardware_desc),
+            "api_url": api_url,
+            "model": model,
+            "api_provider": api_provider,
+            "token": token,
+            "stop_event": stop_event,
+            "system_prompt": SYSTEM_PROMPT,
+            "tier": current_tier
+        } for f, ts in file_groups]
+        responses = run_llm_batch(batch, max_concurrency=8)
+        for (path, _), resp in zip(file_groups, responses):
+            try:
+                # Parse patches from response
+                if resp:
+                    logger.info(f"LLM Response length: {len(resp)}")
+                    if 'error' in resp.lower():
+                        logger.warning(f"LLM returned an error: {resp}")
+                else:
+                    logger.warning(f"LLM returned empty response for {path}")
+                    continue
+                
+                # Robust patch extraction (matches working IDE)
+                patch_pattern = r'<patch(?:\s+[^>]*?file=["\'](.*?)["\'][^>]*?)?\s*>(.*?)</patch>'
+                patch_matches = list(re.finditer(patch_pattern, resp, re.DOTALL))
+                found = False
+                for m in patch_matches:
+                    p = m.group(1) or path
+                    if not os.path.isabs(p) and project_path:
+                        p = os.path.join(project_path, p)
+                    current_patches[p] = m.group(2).strip()
+                    found = True
+                
+                if not found:
+                    # Fallback for full code in markdown blocks
+                    code_matches = re.findall(r'```(?:python|xml|patch|diff)?\n(.*?)\n```', resp, re.DOTALL)
+                    if code_matches:
+                        # Use the largest code block if multiple exist
+                        best_code = max(code_matches, key=len)
+                        current_patches[path] = best_code.strip()
                         found = True
                     
+                    # Fallback for raw code without tags if it's clearly code
                     if not found:
-                        # Fallback for full code in markdown blocks
-                        code_matches = re.findall(r'```(?:python|xml|patch|diff)?\n(.*?)\n```', resp, re.DOTALL)
-                        if code_matches:
-                            # Use the largest code block if multiple exist
-                            best_code = max(code_matches, key=len)
-                            current_patches[path] = best_code.strip()
+                        cleaned_resp = resp.strip()
+                        if "import " in cleaned_resp or "def " in cleaned_resp or "class " in cleaned_resp:
+                            current_patches[path] = cleaned_resp
+                            found = True
+                        elif "--- a/" in resp:
+                            current_patches[path] = resp
                             found = True
-                        
-                        # Fallback for raw code without tags if it's clearly code
-                        if not found:
-                            cleaned_resp = resp.strip()
-                            if "import " in cleaned_resp or "def " in cleaned_resp or "class " in cleaned_resp:
-                                current_patches[path] = cleaned_resp
-                                found = True
-                            elif "--- a/" in resp:
-                                current_patches[path] = resp
-                                found = True
-                except Exception as e:
-                    failed_attempts.append(f"Parallel executor error for {path}: {e}")
+            except Exception as e:
+                failed_attempts.append(f"Parallel executor error for {path}: {e}")
 
         if not current_patches:
             if on_phase_update:
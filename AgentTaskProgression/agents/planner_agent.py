@@ -1,8 +1,13 @@
 """
 Planner Agent - Project planning and architecture design
 """
+import json
+import re
 from core.base_agent import BaseAgent
 
+# Optional machine-readable step list at the end of a plan
+SUBTASK_BLOCK = re.compile(r"```json\s*(\{.*?\})\s*```", re.DOTALL)
+
 class PlannerAgent(BaseAgent):
     """Agent for project planning and architecture"""
     
@@ -17,13 +22,22 @@ class PlannerAgent(BaseAgent):
         system_prompt = """You are an expert software architect and project planner.
 Your job is to create detailed, actionable project plans based on requirements or image analysis results.
 Include: Architecture overview, file structure, key components, and implementation steps.
-Be specific and practical. Output in markdown format."""
+Be specific and practical. Output in markdown format.
+If the work splits into separate steps, end with a ```json block of the form
+{"subtasks": [{"id": "s1", "role": "coder", "task": "...", "files": ["app.py"], "depends_on": []}]}
+listing which steps depend on which, so independent steps can run in parallel.
+Each step is executed on its own: name in "files" only the files that step edits."""
 
         if is_image_completion:
             system_prompt += "\nThis task is based on an image analysis. Focus on the visual requirements and UI layout described."
 
-        response = self.call_model(task, system_prompt)
+        # Re-planning the same request reuses the stored plan
+        response = self.call_model(task, system_prompt, cache=True)
         
+        # Independent subtasks run in parallel through the scheduler; dependent ones wait
+        if self.orchestrator and self._schedule_subtasks(response):
+            return response
+
         # Send plan to coder if available
         if self.orchestrator:
             coder_name = self.orchestrator.find_agent_by_role("coder")
@@ -31,3 +45,47 @@ Be specific and practical. Output in markdown format."""
                 self.send_message(coder_name, f"PLAN_FOR_EXECUTION:\n{response}")
             
         return response
+
+    def _parse_subtasks(self, plan):
+        """Subtask dicts from the plan's trailing ```json block, or [] if absent/invalid"""
+        for block in reversed(SUBTASK_BLOCK.findall(plan or "")):
+            try:
+                data = json.loads(block)
+            except ValueError:
+                continue
+            steps = data.get("subtasks") if isinstance(data, dict) else None
+            if isinstance(steps, list) and all(isinstance(s, dict) and s.get("id") and s.get("task") for s in steps):
+                return steps
+        return []
+
+    def _schedule_subtasks(self, plan):
+        """Submit the plan's subtasks as a task graph; False to fall back to a single hand-off"""
+        steps = self._parse_subtasks(plan)
+        if len(steps) < 2 or not hasattr(self.orchestrator, "submit_task_graph"):
+            return False
+        specs = []
+        for step in steps:
+            role = str(step.get("role") or "coder").lower()
+            if not self.orchestrator.find_agent_by_role(role):
+                role = "coder"
+                if not self.orchestrator.find_agent_by_role(role):
+                    return False
+            # Only the step's own task and files: the coder edits every .py file its
+            # message names, so the full outline would send parallel steps to the same files
+            content = f"PLAN_FOR_EXECUTION (step {step['id']}):\n{step['task']}"
+            files = step.get("files") or ()
+            files = [files] if isinstance(files, str) else [str(f) for f in files if f]
+            if files:
+                content += "\n\nFiles: " + ", ".join(files)
+            specs.append({
+                "id": str(step["id"]),
+                "role": role,
+                "type": "plan_step",
+                "from": self.name,
+                "depends_on": [str(d) for d in step.get("depends_on") or ()],
+                "content": content
+            })
+        tasks = self.orchestrator.submit_task_graph(specs)
+        if tasks:
+            self.log(f"Scheduled {len(tasks)} plan steps")
+        return bool(tasks)
@@ -553,11 +553,35 @@ class AIDevIDE:
         self.top_progress = ttk.Progressbar(info_frame, variable=self.progress_var, length=100, mode='determinate')
         self.top_progress.pack(side="left", padx=5)
         
-        # Start status loop
-        self.update_status_loop()
+        # Initial status; later refreshes are event-driven (see request_status_refresh)
+        self.update_status_indicators()
 
-    def update_status_loop(self):
-        """Update status indicators periodically"""
+    def request_status_refresh(self):
+        """Coalesce status indicator refreshes; safe to call from worker threads"""
+        if getattr(self, '_status_refresh_pending', False) or not hasattr(self, 'root'):
+            return
+        self._status_refresh_pending = True
+        try:
+            self.root.after(100, self.update_status_indicators)
+        except Exception:
+            self._status_refresh_pending = False
+
+    def _subscribe_status_events(self):
+        """Refresh the indicators when LLM calls finish or agents change status"""
+        if not getattr(self, '_status_events_bound', False):
+            from core.telemetry import get_telemetry
+            get_telemetry().add_listener(lambda provider, model: self.request_status_refresh())
+            self._status_events_bound = True
+        orchestrator = getattr(getattr(self, 'agent_manager', None), 'orchestrator', None)
+        if orchestrator and hasattr(orchestrator, 'add_status_listener'):
+            orchestrator.add_status_listener(self._on_agent_status)
+
+    def _on_agent_status(self, agent):
+        self.request_status_refresh()
+
+    def update_status_indicators(self):
+        """Update status indicators (group, model, provider health)"""
+        self._status_refresh_pending = False
         try:
             # Update Group
             group = self.settings.get("last_agent_group", "Default")
@@ -581,6 +605,10 @@ class AIDevIDE:
             if len(model) > 20: model = model[:17] + "..."
             if hasattr(self, 'model_label'):
                 self.model_label.config(text=f"Model: {model}")
+
+            # Update provider health (rolling latency / circuit state)
+            if hasattr(self, 'health_label') and hasattr(self, 'ai_manager'):
+                self.health_label.config(text=self.ai_manager.get_health_summary())
             
             # Update Progress Bar (if active task)
             # This is a simple visual indicator for now
@@ -590,9 +618,11 @@ class AIDevIDE:
             
         except Exception:
             pass
-            
-        if hasattr(self, 'root'):
-            self.root.after(1000, self.update_status_loop)
+
+        try:
+            self._subscribe_status_events()
+        except Exception:
+            pass
 
     
     def setup_status_bar(self):
@@ -608,6 +638,10 @@ class AIDevIDE:
         _, model, _ = self.get_ai_settings(provider)
         self.provider_label = ttk.Label(self.status_frame, text=f"🤖 {provider.upper()}: {model[:15]}")
         self.provider_label.pack(side="left", padx=10)
+
+        # Provider latency / circuit health (filled by update_status_indicators)
+        self.health_label = ttk.Label(self.status_frame, text="")
+        self.health_label.pack(side="left", padx=10)
         
         # Line and column indicator
         self.position_label = ttk.Label(self.status_frame, text="Ln 1, Col 1")
@@ -923,7 +957,27 @@ class AIDevIDE:
                     self.settings["theme"] = self.theme_engine.create_dark_theme()
         
         save_settings(self.settings)
+
+        # Re-apply HTTP pool sizes / timeouts, response cache, rate limits, local model budget, breaker and ws rate
+        try:
+            from core.http_client import configure_client
+            from core.llm_cache import configure_llm_cache
+            from core.rate_limiter import configure_scheduler
+            from core.local_models import configure_model_registry
+            from core.telemetry import configure_telemetry
+            configure_client(self.settings)
+            configure_llm_cache(self.settings)
+            configure_scheduler(self.settings)
+            configure_model_registry(self.settings)
+            configure_telemetry(self.settings)
+            orchestrator = getattr(getattr(self, 'agent_manager', None), 'orchestrator', None)
+            if orchestrator:
+                orchestrator.configure_ws(self.settings)
+        except Exception:
+            pass
         
+        self.request_status_refresh()
+
         # Update status bar with correct model based on provider
         provider = self.ai_manager.get_active_provider() if hasattr(self, 'ai_manager') else self.settings.get("api_provider", "openai")
         if provider == "openai":
@@ -2282,6 +2336,16 @@ Please provide optimized version with explanations of changes made."""
                     phases_shown.append(phase)
                     if self.ai_panel:
                         self.root.after(0, lambda: self.ai_panel.add_chat_message(f"AI ({phase})", content))
+
+                # Stream general chat replies into the panel as tokens arrive
+                stream_started = []
+                def on_stream(delta):
+                    if not self.ai_panel:
+                        return
+                    if not stream_started:
+                        stream_started.append(True)
+                        self.root.after(0, lambda: self.ai_panel.begin_stream_message("AI"))
+                    self.root.after(0, lambda d=delta: self.ai_panel.stream_chunk(d))
                 
                 response = chat_agent(
                     message=message,
@@ -2293,10 +2357,13 @@ Please provide optimized version with explanations of changes made."""
                     execute_actions=self.settings.get("agent_auto_approve", False),
                     on_tasks_update=on_tasks_update,
                     on_phase_update=on_phase_update,
-                    stop_event=self.stop_event
+                    stop_event=self.stop_event,
+                    on_stream=on_stream if self.settings.get("stream_responses", True) else None
                 )
                 
-                if self.ai_panel and not phases_shown:
+                if self.ai_panel and stream_started:
+                    self.root.after(0, self.ai_panel.end_stream_message)
+                elif self.ai_panel and not phases_shown:
                     if isinstance(response, dict):
                         self.ai_panel.add_chat_message("AI", response.get("response", str(response)))
                     else:
@@ -3148,15 +3215,19 @@ Please provide optimized version with explanations of changes made."""
         if not file_path or not os.path.exists(file_path) or not getattr(self, 'linter', None):
             return
             
-        def worker():
-            try:
-                issues = self.linter.lint_file(file_path)
+        def on_issues(issues):      # Diagnostics worker thread
+            def show():
                 if self.output_panels:
-                    self.root.after(0, lambda: self.output_panels.update_problems(issues))
-            except Exception as e:
-                print(f"Linting error: {e}")
-            
-        threading.Thread(target=worker, daemon=True).start()
+                    self.output_panels.update_problems(issues)
+                if self.editor_tabs:
+                    self.editor_tabs.show_lint_issues(file_path, issues)
+            self.root.after(0, show)
+
+        from core.diagnostics import get_diagnostics
+        diagnostics = get_diagnostics()
+        if diagnostics.linter is None:
+            diagnostics.linter = self.linter
+        diagnostics.lint(file_path, on_issues)
 
     def stop_agent(self):
         """Stop current running AI agent task"""
@@ -3296,7 +3367,19 @@ Please provide optimized version with explanations of changes made."""
         # Stop hotkey manager
         if hasattr(self, 'hotkey_manager') and self.hotkey_manager:
             self.hotkey_manager.stop()
+
+        # Stop agents and release the shared agent worker pool
+        try:
+            orchestrator = getattr(getattr(self, 'agent_manager', None), 'orchestrator', None)
+            if orchestrator:
+                orchestrator.shutdown()
+        except Exception:
+            pass
         
+        # Write usage entries still buffered
+        if hasattr(self, 'ai_manager') and self.ai_manager:
+            self.ai_manager.flush_usage_logs()
+
         # Save current theme
         if self.theme_engine:
             self.settings["theme"] = self.theme_engine.color_map
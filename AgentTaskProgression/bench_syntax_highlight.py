@@ -0,0 +1,115 @@
+"""
+Benchmark utils.syntax_highlight against the previous one-regex-per-pattern implementation.
+
+    python bench_syntax_highlight.py [--lines 5000] [--repeat 3]
+
+Needs a display (a hidden Tk root is created), since the cost being measured is mostly Tk's.
+"""
+import argparse
+import json
+import os
+import re
+import time
+import tkinter as tk
+
+from utils.syntax_highlight import SyntaxHighlighter, PYTHON_KEYWORDS, PYTHON_BUILTINS
+
+
+class LegacySyntaxHighlighter(SyntaxHighlighter):
+    """The implementation before the single-pass scanner, kept verbatim for comparison"""
+
+    def highlight_python(self, event=None):
+        for tag in ["keyword", "string", "comment", "function", "number", "builtin"]:
+            self.text_widget.tag_remove(tag, "1.0", "end")
+        for keyword in PYTHON_KEYWORDS:
+            self.highlight_pattern(r'\b' + keyword + r'\b', "keyword")
+        self.highlight_pattern(r'"[^"\\]*(\\.[^"\\]*)*"', "string")
+        self.highlight_pattern(r"'[^'\\]*(\\.[^'\\]*)*'", "string")
+        self.highlight_pattern(r'"""[^"]*"""', "string", regex_flags=re.DOTALL)
+        self.highlight_pattern(r"'''[^']*'''", "string", regex_flags=re.DOTALL)
+        self.highlight_pattern(r'#.*$', "comment", regex_flags=re.MULTILINE)
+        self.highlight_pattern(r'\bdef\s+(\w+)', "function")
+        self.highlight_pattern(r'\b\d+\.?\d*\b', "number")
+        for builtin in PYTHON_BUILTINS:
+            self.highlight_pattern(r'\b' + builtin + r'\b', "builtin")
+
+    def highlight_json(self, event=None):
+        for tag in ["json_key", "json_string", "json_number", "json_boolean"]:
+            self.text_widget.tag_remove(tag, "1.0", "end")
+        self.highlight_pattern(r'"([^"]+)"\s*:', "json_key")
+        self.highlight_pattern(r':\s*"([^"]+)"', "json_string")
+        self.highlight_pattern(r':\s*(\d+\.?\d*)', "json_number")
+        self.highlight_pattern(r':\s*(true|false|null)', "json_boolean", regex_flags=re.IGNORECASE)
+
+    def highlight_markdown(self, event=None):
+        for tag in ["md_header", "md_bold", "md_italic", "md_code"]:
+            self.text_widget.tag_remove(tag, "1.0", "end")
+        self.highlight_pattern(r'^#+.+$', "md_header", regex_flags=re.MULTILINE)
+        self.highlight_pattern(r'\*\*.+?\*\*', "md_bold")
+        self.highlight_pattern(r'__.+?__', "md_bold")
+        self.highlight_pattern(r'\*.+?\*', "md_italic")
+        self.highlight_pattern(r'_.+?_', "md_italic")
+        self.highlight_pattern(r'`.+?`', "md_code")
+        self.highlight_pattern(r'```[\s\S]*?```', "md_code")
+
+    def highlight_pattern(self, pattern, tag, regex_flags=0):
+        text = self.text_widget.get("1.0", "end-1c")
+        for match in re.finditer(pattern, text, regex_flags):
+            self.text_widget.tag_add(tag, f"1.0+{match.start()}c", f"1.0+{match.end()}c")
+
+
+def sample_text(language, lines):
+    """Roughly `lines` lines of realistic content, built from files in this repo"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    if language == "python":
+        with open(os.path.join(here, "core", "agent_orchestrator.py"), encoding="utf-8") as f:
+            base = f.read()
+    elif language == "markdown":
+        with open(os.path.join(here, "README.md"), encoding="utf-8") as f:
+            base = f.read()
+    else:
+        base = json.dumps([{"name": f"agent{i}", "role": "coder", "temperature": 0.2 * i, "enabled": i % 2 == 0,
+                            "model": None, "tags": ["a", "b"]} for i in range(50)], indent=2)
+    base = base.rstrip("\n") + "\n"
+    copies = max(1, lines // max(1, base.count("\n")))
+    return base * copies
+
+
+def tagged_ranges(widget, tags):
+    return sum(len(widget.tag_ranges(tag)) // 2 for tag in tags)
+
+
+def run(lines, repeat):
+    root = tk.Tk()
+    root.withdraw()
+    methods = {"python": "highlight_python", "json": "highlight_json", "markdown": "highlight_markdown"}
+    from utils.syntax_highlight import LANGUAGE_TAGS
+    print(f"{'language':<10}{'lines':>8}{'legacy s':>11}{'single-pass s':>15}{'speedup':>9}{'ranges old/new':>17}")
+    for language, method in methods.items():
+        text = sample_text(language, lines)
+        results = []
+        for cls in (LegacySyntaxHighlighter, SyntaxHighlighter):
+            widget = tk.Text(root)
+            widget.insert("1.0", text)
+            highlighter = cls(widget)
+            best = None
+            for _ in range(repeat):
+                highlighter._snapshot = None    # Measure a full pass, not the unchanged-text shortcut
+                started = time.perf_counter()
+                getattr(highlighter, method)()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results.append((best, tagged_ranges(widget, LANGUAGE_TAGS[language])))
+            widget.destroy()
+        (old, old_ranges), (new, new_ranges) = results
+        print(f"{language:<10}{text.count(chr(10)):>8}{old:>11.3f}{new:>15.3f}{old / new:>8.1f}x"
+              f"{f'{old_ranges}/{new_ranges}':>17}")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the editor syntax highlighter")
+    parser.add_argument("--lines", type=int, default=5000, help="approximate lines per sample file")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per implementation (best is reported)")
+    args = parser.parse_args()
+    run(args.lines, args.repeat)
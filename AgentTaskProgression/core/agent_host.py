@@ -0,0 +1,540 @@
+"""
+Agent Host - Optional worker processes for CPU-heavy agents (crash-isolated, auto-restarted)
+"""
+import itertools
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+
+from core.base_agent import BaseAgent
+
+SHM_THRESHOLD = 64 * 1024       # str/bytes payloads larger than this travel through shared memory
+MAX_RESTARTS = 5                # Restarts allowed within RESTART_WINDOW before giving up
+RESTART_WINDOW = 60.0
+CHILD_WORKERS = 4               # Concurrent calls handled by one worker process
+CALL_TIMEOUT = 600.0            # Seconds a call waits for the worker's reply before failing
+
+# Calls whose return value agents never use; sent without waiting for a reply
+NOTIFY_METHODS = ("log", "log_ai", "log_ai_to_chat", "route_message")
+
+_ids = itertools.count(1)
+
+
+# --- Payload transfer ---
+def _portable(value, depth=0):
+    """Reduce value to something picklable (Task objects and the like become dicts or text)"""
+    if value is None or isinstance(value, (str, bytes, int, float, bool)):
+        return value
+    if depth > 8:
+        return repr(value)
+    if isinstance(value, dict):
+        return {k: _portable(v, depth + 1) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_portable(v, depth + 1) for v in value)
+    if hasattr(value, "to_dict"):
+        try:
+            return value.to_dict()
+        except Exception:
+            pass
+    return repr(value)
+
+
+def _pack(value, depth=0, blocks=None):
+    """
+    Move large str/bytes values (file contents, images) into shared memory blocks.
+    blocks: optional list collecting the created block names, so the sender can
+    unlink them if the receiver dies before attaching.
+    """
+    if isinstance(value, (str, bytes)) and len(value) > SHM_THRESHOLD:
+        from multiprocessing import shared_memory
+        data = value.encode("utf-8") if isinstance(value, str) else value
+        block = shared_memory.SharedMemory(create=True, size=len(data))
+        block.buf[:len(data)] = data
+        ref = {"__shm__": block.name, "size": len(data), "text": isinstance(value, str)}
+        block.close()
+        if blocks is not None:
+            blocks.append(block.name)
+        return ref
+    if depth < 4 and isinstance(value, dict):
+        return {k: _pack(v, depth + 1, blocks) for k, v in value.items()}
+    if depth < 4 and isinstance(value, (list, tuple)):
+        return type(value)(_pack(v, depth + 1, blocks) for v in value)
+    return value
+
+
+def _unlink_blocks(names):
+    """Unlink shared memory blocks the receiver never attached to (already gone is fine)"""
+    from multiprocessing import shared_memory
+    for name in names:
+        try:
+            block = shared_memory.SharedMemory(name=name)
+        except (FileNotFoundError, OSError):
+            continue
+        block.close()
+        try:
+            block.unlink()
+        except (FileNotFoundError, OSError):
+            pass
+
+
+def _unpack(value, depth=0):
+    """Inverse of _pack; the receiver copies the block out and unlinks it"""
+    if isinstance(value, dict):
+        if "__shm__" in value and len(value) == 3:
+            from multiprocessing import shared_memory
+            block = shared_memory.SharedMemory(name=value["__shm__"])
+            try:
+                data = bytes(block.buf[:value["size"]])
+            finally:
+                block.close()
+                block.unlink()
+            return data.decode("utf-8") if value["text"] else data
+        if depth < 4:
+            return {k: _unpack(v, depth + 1) for k, v in value.items()}
+    if depth < 4 and isinstance(value, (list, tuple)):
+        return type(value)(_unpack(v, depth + 1) for v in value)
+    return value
+
+
+# --- Child side ---
+class _RemoteProxy:
+    """Stands in for an orchestrator/app attribute in the worker; calls go back to the IDE process"""
+
+    def __init__(self, channel, target, path=()):
+        object.__setattr__(self, "_channel", channel)
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_path", tuple(path))
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _RemoteProxy(self._channel, self._target, self._path + (name,))
+
+    def __setattr__(self, name, value):
+        self._channel.rpc(self._target, self._path, "setattr", (name, value), notify=True)
+
+    def __call__(self, *args, **kwargs):
+        notify = bool(self._path) and self._path[-1] in NOTIFY_METHODS
+        return self._channel.rpc(self._target, self._path, "call", args, kwargs, notify=notify)
+
+
+class _RemoteApp(_RemoteProxy):
+    """IDE app as seen from a worker: settings/project_path snapshots, a local stop_event, no Tk root"""
+
+    def __init__(self, channel):
+        super().__init__(channel, "app")
+        object.__setattr__(self, "settings", {})
+        object.__setattr__(self, "project_path", None)
+        object.__setattr__(self, "stop_event", threading.Event())
+
+    def __getattr__(self, name):
+        if name == "root":
+            raise AttributeError(name)  # Tk widgets cannot be driven from another process
+        return super().__getattr__(name)
+
+
+class _RemoteOrchestrator(_RemoteProxy):
+    """Orchestrator as seen from a worker: snapshot attributes plus RPC for everything else"""
+
+    def __init__(self, channel):
+        super().__init__(channel, "orchestrator")
+        object.__setattr__(self, "app", _RemoteApp(channel))
+        object.__setattr__(self, "agents", {})
+        object.__setattr__(self, "shared_history", [])
+        object.__setattr__(self, "approval_required", True)
+
+    def sync(self, snapshot):
+        object.__setattr__(self, "agents", dict.fromkeys(snapshot.get("agents", ())))
+        object.__setattr__(self, "shared_history", snapshot.get("shared_history", []))
+        object.__setattr__(self, "approval_required", snapshot.get("approval_required", True))
+        object.__setattr__(self.app, "settings", snapshot.get("settings", {}))
+        object.__setattr__(self.app, "project_path", snapshot.get("project_path"))
+        if snapshot.get("stopped"):
+            self.app.stop_event.set()
+        else:
+            self.app.stop_event.clear()
+
+
+class _ChildChannel:
+    def __init__(self, conn):
+        self.conn = conn
+        self._send_lock = threading.Lock()
+        self._pending = {}
+
+    def send(self, message):
+        with self._send_lock:
+            self.conn.send(message)
+
+    def rpc(self, target, path, kind, args=(), kwargs=None, notify=False):
+        call_id = next(_ids)
+        future = None
+        if not notify:
+            future = Future()
+            self._pending[call_id] = future
+        self.send({"op": "rpc", "id": call_id, "target": target, "path": path, "kind": kind,
+                   "args": _pack(_portable(args)), "kwargs": _pack(_portable(kwargs or {})), "notify": notify})
+        if future is None:
+            return None
+        reply = future.result()
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return _unpack(reply.get("result"))
+
+    def resolve(self, message):
+        future = self._pending.pop(message["id"], None)
+        if future is not None:
+            future.set_result(message)
+
+
+def _host_main(conn, key):
+    """Worker process entry point: builds agents on request and runs their calls"""
+    import importlib
+    channel = _ChildChannel(conn)
+    orchestrator = _RemoteOrchestrator(channel)
+    agents = {}
+    pool = ThreadPoolExecutor(max_workers=CHILD_WORKERS, thread_name_prefix=f"host-{key}")
+
+    def run_call(message):
+        reply = {"op": "result", "id": message["id"]}
+        try:
+            agent = agents[message["agent"]]
+            orchestrator.sync(message.get("snapshot", {}))
+            for attr, value in message.get("attrs", {}).items():
+                setattr(agent, attr, value)
+            result = getattr(agent, message["method"])(*_unpack(message["args"]))
+            reply["result"] = _pack(_portable(result))
+        except Exception as e:
+            reply["error"] = f"{type(e).__name__}: {e}"
+        channel.send(reply)
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        op = message.get("op")
+        if op == "call":
+            pool.submit(run_call, message)
+        elif op == "reply":
+            channel.resolve(message)
+        elif op == "add":
+            spec = message["spec"]
+            try:
+                module = importlib.import_module(spec["module"])
+                agent_class = getattr(module, spec["class"])
+                agents[spec["name"]] = agent_class(name=spec["name"], role=spec["role"],
+                                                   model_provider=spec["provider"],
+                                                   model_name=spec["model"], orchestrator=orchestrator)
+            except Exception as e:
+                print(f"[AgentHost:{key}] Failed to create agent {spec.get('name')}: {e}")
+        elif op == "remove":
+            agents.pop(message["name"], None)
+        elif op == "cancel":
+            orchestrator.app.stop_event.set()
+        elif op == "stop":
+            break
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+# --- IDE side ---
+class AgentProcessHost:
+    """
+    One worker process running one or more agents (per agent, or shared by a role).
+
+    Calls are sent over a duplex pipe; the worker's agents reach the orchestrator and app
+    through RPC back to this process. Large strings/bytes go through shared memory. If
+    the worker dies, in-flight calls fail with an "Error: ..." result and the process is
+    restarted with backoff (up to MAX_RESTARTS per RESTART_WINDOW).
+    """
+
+    def __init__(self, key, orchestrator):
+        self.key = key
+        self.orchestrator = orchestrator
+        self._specs = {}            # agent name -> spec dict
+        self._pending = {}          # call id -> Future
+        self._blocks = {}           # call id -> shared memory blocks its args were packed into
+        self._reply_blocks = deque(maxlen=256)  # Blocks of RPC replies the worker may not have read yet
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._rpc_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix=f"rpc-{key}")
+        self._restarts = deque()
+        self._process = None
+        self._conn = None
+        self._closed = False
+        self._gave_up = False
+
+    # --- Lifecycle ---
+    def _ensure_started(self):
+        with self._lock:
+            if self._closed or self._gave_up:
+                return False
+            if self._process is not None and self._process.is_alive():
+                return True
+            ctx = multiprocessing.get_context("spawn")  # fork is unsafe with Tk and threads
+            parent_conn, child_conn = ctx.Pipe(duplex=True)
+            process = ctx.Process(target=_host_main, args=(child_conn, self.key),
+                                  name=f"agent-host-{self.key}", daemon=True)
+            process.start()
+            child_conn.close()
+            self._process, self._conn = process, parent_conn
+            for spec in self._specs.values():
+                parent_conn.send({"op": "add", "spec": spec})
+            threading.Thread(target=self._reader, args=(process, parent_conn),
+                             name=f"host-reader-{self.key}", daemon=True).start()
+            self._log(f"Worker process started (pid {process.pid}) for {', '.join(self._specs) or 'no agents'}")
+            return True
+
+    def _send(self, message):
+        with self._send_lock:
+            self._conn.send(message)
+
+    def add_agent(self, agent):
+        spec = {"module": agent.module_name, "class": agent.class_name, "name": agent.name,
+                "role": agent.role, "provider": agent.model_provider, "model": agent.model_name}
+        with self._lock:
+            self._specs[agent.name] = spec
+            running = self._process is not None and self._process.is_alive()
+        if running:
+            self._send({"op": "add", "spec": spec})
+
+    def remove_agent(self, name):
+        with self._lock:
+            self._specs.pop(name, None)
+            running = self._process is not None and self._process.is_alive()
+            empty = not self._specs
+        if running:
+            try:
+                self._send({"op": "remove", "name": name})
+            except Exception:
+                pass
+        if empty:
+            self.close()
+        return empty
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            process, conn = self._process, self._conn
+        if conn is not None:
+            try:
+                self._send({"op": "stop"})
+            except Exception:
+                pass
+        if process is not None:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self._rpc_pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- Calls ---
+    def _snapshot(self):
+        orch = self.orchestrator
+        app = getattr(orch, "app", None)
+        stop_event = getattr(app, "stop_event", None)
+        return {
+            "agents": list(getattr(orch, "agents", {})),
+            "shared_history": list(getattr(orch, "shared_history", [])[-10:]),
+            "approval_required": getattr(orch, "approval_required", True),
+            "settings": dict(getattr(app, "settings", {}) or {}),
+            "project_path": getattr(app, "project_path", None),
+            "stopped": bool(stop_event is not None and stop_event.is_set())
+        }
+
+    def call(self, agent, method, args):
+        """Run agent.<method>(*args) in the worker; returns the result or an "Error: ..." string"""
+        if not self._ensure_started():
+            return f"Error: Agent process for '{self.key}' is not available"
+        call_id = next(_ids)
+        future = Future()
+        blocks = []
+        with self._lock:
+            # Under the lock _on_exit swaps _pending with: a worker that died already
+            # would otherwise never fail this call
+            if self._process is None:
+                return f"Error: Agent process for '{self.key}' is not available"
+            self._pending[call_id] = future
+            self._blocks[call_id] = blocks
+        attrs = {"model_provider": agent.model_provider, "model_name": agent.model_name,
+                 "_manual_token": agent._manual_token}
+        try:
+            self._send({"op": "call", "id": call_id, "agent": agent.name, "method": method,
+                        "args": _pack(_portable(args), blocks=blocks), "attrs": attrs, "snapshot": self._snapshot()})
+        except Exception as e:
+            self._forget_call(call_id)
+            return f"Error: Could not reach agent process '{self.key}': {e}"
+        stop_event = getattr(getattr(self.orchestrator, "app", None), "stop_event", None)
+        cancel_sent = False
+        deadline = time.monotonic() + CALL_TIMEOUT
+        while True:
+            try:
+                reply = future.result(timeout=0.25)
+                break
+            except FutureTimeout:
+                if time.monotonic() >= deadline:
+                    self._forget_call(call_id)
+                    return f"Error: Agent process '{self.key}' did not answer within {int(CALL_TIMEOUT)}s"
+                if not cancel_sent and stop_event is not None and stop_event.is_set():
+                    cancel_sent = True
+                    try:
+                        self._send({"op": "cancel"})
+                    except Exception:
+                        pass
+        if "error" in reply:
+            return f"Error: {reply['error']}"
+        return _unpack(reply.get("result"))
+
+    def _forget_call(self, call_id):
+        """Drop a call that will get no reply; unlink argument blocks the worker never read"""
+        with self._lock:
+            self._pending.pop(call_id, None)
+            blocks = self._blocks.pop(call_id, ())
+        _unlink_blocks(blocks)
+
+    # --- Worker messages ---
+    def _reader(self, process, conn):
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                break
+            op = message.get("op")
+            if op == "result":
+                with self._lock:
+                    future = self._pending.pop(message["id"], None)
+                    self._blocks.pop(message["id"], None)   # The worker unpacked (and unlinked) them
+                if future is not None:
+                    future.set_result(message)
+            elif op == "rpc":
+                self._rpc_pool.submit(self._serve_rpc, message)
+        process.join(timeout=1)
+        self._on_exit(process)
+
+    def _serve_rpc(self, message):
+        reply = {"op": "reply", "id": message["id"]}
+        try:
+            obj = self.orchestrator if message["target"] == "orchestrator" else self.orchestrator.app
+            path = list(message["path"])
+            if message["kind"] == "setattr":
+                for name in path:
+                    obj = getattr(obj, name)
+                name, value = _unpack(message["args"])
+                setattr(obj, name, value)
+                result = None
+            else:
+                for name in path:
+                    obj = getattr(obj, name)
+                result = obj(*_unpack(message["args"]), **_unpack(message["kwargs"]))
+            blocks = []
+            reply["result"] = _pack(_portable(result), blocks=blocks)
+            self._reply_blocks.extend(blocks)
+        except Exception as e:
+            reply["error"] = f"{type(e).__name__}: {e}"
+        if not message.get("notify"):
+            try:
+                self._send(reply)
+            except Exception:
+                pass
+
+    def _on_exit(self, process):
+        with self._lock:
+            if self._process is not process:
+                return
+            self._process = None
+            closed = self._closed
+            pending, self._pending = self._pending, {}
+            blocks, self._blocks = self._blocks, {}
+            replies = list(self._reply_blocks)
+            self._reply_blocks.clear()
+        # Payloads the dead worker never attached to would stay in shared memory
+        _unlink_blocks([name for names in blocks.values() for name in names] + replies)
+        code = process.exitcode
+        for future in pending.values():
+            future.set_result({"error": f"Agent process '{self.key}' exited (code {code})"})
+        if closed:
+            return
+        now = time.monotonic()
+        self._restarts.append(now)
+        while self._restarts and now - self._restarts[0] > RESTART_WINDOW:
+            self._restarts.popleft()
+        if len(self._restarts) > MAX_RESTARTS:
+            self._gave_up = True
+            self._log(f"Worker process crashed {len(self._restarts)} times in {int(RESTART_WINDOW)}s; not restarting")
+            return
+        delay = min(30.0, 0.5 * 2 ** (len(self._restarts) - 1))
+        self._log(f"Worker process exited (code {code}); restarting in {delay:.1f}s")
+        timer = threading.Timer(delay, self._ensure_started)
+        timer.daemon = True
+        timer.start()
+
+    def stats(self):
+        process = self._process
+        return {"key": self.key, "agents": list(self._specs), "pid": process.pid if process else None,
+                "alive": bool(process and process.is_alive()), "restarts": len(self._restarts),
+                "pending": len(self._pending), "gave_up": self._gave_up}
+
+    def _log(self, message):
+        try:
+            self.orchestrator.log(f"[AgentHost:{self.key}] {message}")
+        except Exception:
+            print(f"[AgentHost:{self.key}] {message}")
+
+
+class ProcessAgent(BaseAgent):
+    """
+    IDE-side stand-in for an agent whose process()/receive_message() run in a worker.
+
+    Queueing, status, the scheduler and build_model_request behave as for a threaded
+    agent; only the work itself (and its GIL time) moves to the worker process.
+    """
+
+    def __init__(self, module_name, class_name, name, role, model_provider, model_name,
+                 orchestrator=None, host_key=None):
+        super().__init__(name, role, model_provider, model_name, orchestrator)
+        self.module_name = module_name
+        self.class_name = class_name
+        self.isolation = "role" if host_key and host_key.startswith("role:") else "process"
+        self.host = get_agent_host(host_key or name, orchestrator)
+        self.host.add_agent(self)
+
+    def receive_message(self, from_agent, content):
+        self.history.append({"from": from_agent, "content": content, "timestamp": datetime.now().isoformat()})
+        return self.host.call(self, "receive_message", (from_agent, content))
+
+    def process(self, task):
+        return self.host.call(self, "process", (task,))
+
+    def close(self):
+        """Detach from the worker (stopping it when no other agent uses it)"""
+        self.host.remove_agent(self.name)
+
+    def to_dict(self):
+        data = super().to_dict()
+        data["isolation"] = self.isolation
+        data["pid"] = self.host.stats()["pid"]
+        return data
+
+
+_HOSTS = {}
+_HOSTS_LOCK = threading.Lock()
+
+
+def get_agent_host(key, orchestrator):
+    """Shared host for key (an agent name, or "role:<role>" for per-role workers)"""
+    with _HOSTS_LOCK:
+        host = _HOSTS.get(key)
+        if host is None or host._closed:
+            host = AgentProcessHost(key, orchestrator)
+            _HOSTS[key] = host
+        return host
+
+
+def shutdown_agent_hosts():
+    """Stop every worker process (application exit)"""
+    with _HOSTS_LOCK:
+        hosts = list(_HOSTS.values())
+        _HOSTS.clear()
+    for host in hosts:
+        host.close()
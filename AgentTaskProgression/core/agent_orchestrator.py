@@ -1,44 +1,19 @@
 """
 Agent Orchestrator - Manages agent lifecycle and inter-agent communication
 """
+import json
 import threading
-import queue
+from collections import deque
 from datetime import datetime
-from collections import defaultdict
 
-class MessageBus:
-    """Pub/sub message bus for agent communication"""
-    
-    def __init__(self):
-        self.subscribers = defaultdict(list)  # topic -> [callbacks]
-        self.message_log = []
-        self._lock = threading.Lock()
-        
-    def subscribe(self, topic, callback):
-        """Subscribe to a topic"""
-        with self._lock:
-            self.subscribers[topic].append(callback)
-            
-    def unsubscribe(self, topic, callback):
-        """Unsubscribe from a topic"""
-        with self._lock:
-            if callback in self.subscribers[topic]:
-                self.subscribers[topic].remove(callback)
-                
-    def publish(self, topic, message):
-        """Publish message to topic"""
-        with self._lock:
-            self.message_log.append({
-                "topic": topic,
-                "message": message,
-                "timestamp": datetime.now().isoformat()
-            })
-            for callback in self.subscribers[topic]:
-                try:
-                    callback(message)
-                except Exception as e:
-                    print(f"MessageBus error: {e}")
+from core.message_bus import MessageBus, BLOCK
+from core.history_journal import HistoryJournal, HistoryWindow
+from core.task_scheduler import TaskScheduler
+from core.group_context import GroupContext
+from core.agent_pool import AgentGroupPool, agent_class as _agent_class, agent_spec, item_spec, validate_group_config
+from core.metrics import get_metrics, get_tracer
 
+SHARED_HISTORY_SIZE = 100
 
 class AgentOrchestrator:
     """Manages agent lifecycle and task distribution"""
@@ -47,13 +22,16 @@ class AgentOrchestrator:
         self.app = app
         self.agents = {}  # name -> agent instance
         self.message_bus = MessageBus()
-        self.task_queue = queue.PriorityQueue()
-        self.logs = []
+        self.logs = deque(maxlen=1000)  # Formatted log lines
+        self.log_records = deque(maxlen=1000)  # Structured: time, agent, message, trace_id
         self._running = False
         self._thread = None
         
         # Callbacks for UI updates
         self.on_agent_status_change = None
+        self._status_listeners = []  # fn(agent), called from executor workers on status change
+        self.scheduler = TaskScheduler(self)  # Dispatches submit_task() work to agents
+        self._register_gauges()
         self.on_log = None
         self.agent_monitor = None  # Reference to AgentMonitor window
         
@@ -61,11 +39,13 @@ class AgentOrchestrator:
         self.approval_required = True  # User must approve before agents execute
         self.pending_approvals = []  # Tasks waiting for approval
         self.on_approval_needed = None  # Callback when approval dialog needed
-        self.shared_history = []  # Global conversation history for current agent group
+        self.shared_history = HistoryWindow(maxlen=SHARED_HISTORY_SIZE)  # Global conversation history for current agent group
+        self._journal = None  # HistoryJournal backing shared_history on disk
+        self.group_context = GroupContext(summarizer=self._summarize_context)  # Rolling summary agents share
         self.current_group_name = None
-        # Optional WebSocket broadcasting
-        self._ws_clients = set()
-        self._ws_server_thread = None
+        self._group_pool = AgentGroupPool()  # Parked agent groups for fast switching back
+        # Optional WebSocket broadcasting (snapshot + deltas, see core.ws_broadcast)
+        self._broadcaster = None
         try:
             self.start_ws_server()
         except Exception:
@@ -77,8 +57,15 @@ class AgentOrchestrator:
         self.agents[agent.name] = agent
         self.log(f"Agent registered: {agent.name} ({agent.role})")
         
-        # Subscribe agent to its own topic
-        self.message_bus.subscribe(agent.name, lambda msg: agent.queue_message(msg["from"], msg["content"]))
+        # Subscribe agent to its own topic; a full mailbox applies backpressure rather than dropping tasks
+        agent._bus_subscription = self.message_bus.subscribe(
+            agent.name, lambda msg: agent.queue_message(msg["from"], msg["content"],
+                                                        task=msg.get("task"), trace=msg.get("trace")),
+            maxsize=1024, policy=BLOCK
+        )
+        if self._broadcaster:
+            self._broadcaster.mark_agent(agent.name)
+        self.scheduler.wake()
         
     def find_agent_by_role(self, role_keyword):
         """Find the first agent whose role contains the keyword (case-insensitive)"""
@@ -88,19 +75,26 @@ class AgentOrchestrator:
                 return name
         return None
         
-    def unregister_agent(self, agent_name):
-        """Remove an agent"""
+    def unregister_agent(self, agent_name, close=True):
+        """Remove an agent (close=False keeps it usable, e.g. when parking its group)"""
         if agent_name in self.agents:
             agent = self.agents[agent_name]
             agent.stop()
+            if close and hasattr(agent, "close"):
+                agent.close()  # Process-hosted agents release their worker
+            if getattr(agent, "_bus_subscription", None):
+                self.message_bus.unsubscribe(agent._bus_subscription)
             del self.agents[agent_name]
             self.log(f"Agent unregistered: {agent_name}")
+            if self._broadcaster:
+                self._broadcaster.mark_agent(agent_name)
             
     def start_all(self):
         """Start all registered agents"""
         self._running = True
         for agent in self.agents.values():
             agent.start()
+        self.scheduler.wake()
         self.log("All agents started")
         
     def stop_all(self):
@@ -110,8 +104,62 @@ class AgentOrchestrator:
             agent.stop()
         self.log("All agents stopped")
         
-    def route_message(self, from_agent, to_agent, content):
-        """Route message between agents"""
+    def add_status_listener(self, listener):
+        """Register listener(agent) for agent status changes (runs on worker threads)"""
+        if listener not in self._status_listeners:
+            self._status_listeners.append(listener)
+
+    def remove_status_listener(self, listener):
+        if listener in self._status_listeners:
+            self._status_listeners.remove(listener)
+
+    def notify_agent_status(self, agent):
+        """Called by agents whenever their status changes"""
+        listeners = list(self._status_listeners)
+        if self.on_agent_status_change:
+            listeners.append(self.on_agent_status_change)
+        for listener in listeners:
+            try:
+                listener(agent)
+            except Exception:
+                pass
+        if self._broadcaster:
+            self._broadcaster.mark_agent(agent.name)
+
+    def notify_agent_done(self, agent):
+        """Called by an agent once per message it finished processing"""
+        try:
+            if hasattr(self, 'app') and self.app:
+                self.app.event_generate('<<AgentDone>>', when='tail')
+        except Exception:
+            pass
+
+    def shutdown(self):
+        """Stop all agents and release the shared agent worker pool"""
+        from core.agent_runtime import shutdown_agent_executor
+        from core.agent_host import shutdown_agent_hosts
+        from core.llm_async import shutdown_llm_loop
+        self.scheduler.close()
+        self.stop_all()
+        self.save_snapshot()
+        self._close_agents(self._group_pool.drain())
+        shutdown_agent_hosts()
+        self.message_bus.close()
+        if self._broadcaster:
+            self._broadcaster.close()
+        if self._journal is not None:
+            self._journal.close()
+        shutdown_agent_executor(wait=False)
+        shutdown_llm_loop()
+
+    def route_message(self, from_agent, to_agent, content, task=None):
+        """Route message between agents (task: scheduler Task the message carries, if any)"""
+        with get_tracer().span("route", agent="orchestrator", phase="route", sender=from_agent, to=to_agent) as span:
+            get_metrics().counter("orchestrator_messages_total", "Messages routed between agents",
+                                  ("sender", "to")).inc(sender=from_agent, to=to_agent)
+            self._route_message(from_agent, to_agent, content, task, span.context())
+
+    def _route_message(self, from_agent, to_agent, content, task, trace):
         # Save to shared history for context
         message = {
             "from": from_agent,
@@ -121,38 +169,39 @@ class AgentOrchestrator:
         }
         
         self.shared_history.append(message)
-        if len(self.shared_history) > 100:
-            self.shared_history.pop(0)
-        # Persist history per group if configured
+        self.group_context.append(message)
+        # Journal the message (one appended line, fsync batched)
         try:
-            self._persist_shared_history()
+            self._history_journal().append(message)
         except Exception as e:
             self.log(f"History persist error: {e}")
         
         self.log(f"{from_agent} -> {to_agent}: {content[:50]}...")
-        # Broadcast snapshot to websocket clients
-        try:
-            self.broadcast_status_snapshot()
-        except Exception:
-            pass
+        # Queue depth changed for the recipient(s); the delta goes out on the next flush
+        if self._broadcaster:
+            for name in ([to_agent] if to_agent in self.agents else list(self.agents)):
+                self._broadcaster.mark_agent(name)
         
+        # Task object and trace context ride on the bus message only, not in the persisted history
+        envelope = dict(message, task=task, trace=trace)
+
         # Direct message to specific agent
         if to_agent in self.agents:
-            self.message_bus.publish(to_agent, message)
+            self.message_bus.publish(to_agent, envelope)
         elif to_agent == "fixer" and "fixer" not in self.agents:
             # Fallback to coder if fixer is missing
             self.log("Fixer agent not found. Falling back to Coder.")
             fallback_coder = self._find_best_agent_by_role("coder")
             if fallback_coder:
-                message["to"] = fallback_coder.name
-                self.message_bus.publish(fallback_coder.name, message)
+                envelope["to"] = fallback_coder.name
+                self.message_bus.publish(fallback_coder.name, envelope)
             else:
                 self.log("No fallback Coder found.")
         else:
             # Broadcast to all if no specific target
             for name in self.agents:
                 if name != from_agent:
-                    self.message_bus.publish(name, message)
+                    self.message_bus.publish(name, envelope)
 
     def handle_error(self, error_msg, context=None):
         """Handle an unresolved error by routing it to the fixer or best available agent"""
@@ -186,13 +235,62 @@ class AgentOrchestrator:
         candidates = [a for a in self.agents.values() if a.role.lower() == role.lower()]
         if not candidates:
             return None
-        # Simple heuristic: pick the one with the shortest queue
-        return min(candidates, key=lambda a: a.message_queue.qsize() if hasattr(a, 'message_queue') else 999)
+        # Healthy model first, then lowest expected latency given current load
+        return min(candidates, key=self.scheduler.agent_cost)
                     
-    def submit_task(self, task, priority=5):
-        """Submit a task to the queue (lower priority = higher)"""
-        self.task_queue.put((priority, task))
-        self.log(f"Task submitted: {task.get('type', 'unknown')}")
+    def fan_out_prompts(self, calls, max_concurrency=8):
+        """
+        Send several prompts to several agents' models at once.
+
+        calls: list of (agent_name, prompt, system_prompt) tuples.
+        Returns {agent_name: response} once every call has finished. All requests
+        share one event loop instead of occupying a thread each.
+        """
+        from core.agent_runtime import get_agent_executor
+        from core.llm_async import run_llm_batch
+        names, batch = [], []
+        for agent_name, prompt, system_prompt in calls:
+            agent = self.agents.get(agent_name)
+            if not agent:
+                self.log(f"fan_out_prompts: unknown agent '{agent_name}'")
+                continue
+            names.append(agent_name)
+            batch.append(agent.build_model_request(prompt, system_prompt))
+        if not batch:
+            return {}
+        self.log(f"Fanning out {len(batch)} prompts to: {', '.join(names)}")
+        with get_agent_executor().parked():    # A drain waiting on the batch frees its work slot
+            return dict(zip(names, run_llm_batch(batch, max_concurrency=max_concurrency)))
+
+    def submit_task(self, task, priority=5, **options):
+        """
+        Submit a task to the scheduler (lower priority = higher); returns the Task.
+
+        task is a prompt string or a dict with "content" (or "prompt"/"description"),
+        and optionally "type", "role", "agent", "deadline", "timeout", "depends_on".
+        Keyword options override dict fields.
+        """
+        spec = dict(task) if isinstance(task, dict) else {"content": str(task)}
+        spec.update(options)
+        content = spec.get("content") or spec.get("prompt") or spec.get("description", "")
+        scheduled = self.scheduler.submit(
+            content, role=spec.get("role"), agent=spec.get("agent"), priority=spec.get("priority", priority),
+            deadline=spec.get("deadline"), timeout=spec.get("timeout"), depends_on=spec.get("depends_on", ()),
+            task_type=spec.get("type"), allow_steal=spec.get("allow_steal", True), sender=spec.get("from", "scheduler")
+        )
+        self.log(f"Task submitted: {scheduled.type} ({scheduled.id})")
+        return scheduled
+
+    def submit_task_graph(self, specs):
+        """Submit dependent tasks as a DAG (see TaskScheduler.submit_graph); returns {local id: Task}"""
+        tasks = self.scheduler.submit_graph(specs)
+        if tasks:
+            self.log(f"Task graph submitted: {len(tasks)} tasks")
+        return tasks
+
+    def cancel_task(self, task_id):
+        """Cancel a scheduled task and everything that depends on it"""
+        return self.scheduler.cancel(task_id)
         
     def get_agent_statuses(self):
         """Get status of all agents"""
@@ -203,10 +301,10 @@ class AgentOrchestrator:
         timestamp = datetime.now().strftime("%H:%M:%S")
         entry = f"[{timestamp}] {message}"
         self.logs.append(entry)
-        
-        # Trim logs if too long
-        if len(self.logs) > 1000:
-            self.logs = self.logs[-1000:]
+        if self._broadcaster:
+            self._broadcaster.add_log(entry)
+        self.log_records.append({"time": datetime.now().isoformat(), "agent": agent_name or "Orchestrator",
+                                 "message": message, "trace_id": (get_tracer().current_context() or {}).get("trace_id")})
             
         # UI callback if set
         if self.on_log:
@@ -237,7 +335,12 @@ class AgentOrchestrator:
                 
     def get_logs(self, last_n=50):
         """Get recent logs"""
-        return self.logs[-last_n:]
+        return list(self.logs)[-last_n:]
+
+    def get_log_records(self, last_n=50, trace_id=None):
+        """Recent structured log records, optionally for one trace"""
+        records = [r for r in self.log_records if trace_id is None or r["trace_id"] == trace_id]
+        return records[-last_n:]
         
     def create_agent(self, agent_class, name, role, model_provider, model_name):
         """Factory method to create and register an agent"""
@@ -245,10 +348,17 @@ class AgentOrchestrator:
         self.register_agent(agent)
         return agent
 
-    def create_agent_by_role(self, name, role, provider, model):
-        """Helper to create agent by role string"""
+    def create_agent_by_role(self, name, role, provider, model, isolation=None, validated=False, prepare=True):
+        """
+        Helper to create agent by role string.
+
+        isolation: "thread" (default), "process" (own worker process) or "role" (one
+        worker process per role); falls back to the agent_isolation setting.
+        validated: model already checked (validate_group_config); prepare: pull a missing
+        Ollama model in the background (load_config warms the whole group instead).
+        """
         # Validate model enforcement - ensure we check against the specific provider
-        if hasattr(self.app, 'ai_manager'):
+        if not validated and hasattr(self.app, 'ai_manager'):
             if not self.app.ai_manager.validate_model(model, provider):
                 allowed = self.app.ai_manager.get_allowed_models(provider)
                 if allowed:
@@ -257,43 +367,22 @@ class AgentOrchestrator:
                 else:
                     self.log(f"Warning: Model '{model}' not allowed for provider '{provider}', and no allowed models found.")
 
-        agent_classes = {
-            "planner": ("agents.planner_agent", "PlannerAgent"),
-            "coder": ("agents.coder_agent", "CoderAgent"),
-            "image_agent": ("agents.image_agent", "ImageAgent"),
-            "gui_coder": ("agents.gui_coder_agent", "GUICoderAgent"),
-            "tester": ("agents.tester_agent", "TesterAgent"),
-            "fixer": ("agents.fixer_agent", "FixerAgent"),
-            "reviser": ("agents.reviser_agent", "ReviserAgent")
-        }
-        
         try:
-            module_name, class_name = agent_classes.get(role, ("agents.planner_agent", "PlannerAgent"))
-            module = __import__(module_name, fromlist=[class_name])
-            agent_class = getattr(module, class_name)
+            module_name, class_name, agent_class = _agent_class(role)
             
-            # Check and pull Ollama model if needed
-            if provider == "ollama" and hasattr(self.app, 'ai_manager'):
-                if not self.app.ai_manager.is_ollama_model_downloaded(model):
-                    self.log(f"System: Ollama model '{model}' not found. Starting automatic pull...")
-                    
-                    def auto_pull():
-                        def progress_cb(s):
-                            st = s.get("status", "Pulling")
-                            if "completed" in s and "total" in s:
-                                p = (s["completed"] / s["total"]) * 100
-                                st = f"{p:.1f}% - {st}"
-                            self.log(f"System [Pull {model}]: {st}")
-                            
-                        if self.app.ai_manager.pull_ollama_model(model, progress_cb):
-                            self.log(f"System: Successfully pulled Ollama model '{model}'. Agent '{name}' is ready.")
-                        else:
-                            self.log(f"Error: Failed to pull Ollama model '{model}'. Agent '{name}' may fail to run.")
-
-                    import threading
-                    threading.Thread(target=auto_pull, daemon=True).start()
-
-            agent = agent_class(name=name, role=role, model_provider=provider, model_name=model, orchestrator=self)
+            # Check and pull Ollama model if needed (off the caller's thread: the check is an HTTP call)
+            if prepare and provider == "ollama" and hasattr(self.app, 'ai_manager'):
+                self.app.ai_manager.warm_up_ollama_models([{"provider": provider, "model": model}],
+                                                          on_status=lambda text: self.log(f"System [{name}]: {text}"))
+
+            isolation = isolation or self.app.settings.get("agent_isolation", "thread")
+            if isolation in ("process", "role"):
+                from core.agent_host import ProcessAgent
+                host_key = f"role:{role}" if isolation == "role" else name
+                agent = ProcessAgent(module_name, class_name, name=name, role=role, model_provider=provider,
+                                     model_name=model, orchestrator=self, host_key=host_key)
+            else:
+                agent = agent_class(name=name, role=role, model_provider=provider, model_name=model, orchestrator=self)
             self.register_agent(agent)
             return agent
         except Exception as e:
@@ -304,12 +393,15 @@ class AgentOrchestrator:
         """Save current agents to app settings"""
         config = []
         for name, agent in self.agents.items():
-            config.append({
+            item = {
                 "name": agent.name,
                 "role": agent.role,
                 "provider": agent.model_provider,
                 "model": agent.model_name
-            })
+            }
+            if getattr(agent, "isolation", "thread") != "thread":
+                item["isolation"] = agent.isolation
+            config.append(item)
             
         if "agent_groups" not in self.app.settings:
             self.app.settings["agent_groups"] = {}
@@ -322,6 +414,7 @@ class AgentOrchestrator:
         self.current_group_name = group_name
         try:
             self._persist_shared_history()
+            self.group_context.bind(group_name, self._context_path())
         except Exception as e:
             self.log(f"Error saving shared history for group '{group_name}': {e}")
         try:
@@ -342,28 +435,31 @@ class AgentOrchestrator:
             self.log(f"Error updating allowed models from config: {e}")
 
     def load_config(self, group_name="default"):
-        """Load agents from app settings"""
+        """Load agents from app settings (reusing the group's parked agents when it was loaded before)"""
         groups = self.app.settings.get("agent_groups", {})
         if group_name not in groups:
             self.log(f"Config '{group_name}' not found.")
             return False
             
-        config = groups[group_name]
+        config = validate_group_config(groups[group_name], getattr(self.app, "ai_manager", None), log=self.log)
         self.stop_all()
-        # Clear existing
-        names = list(self.agents.keys())
-        for name in names:
-            self.unregister_agent(name)
-            
-        for item in config:
-            self.create_agent_by_role(item["name"], item["role"], item["provider"], item["model"])
+        # Park the current group instead of tearing it down
+        parked = self._park_current_group()
+        pooled = self._group_pool.take(self._pool_key(group_name))
+        reused = self._build_group(config, pooled.agents if pooled else {})
             
-        self.log(f"Config '{group_name}' loaded.")
+        self.log(f"Config '{group_name}' loaded ({reused}/{len(config)} agents reused"
+                 f"{', previous group parked' if parked else ''}).")
         self.current_group_name = group_name
-        # Load shared chat history for this group
+        self._warm_up_group(config)
+        # Load shared chat history for this group (kept in memory while it was parked)
         try:
-            self.shared_history = self._load_shared_history()
+            if pooled is not None and self._history_journal().adopt(list(pooled.history), pooled.cursor):
+                self.shared_history = pooled.history
+            else:
+                self.shared_history = HistoryWindow(self._load_shared_history(), maxlen=SHARED_HISTORY_SIZE)
             self.log(f"Loaded shared history for group '{group_name}' ({len(self.shared_history)} messages)")
+            self.group_context.reset(group_name, list(self.shared_history), self._context_path())
             # Reflect in chat UI if available
             if hasattr(self.app, "ai_panel") and hasattr(self.app.ai_panel, "set_chat_history"):
                 self.app.ai_panel.set_chat_history(self.shared_history)
@@ -377,7 +473,7 @@ class AgentOrchestrator:
         # Enforce allowed models derived from the loaded group
         try:
             models = sorted({item["model"] for item in config if item.get("model")})
-            if models:
+            if models and self.app.settings.get("allowed_models") != ",".join(models):
                 self.app.settings["allowed_models"] = ",".join(models)
                 if hasattr(self.app, "save_settings"):
                     self.app.save_settings(self.app.settings)
@@ -389,8 +485,153 @@ class AgentOrchestrator:
         
         return True
 
-    def _history_path(self):
-        """Compute path for shared history file for current group"""
+    # --- Group pooling, warm-up and snapshots ---
+    def _pool_key(self, group_name):
+        return (getattr(self.app, "project_path", None), group_name)
+
+    def _park_current_group(self):
+        """Detach the current agents (kept built, queues intact) into the group pool"""
+        if not self.agents:
+            return False
+        agents = dict(self.agents)
+        for name in list(agents):
+            self.unregister_agent(name, close=False)
+        if self.current_group_name is None:
+            self._close_agents(agents.values())   # Unsaved ad-hoc group: nothing to switch back to
+            return False
+        cursor = None
+        try:
+            cursor = self._history_journal().cursor()
+        except Exception as e:
+            self.log(f"History flush error: {e}")
+        self._close_agents(self._group_pool.park(self._pool_key(self.current_group_name), agents,
+                                                 self.shared_history, cursor))
+        return True
+
+    def _close_agents(self, agents):
+        for agent in agents:
+            try:
+                if hasattr(agent, "close"):
+                    agent.close()
+            except Exception as e:
+                self.log(f"Error closing agent {agent.name}: {e}")
+
+    def _build_group(self, config, pooled):
+        """Register config's agents, reusing pooled ones with the same spec; returns how many were reused"""
+        default_isolation = self.app.settings.get("agent_isolation", "thread")
+        reused = 0
+        for item in config:
+            agent = pooled.pop(item["name"], None)
+            if agent is not None and agent_spec(agent) == item_spec(item, default_isolation):
+                self.register_agent(agent)
+                reused += 1
+                continue
+            if agent is not None:
+                self._close_agents([agent])
+            self.create_agent_by_role(item["name"], item["role"], item["provider"], item["model"],
+                                      isolation=item.get("isolation"), validated=True, prepare=False)
+        self._close_agents(pooled.values())
+        return reused
+
+    def _warm_up_group(self, config):
+        """Start loading the group's local weights and Ollama models concurrently in the background"""
+        ai = getattr(self.app, "ai_manager", None)
+        if ai is None:
+            return
+        try:
+            if ai.warm_up_local_models(config):
+                self.log("Warming up local models in the background.")
+            if ai.warm_up_ollama_models(config, on_status=lambda text: self.log(f"System [Ollama]: {text}")):
+                self.log("Warming up Ollama models in the background.")
+        except Exception as e:
+            self.log(f"Local model warm-up skipped: {e}")
+
+    def _snapshot_path(self):
+        import os
+        return os.path.join(os.path.dirname(self._history_path()), ".agent_snapshot.bin")
+
+    def save_snapshot(self):
+        """
+        Checkpoint the active group (agents and their queued messages, pending approvals,
+        shared history and the journal position it matches) for restore_snapshot().
+        """
+        from core.orchestrator_snapshot import dump_snapshot
+        if self.current_group_name is None:
+            return None
+        agents = []
+        for name, agent in self.agents.items():
+            with agent.message_queue.mutex:
+                queued = [{"from": m["from"], "content": m["content"]} for m in agent.message_queue.queue]
+            agents.append({"name": name, "role": agent.role, "provider": agent.model_provider,
+                           "model": agent.model_name, "isolation": getattr(agent, "isolation", "thread"),
+                           "queue": queued})
+        state = {
+            "group": self.current_group_name,
+            "project_path": getattr(self.app, "project_path", None),
+            "config": self.app.settings.get("agent_groups", {}).get(self.current_group_name),
+            "agents": agents,
+            "pending_approvals": self.pending_approvals,
+            "approval_required": self.approval_required,
+            "history": list(self.shared_history),
+            "history_cursor": self._history_journal().cursor(),
+        }
+        try:
+            size = dump_snapshot(self._snapshot_path(), state)
+            self.log(f"Snapshot saved ({len(agents)} agents, {size} bytes)")
+            return self._snapshot_path()
+        except Exception as e:
+            self.log(f"Error saving snapshot: {e}")
+            return None
+
+    def restore_snapshot(self, group_name=None):
+        """
+        Rebuild the group saved by save_snapshot() without re-validating or re-reading
+        history. Returns False (nothing changed) when there is no snapshot for group_name
+        in this project or its saved config has changed since; load_config then applies.
+        """
+        from core.orchestrator_snapshot import load_snapshot, discard_snapshot
+        path = self._snapshot_path()
+        state = load_snapshot(path)
+        if not state or (group_name and state.get("group") != group_name):
+            return False
+        if state.get("project_path") != getattr(self.app, "project_path", None) or \
+                state.get("config") != self.app.settings.get("agent_groups", {}).get(state["group"]):
+            self.log("Snapshot is out of date; loading the group from settings.")
+            discard_snapshot(path)
+            return False
+        self.stop_all()
+        for name in list(self.agents):
+            self.unregister_agent(name)
+        self.current_group_name = state["group"]
+        for item in state.get("agents", []):
+            agent = self.create_agent_by_role(item["name"], item["role"], item["provider"], item["model"],
+                                              isolation=item.get("isolation"), validated=True, prepare=False)
+            for message in item.get("queue", []) if agent else []:
+                agent.queue_message(message["from"], message["content"])
+        self.pending_approvals = list(state.get("pending_approvals", []))
+        self.approval_required = state.get("approval_required", self.approval_required)
+        history = state.get("history", [])
+        if not self._history_journal().adopt(history, state.get("history_cursor")):
+            history = self._load_shared_history()   # Journal moved on since the snapshot
+        self.shared_history = HistoryWindow(history, maxlen=SHARED_HISTORY_SIZE)
+        self.group_context.reset(self.current_group_name, list(self.shared_history), self._context_path())
+        discard_snapshot(path)   # Queued messages must not be replayed twice
+        self._warm_up_group(state.get("agents", []))
+        self.log(f"Group '{self.current_group_name}' restored from snapshot "
+                 f"({len(self.agents)} agents, {len(self.pending_approvals)} pending approvals)")
+        if hasattr(self.app, "ai_panel") and hasattr(self.app.ai_panel, "set_chat_history"):
+            try:
+                self.app.ai_panel.set_chat_history(self.shared_history)
+            except Exception:
+                pass
+        try:
+            self.broadcast_status_snapshot()
+        except Exception:
+            pass
+        return True
+
+    def _history_path(self, legacy=False):
+        """Compute path for shared history journal for current group (legacy=True: old JSON file)"""
         import os
         base = None
         try:
@@ -399,82 +640,86 @@ class AgentOrchestrator:
             import os as _os
             base = _os.path.expanduser("~")
         name = self.current_group_name or "default"
-        return os.path.join(base, f".agent_history_{name}.json")
+        return os.path.join(base, f".agent_history_{name}.json" + ("" if legacy else "l"))
 
-    def _persist_shared_history(self):
-        """Persist shared history to disk for the current group"""
-        import json, os
+    def _context_path(self):
+        """Saved group memory summary, next to the group's history journal"""
+        import os
         path = self._history_path()
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(self.shared_history, f, indent=2)
+        name = self.current_group_name or "default"
+        return os.path.join(os.path.dirname(path), f".agent_context_{name}.json")
 
-    def _load_shared_history(self):
-        """Load shared history from disk for the current group"""
-        import json, os
+    def _summarize_context(self, prompt, system_prompt, max_tokens):
+        """Summarizer for group_context: one cheap, deterministic call per summary update"""
+        from core.llm import call_llm, MODEL_TIERS
+        ai = getattr(self.app, "ai_manager", None)
+        if ai is None:
+            return None
+        settings = getattr(self.app, "settings", {}) or {}
+        url, model, token, provider_type = ai.get_provider_config(settings.get("context_summary_provider") or None)
+        model = settings.get("context_summary_model") or ("small" if provider_type in MODEL_TIERS else model)
+        return call_llm(prompt, url, model, provider_type, token, temperature=0, max_tokens=max_tokens,
+                        system_prompt=system_prompt, role="summarizer", task_type="reasoning")
+
+    def _history_journal(self):
+        """Journal for the current group, reopened when the group or project changes"""
         path = self._history_path()
-        if os.path.exists(path):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    # Validate minimal schema
-                    if isinstance(data, list):
-                        return [
-                            {
-                                "from": item.get("from", "unknown"),
-                                "to": item.get("to", "unknown"),
-                                "content": item.get("content", ""),
-                                "timestamp": item.get("timestamp", datetime.now().isoformat())
-                            } for item in data
-                        ]
-            except Exception as e:
-                self.log(f"Failed to read history file: {e}")
-        return []
+        if self._journal is None or self._journal.path != path:
+            if self._journal is not None:
+                self._journal.close()
+            self._journal = HistoryJournal(path, window=SHARED_HISTORY_SIZE,
+                                           legacy_path=self._history_path(legacy=True))
+        return self._journal
+
+    def _persist_shared_history(self):
+        """Write the in-memory window as the current group's journal (compacted snapshot)"""
+        self._history_journal().rewrite(list(self.shared_history))
+
+    def _load_shared_history(self):
+        """Load shared history for the current group, recovering from a torn journal"""
+        try:
+            data = self._history_journal().load()
+        except Exception as e:
+            self.log(f"Failed to read history file: {e}")
+            return []
+        # Validate minimal schema
+        return [
+            {
+                "from": item.get("from", "unknown"),
+                "to": item.get("to", "unknown"),
+                "content": item.get("content", ""),
+                "timestamp": item.get("timestamp", datetime.now().isoformat())
+            } for item in data
+        ]
 
     # --- WebSocket Broadcasting (optional) ---
     def start_ws_server(self):
-        """Start a lightweight websocket server if library available"""
-        import threading
-        try:
-            import asyncio, json as _json
-            try:
-                import websockets
-            except ImportError:
-                websockets = None
-        except Exception:
+        """Start the status/metrics websocket server on 127.0.0.1:8765 if websockets is installed"""
+        from core.ws_broadcast import StatusBroadcaster
+        if self._broadcaster:
             return
-        async def handler(websocket, path):
-            self._ws_clients.add(websocket)
-            try:
-                # Send initial snapshot
-                await websocket.send(_json.dumps(self.get_agent_snapshot()))
-                async for _ in websocket:
-                    # Clients don't send commands; ignore
-                    pass
-            except Exception:
-                pass
-            finally:
-                try:
-                    self._ws_clients.remove(websocket)
-                except Exception:
-                    pass
-        async def run():
-            try:
-                server = await websockets.serve(handler, '127.0.0.1', 8765)
-                await server.wait_closed()
-            except Exception:
-                pass
-        def start():
-            try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(run())
-            except Exception:
-                pass
-        if not self._ws_server_thread:
-            t = threading.Thread(target=start, daemon=True)
-            t.start()
-            self._ws_server_thread = t
+        broadcaster = StatusBroadcaster(self.get_agent_snapshot, self._describe_agent, self.handle_ws_command,
+                                        hz=self.app.settings.get("ws_update_hz") if getattr(self.app, "settings", None) else None)
+        if broadcaster.start():
+            self._broadcaster = broadcaster
+
+    def configure_ws(self, settings):
+        """Apply ws_update_hz from the IDE settings dict"""
+        if self._broadcaster and settings:
+            self._broadcaster.configure(hz=settings.get("ws_update_hz"))
+
+    def _describe_agent(self, name):
+        """Broadcast state for one agent, or None if it is no longer registered"""
+        agent = self.agents.get(name)
+        if agent is None:
+            return None
+        return {
+            "name": name,
+            "role": getattr(agent, 'role', ''),
+            "status": getattr(agent, 'status', 'idle'),
+            "queue": agent.message_queue.qsize() if hasattr(agent, 'message_queue') else 0,
+            "last": agent.history[-1]['content'][:120] if getattr(agent, 'history', []) else ""
+        }
 
     def get_agent_snapshot(self):
         """Return current agent statuses for broadcasting"""
@@ -483,41 +728,74 @@ class AgentOrchestrator:
             "agents": []
         }
         try:
-            import json as _json
-            for name, agent in self.agents.items():
-                item = {
-                    "name": name,
-                    "role": getattr(agent, 'role', ''),
-                    "status": getattr(agent, 'status', 'idle'),
-                    "queue": agent.message_queue.qsize() if hasattr(agent, 'message_queue') else 0,
-                    "last": agent.history[-1]['content'][:120] if getattr(agent, 'history', []) else ""
-                }
-                snapshot["agents"].append(item)
+            for name in list(self.agents):
+                item = self._describe_agent(name)
+                if item:
+                    snapshot["agents"].append(item)
         except Exception:
             pass
         return snapshot
 
-    def broadcast_status_snapshot(self):
-        """Broadcast agent snapshot to all websocket clients"""
+    # --- Metrics and tracing ---
+    def _register_gauges(self):
+        """Queue-depth and load gauges computed when metrics are scraped"""
+        from core.agent_runtime import get_agent_executor
+        metrics = get_metrics()
+        metrics.gauge("agent_queue_depth", "Messages waiting in each agent's queue", ("agent",),
+                      collector=lambda: {n: a.message_queue.qsize() for n, a in list(self.agents.items())})
+        metrics.gauge("agent_busy", "Messages each agent is processing right now", ("agent",),
+                      collector=lambda: {n: get_agent_executor().busy(a) for n, a in list(self.agents.items())})
+        metrics.gauge("scheduler_queue", "Scheduler tasks by state", ("state",),
+                      collector=lambda: self.scheduler.stats()["states"])
+        metrics.gauge("bus_retained_messages", "Messages held in the bus replay log",
+                      collector=lambda: {(): self.message_bus.stats()["retained"]})
+
+    def get_metrics_text(self):
+        """Prometheus text exposition of every registered metric"""
+        return get_metrics().to_prometheus()
+
+    def get_trace_summary(self, trace_id=None):
+        """Where a run spent its time: per agent/phase totals for one trace (default: latest)"""
+        tracer = get_tracer()
+        if trace_id is None:
+            recent = tracer.traces(limit=1)
+            if not recent:
+                return {"trace_id": None, "phases": []}
+            trace_id = recent[0]["trace_id"]
+        return {"trace_id": trace_id, "phases": tracer.summarize(trace_id)}
+
+    def handle_ws_command(self, raw):
+        """
+        Answer a websocket query: "metrics" (Prometheus text), "metrics.json", "traces",
+        "trace <id>" / "summary [<id>]", or the JSON form {"cmd": ..., "trace_id": ...}.
+        """
         try:
-            import asyncio, json as _json
-            if not self._ws_clients:
-                return
-            data = _json.dumps(self.get_agent_snapshot())
-            async def _send_all():
-                tasks = []
-                for ws in list(self._ws_clients):
-                    try:
-                        tasks.append(ws.send(data))
-                    except Exception:
-                        pass
-                if tasks:
-                    await asyncio.gather(*tasks, return_exceptions=True)
-            loop = asyncio.get_event_loop()
-            if loop and loop.is_running():
-                asyncio.run_coroutine_threadsafe(_send_all(), loop)
-        except Exception:
-            pass
+            request = json.loads(raw) if raw.lstrip().startswith("{") else None
+        except ValueError:
+            request = None
+        if request:
+            cmd, arg = request.get("cmd", ""), request.get("trace_id")
+        else:
+            parts = str(raw).split()
+            cmd, arg = (parts[0] if parts else ""), (parts[1] if len(parts) > 1 else None)
+        tracer = get_tracer()
+        if cmd == "metrics":
+            return self.get_metrics_text()
+        if cmd == "metrics.json":
+            return json.dumps({"type": "metrics", "metrics": get_metrics().to_dict()})
+        if cmd == "traces":
+            return json.dumps({"type": "traces", "traces": tracer.traces()})
+        if cmd == "trace" and arg:
+            return json.dumps({"type": "trace", "trace_id": arg, "spans": tracer.spans(arg),
+                               "logs": self.get_log_records(200, trace_id=arg)})
+        if cmd == "summary":
+            return json.dumps(dict(self.get_trace_summary(arg), type="summary"))
+        return None
+
+    def broadcast_status_snapshot(self):
+        """Send websocket clients a full snapshot on the next flush (group loaded/saved)"""
+        if self._broadcaster:
+            self._broadcaster.request_snapshot()
         
     def run_workflow(self, workflow_name, context):
         """Execute a predefined workflow"""
@@ -580,6 +858,8 @@ class AgentOrchestrator:
             
     def _workflow_plan_and_code(self, context):
         """Planner -> Coder workflow"""
+        if self._speculate_workflow(context, ("coder",), context.get("description", "")):
+            return True
         if "planner" in self.agents and "coder" in self.agents:
             # Send task to planner
             self.route_message("user", "planner", f"Create a plan for: {context.get('description', '')}")
@@ -588,13 +868,24 @@ class AgentOrchestrator:
     def _workflow_image_to_gui(self, context):
         """Image Agent -> GUI Coder workflow"""
         if "image_agent" in self.agents and "gui_coder" in self.agents:
-            # Image agent analyzes first
             image_path = context.get("image_path", "")
+            if self._speculative_enabled(context) and self._speculation_width(("gui_coder",)) > 1:
+                # Analysis must come first; only the code generation is raced
+                def _analyze_then_race():
+                    analysis = self.agents["image_agent"].process(f"Analyze this UI mockup: {image_path}")
+                    self._speculate(("gui_coder",), f"Based on this UI analysis, generate code:\n{analysis}", context)
+                threading.Thread(target=_analyze_then_race, name="speculative-workflow", daemon=True).start()
+                return True
+            # Image agent analyzes first
             self.route_message("user", "image_agent", f"Analyze this UI mockup: {image_path}")
         return True
         
     def _workflow_test_and_fix(self, context):
         """Tester -> Fixer/Coder loop"""
+        error_log = context.get('error_log', '')
+        if error_log and context.get("file_path") and \
+                self._speculate_workflow(context, ("fixer", "coder"), f"Fix this error:\n{error_log}"):
+            return True
         if "tester" in self.agents:
             target = context.get('file_path', '')
             self.route_message("user", "tester", f"Run tests on: {target}")
@@ -604,7 +895,94 @@ class AgentOrchestrator:
             # message bus system allows agents to react to broadcasted failures.
         elif "fixer" in self.agents:
             # If no tester, but we have a fixer, maybe we just want to fix a known error
-            error_log = context.get('error_log', '')
             if error_log:
                 self.route_message("user", "fixer", f"ERROR: {error_log}")
         return True
+
+    # --- Speculative execution ---
+    def _speculative_enabled(self, context):
+        settings = getattr(self.app, "settings", {}) or {}
+        return bool(context.get("speculative", settings.get("speculative_workflows", False)))
+
+    def _speculation_width(self, roles):
+        from core.speculative import pick_agents, DEFAULT_WIDTH
+        width = (getattr(self.app, "settings", {}) or {}).get("speculative_width", DEFAULT_WIDTH)
+        return len(pick_agents(self.agents.values(), roles, self.scheduler.agent_cost, width))
+
+    def _speculate_workflow(self, context, roles, task):
+        """Race task in the background when speculation is on and more than one agent can take it"""
+        if not task or not self._speculative_enabled(context) or self._speculation_width(roles) < 2:
+            return False
+        threading.Thread(target=self._speculate, args=(roles, task, context),
+                         name="speculative-workflow", daemon=True).start()
+        return True
+
+    def _speculate(self, roles, task, context):
+        result = self.run_speculative(task, roles, file_path=context.get("file_path"), test=context.get("test"))
+        if result and result["agent"] and hasattr(self.app, "log_ai"):
+            try:
+                where = f" to {context['file_path']}" if result.get("applied") else ""
+                self.app.log_ai(f"⚡ {result['agent']} won the speculative run in {result['seconds']}s"
+                                f"{where}:\n\n```\n{result['content'][:4000]}\n```")
+            except Exception:
+                pass
+
+    def run_speculative(self, task, roles=("coder",), system_prompt=None, file_path=None, test=None,
+                        width=None, timeout=None):
+        """
+        Send task to up to `width` agents with one of roles at once (speculative_width
+        setting, default 3) and keep the first reply that passes validation: it must
+        compile, patch file_path cleanly when given, and pass the pytest target `test`
+        (file or node id in the project) when given. Slower agents are cancelled.
+
+        The winner is written to file_path (with a backup) when agents may act without
+        approval; otherwise it is only returned. Returns the core.speculative.speculate
+        result plus "applied", or None when no agent has one of roles.
+        """
+        import os
+        from core.speculative import pick_agents, speculate, CodeValidator, file_test, DEFAULT_WIDTH, DEFAULT_TIMEOUT
+        settings = getattr(self.app, "settings", {}) or {}
+        agents = pick_agents(self.agents.values(), roles, self.scheduler.agent_cost,
+                             width or settings.get("speculative_width", DEFAULT_WIDTH))
+        if not agents:
+            self.log(f"Speculative run skipped: no {'/'.join(roles)} agent")
+            return None
+        auto_apply = not self.approval_required and settings.get("agent_auto_approve", False)
+        project_path = getattr(self.app, "project_path", None)
+        original, run_test = "", None
+        if file_path:
+            with open(file_path, "r", encoding="utf-8") as f:
+                original = f.read()
+            if auto_apply and project_path:
+                from utils.backup import BackupManager
+                BackupManager(project_path).create_backup(file_path)   # Before tests touch the file
+            task = (f"{task}\n\nCurrent code in {os.path.basename(file_path)}:\n{original[:4000]}\n\n"
+                    f"Respond ONLY with a unified diff patch or the complete corrected file.")
+            if test and project_path and auto_apply:
+                from core.test_runner import TestRunner
+                def _run():
+                    res = TestRunner().run_specific_test(project_path, test)
+                    return res["success"], res["output"]
+                run_test = file_test(file_path, original, _run)
+        system_prompt = system_prompt or "You are an expert software developer. Return only code."
+
+        self.log(f"Speculative run: {', '.join(a.name for a in agents)}")
+        with get_tracer().span("speculative", phase="speculate", roles=",".join(roles)):
+            result = speculate(agents, task, system_prompt, CodeValidator(file_path, original, run_test),
+                               timeout=timeout or settings.get("speculative_timeout", DEFAULT_TIMEOUT),
+                               stop_event=getattr(self.app, "stop_event", None))
+        for name, reason in result["rejected"].items():
+            self.log(f"Speculative candidate from {name} rejected: {reason[:100]}")
+        result["applied"] = False
+        if not result["agent"]:
+            self.log("Speculative run: no candidate passed validation")
+            return result
+        self.log(f"Speculative run won by {result['agent']} in {result['seconds']}s")
+        if file_path and auto_apply:
+            try:
+                with open(file_path, "w", encoding="utf-8") as f:
+                    f.write(result["content"])
+                result["applied"] = True
+            except Exception as e:
+                self.log(f"Error applying speculative result to {file_path}: {e}")
+        return result
@@ -0,0 +1,119 @@
+"""
+Agent Pool - Agent class registry, group config validation and parked agent groups for fast switching
+"""
+import importlib
+import threading
+import time
+from collections import OrderedDict
+
+AGENT_CLASSES = {
+    "planner": ("agents.planner_agent", "PlannerAgent"),
+    "coder": ("agents.coder_agent", "CoderAgent"),
+    "image_agent": ("agents.image_agent", "ImageAgent"),
+    "gui_coder": ("agents.gui_coder_agent", "GUICoderAgent"),
+    "tester": ("agents.tester_agent", "TesterAgent"),
+    "fixer": ("agents.fixer_agent", "FixerAgent"),
+    "reviser": ("agents.reviser_agent", "ReviserAgent")
+}
+DEFAULT_AGENT_CLASS = AGENT_CLASSES["planner"]
+POOLED_GROUPS = 3               # Parked groups kept alive besides the active one
+
+_CLASS_CACHE = {}
+_CLASS_LOCK = threading.Lock()
+
+
+def agent_class(role):
+    """(module name, class name, class) for a role; modules are imported once"""
+    module_name, class_name = AGENT_CLASSES.get(role, DEFAULT_AGENT_CLASS)
+    cls = _CLASS_CACHE.get((module_name, class_name))
+    if cls is None:
+        with _CLASS_LOCK:
+            cls = getattr(importlib.import_module(module_name), class_name)
+            _CLASS_CACHE[(module_name, class_name)] = cls
+    return module_name, class_name, cls
+
+
+def item_spec(item, default_isolation="thread"):
+    """What makes a configured agent reusable: role, provider, model, isolation"""
+    return (item["role"], item["provider"], item["model"], item.get("isolation") or default_isolation)
+
+
+def agent_spec(agent):
+    return (agent.role, agent.model_provider, agent.model_name, getattr(agent, "isolation", "thread"))
+
+
+def validate_group_config(config, ai_manager=None, log=print):
+    """
+    Normalize a saved agent group once, before any agent is built: entries without a
+    name or role and duplicate names are dropped, and models the provider does not
+    allow are switched to its first allowed model (as create_agent_by_role would).
+    """
+    items, seen, allowed_cache = [], set(), {}
+    for raw in config or []:
+        if not isinstance(raw, dict) or not raw.get("name") or not raw.get("role"):
+            log(f"Warning: Skipping invalid agent entry: {raw!r}")
+            continue
+        if raw["name"] in seen:
+            log(f"Warning: Duplicate agent name '{raw['name']}' skipped.")
+            continue
+        seen.add(raw["name"])
+        item = {"name": raw["name"], "role": raw["role"], "provider": raw.get("provider") or "openai",
+                "model": raw.get("model", ""), "isolation": raw.get("isolation")}
+        if ai_manager is not None:
+            provider = item["provider"]
+            if provider not in allowed_cache:
+                allowed_cache[provider] = ai_manager.get_allowed_models(provider)
+            allowed = allowed_cache[provider]
+            if item["model"] not in allowed:
+                if allowed:
+                    log(f"Warning: Model '{item['model']}' not allowed for provider '{provider}'. Switching to '{allowed[0]}'.")
+                    item["model"] = allowed[0]
+                else:
+                    log(f"Warning: Model '{item['model']}' not allowed for provider '{provider}', and no allowed models found.")
+        items.append(item)
+    return items
+
+
+class ParkedGroup:
+    def __init__(self, agents, history, cursor=None):
+        self.agents = agents            # name -> stopped agent, detached from the bus
+        self.history = history          # shared_history window at the time it was parked
+        self.cursor = cursor            # History journal position that window matches
+        self.parked_at = time.time()
+
+
+class AgentGroupPool:
+    """
+    Recently used agent groups, kept built (and their worker processes alive) so that
+    switching back is a re-register instead of a rebuild. Least recently parked
+    groups beyond `size` are handed back to the caller to close.
+    """
+
+    def __init__(self, size=POOLED_GROUPS):
+        self.size = size
+        self._groups = OrderedDict()
+
+    def park(self, key, agents, history, cursor=None):
+        """Keep a group; returns the agents of groups evicted to make room"""
+        evicted = []
+        previous = self._groups.pop(key, None)
+        if previous is not None:
+            evicted += [a for name, a in previous.agents.items() if agents.get(name) is not a]
+        self._groups[key] = ParkedGroup(agents, history, cursor)
+        while len(self._groups) > self.size:
+            _, group = self._groups.popitem(last=False)
+            evicted += list(group.agents.values())
+        return evicted
+
+    def take(self, key):
+        return self._groups.pop(key, None)
+
+    def drain(self):
+        """Remove every parked group; returns all their agents"""
+        agents = [a for group in self._groups.values() for a in group.agents.values()]
+        self._groups.clear()
+        return agents
+
+    def stats(self):
+        return {"groups": [{"group": key[1], "agents": len(g.agents), "parked_at": g.parked_at}
+                           for key, g in self._groups.items()]}
@@ -0,0 +1,153 @@
+"""
+Agent Runtime - Shared worker pool that runs agent mailboxes on demand (no polling threads)
+"""
+import contextvars
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = min(16, (os.cpu_count() or 4) + 4)
+DEFAULT_LLM_WORKERS = 8         # Blocking model calls in flight across all agents
+MAX_DRAIN_THREADS = 64          # Drains parked on a model call hold a thread but no work slot
+
+
+class AgentExecutor:
+    """
+    Event-driven executor for agent message queues.
+
+    Agents no longer own a thread that wakes every 0.5 s. notify(agent) is called
+    whenever a message is queued; if the agent has spare concurrency a drain task is
+    submitted to the shared pool, which processes messages until the queue is empty
+    and then returns the worker. Idle agents cost nothing.
+
+    Model calls go through run_llm(), which runs them on a separate LLM I/O pool and
+    gives up the drain's work slot while it waits, so at most max_workers drains are
+    doing agent work at once and long provider calls never queue short messages.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, llm_workers=DEFAULT_LLM_WORKERS):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max(max_workers, MAX_DRAIN_THREADS), thread_name_prefix="agent")
+        self._llm_pool = ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="agent-llm")
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._local = threading.local()     # .slot: this drain thread holds a work slot
+        self._lock = threading.Lock()
+        self._active = {}       # agent -> running drain tasks
+        self._closed = False
+
+    def notify(self, agent):
+        """Schedule a drain for agent if it has queued work and a free slot"""
+        with self._lock:
+            if self._closed or not agent.is_running():
+                return False
+            if agent.message_queue.empty():
+                return False
+            active = self._active.get(agent, 0)
+            if active >= max(1, getattr(agent, "max_concurrency", 1)):
+                return False
+            self._active[agent] = active + 1
+        try:
+            self._pool.submit(self._drain, agent)
+        except RuntimeError:
+            # Pool shut down between the check and the submit
+            with self._lock:
+                self._release(agent)
+            return False
+        return True
+
+    def _release(self, agent):
+        """Drop one active slot for agent. Caller holds _lock."""
+        remaining = self._active.get(agent, 1) - 1
+        if remaining > 0:
+            self._active[agent] = remaining
+        else:
+            self._active.pop(agent, None)
+
+    def _drain(self, agent):
+        self._slots.acquire()
+        self._local.slot = True
+        try:
+            while agent.is_running():
+                try:
+                    message = agent.message_queue.get_nowait()
+                except queue.Empty:
+                    break
+                agent._handle_queued(message)
+        finally:
+            self._local.slot = False
+            self._slots.release()
+            with self._lock:
+                self._release(agent)
+            # A message may have arrived after the last get_nowait but before release
+            if not agent.message_queue.empty():
+                self.notify(agent)
+
+    def run_llm(self, fn, *args, **kwargs):
+        """
+        Run a blocking model call on the LLM I/O pool and return its result.
+
+        On a drain thread the work slot is handed back for the duration of the call
+        and taken again afterwards; elsewhere this just runs on the I/O pool.
+        """
+        if threading.current_thread().name.startswith("agent-llm"):
+            return fn(*args, **kwargs)      # Nested call: waiting on our own pool could deadlock
+        try:
+            # Carry the caller's context so the "llm" span nests under the agent's span
+            future = self._llm_pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        except RuntimeError:
+            return fn(*args, **kwargs)      # Shut down: finish the call inline
+        with self.parked():
+            return future.result()
+
+    @contextmanager
+    def parked(self):
+        """Hand this drain's work slot back while it blocks on I/O (no-op off drain threads)"""
+        if not getattr(self._local, "slot", False):
+            yield
+            return
+        self._local.slot = False
+        self._slots.release()
+        try:
+            yield
+        finally:
+            self._slots.acquire()
+            self._local.slot = True
+
+    def busy(self, agent=None):
+        """Number of running drain tasks (for one agent, or in total)"""
+        with self._lock:
+            if agent is not None:
+                return self._active.get(agent, 0)
+            return sum(self._active.values())
+
+    def shutdown(self, wait=True):
+        """Stop accepting work; queued messages stay in their agents' queues"""
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        self._llm_pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_agent_executor():
+    """Process-wide executor shared by all BaseAgent instances"""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = AgentExecutor()
+    return _EXECUTOR
+
+
+def shutdown_agent_executor(wait=False):
+    """Shut the shared executor down (application exit)"""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        executor, _EXECUTOR = _EXECUTOR, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
@@ -1,9 +1,18 @@
 """
 AI Manager - Centralized handling of AI providers and interactions
 """
-import requests
 import json
+import threading
 from core.llm import call_llm, test_llm_connection
+from core.http_client import configure_client, get_client
+from core.llm_cache import configure_llm_cache
+from core.rate_limiter import configure_scheduler, get_scheduler
+from core.local_models import configure_model_registry, get_local_batcher, get_model_registry
+from core.token_budget import add_usage_sink, context_window
+from core.telemetry import configure_telemetry, get_telemetry
+
+USAGE_LOG_LIMIT = 1000          # Entries kept in memory and in usage_logs.json
+USAGE_FLUSH_DELAY = 5.0         # Seconds new usage entries are buffered before one write
 
 class AIManager:
     def __init__(self, app):
@@ -17,7 +26,22 @@ class AIManager:
             "google": {"name": "Google Gemini", "type": "google", "url": "https://generativelanguage.googleapis.com/v1/models", "model": "gemini-1.5-flash"}
         }
         self.usage_logs = []
+        self._usage_lock = threading.Lock()
+        self._usage_flush = None        # Pending flush timer, if any
+        self._usage_write_lock = threading.Lock()
         self._load_usage_logs()
+        # Every call_llm / acall_llm reports its real token usage here
+        add_usage_sink(self._on_llm_usage)
+        # Shared keep-alive pools for every provider call (sizes/timeouts from settings)
+        configure_client(self.app.settings)
+        # Persistent response cache for deterministic calls (llm_cache_* settings)
+        configure_llm_cache(self.app.settings)
+        # Shared request/token budgets per provider and model (rate_limits setting)
+        configure_scheduler(self.app.settings)
+        # Resident local transformers models and batching (local_model_* / local_batch_* settings)
+        configure_model_registry(self.app.settings)
+        # Latency/health tracking and circuit breaker (circuit_breaker_* settings)
+        configure_telemetry(self.app.settings)
 
     def get_providers(self):
         """Get all providers (defaults + custom)"""
@@ -53,18 +77,29 @@ class AIManager:
         except Exception:
             self.usage_logs = []
 
-    def _save_usage_logs(self):
+    def _save_usage_logs(self, logs=None):
         """Save usage logs to a file"""
         try:
             import os
             from app import SETTINGS_PATH
             log_path = os.path.join(os.path.dirname(SETTINGS_PATH), "usage_logs.json")
             with open(log_path, 'w') as f:
-                json.dump(self.usage_logs[-1000:], f) # Keep last 1000 logs
+                json.dump((self.usage_logs if logs is None else logs)[-USAGE_LOG_LIMIT:], f)
         except Exception:
             pass
 
-    def log_usage(self, provider, model, tokens_used=0):
+    def flush_usage_logs(self):
+        """Write buffered usage entries now (timer thread, or on exit)"""
+        with self._usage_write_lock:
+            with self._usage_lock:
+                if self._usage_flush is not None:
+                    self._usage_flush.cancel()
+                    self._usage_flush = None
+                logs = list(self.usage_logs)
+            # Outside _usage_lock so LLM calls logging usage never wait on disk I/O
+            self._save_usage_logs(logs)
+
+    def log_usage(self, provider, model, tokens_used=0, prompt_tokens=None, completion_tokens=None):
         """Log API usage"""
         from datetime import datetime
         log_entry = {
@@ -73,8 +108,120 @@ class AIManager:
             "model": model,
             "tokens": tokens_used
         }
-        self.usage_logs.append(log_entry)
-        self._save_usage_logs()
+        if prompt_tokens is not None:
+            log_entry["prompt_tokens"] = prompt_tokens
+            log_entry["completion_tokens"] = completion_tokens or 0
+        with self._usage_lock:
+            self.usage_logs.append(log_entry)
+            if len(self.usage_logs) > 2 * USAGE_LOG_LIMIT:
+                del self.usage_logs[:-USAGE_LOG_LIMIT]
+            if self._usage_flush is None:
+                # Buffer: one write per USAGE_FLUSH_DELAY instead of one per call
+                self._usage_flush = threading.Timer(USAGE_FLUSH_DELAY, self.flush_usage_logs)
+                self._usage_flush.daemon = True
+                self._usage_flush.start()
+
+    def _on_llm_usage(self, provider, model, prompt_tokens, completion_tokens):
+        """Usage sink registered with core.token_budget"""
+        self.log_usage(provider, model, prompt_tokens + completion_tokens,
+                       prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def get_context_window(self, provider_id=None, model=None):
+        """Context size in tokens for a provider's configured (or given) model"""
+        provider_id = provider_id or self.get_active_provider()
+        _, configured_model, _, provider_type = self.get_provider_config(provider_id)
+        return context_window(model or configured_model, provider_type)
+
+    def get_rate_limit_headroom(self):
+        """Remaining request/token budget per provider/model, as tracked by the scheduler"""
+        return get_scheduler().headroom()
+
+    def uses_local_transformers(self):
+        """True when Hugging Face calls run on local transformers instead of the API"""
+        url = str(self.app.settings.get("huggingface_url", ""))
+        return not url or "localhost" in url or "127.0.0.1" in url
+
+    def warm_up_local_models(self, agents):
+        """Preload local Hugging Face weights for a list of {"provider", "model"} agent configs"""
+        if not self.uses_local_transformers():
+            return None
+        models = [a.get("model") for a in agents if a.get("provider") == "huggingface" and a.get("model")]
+        if not models:
+            return None
+        return get_model_registry().warm_up(models)
+
+    def warm_up_ollama_models(self, agents, on_status=None):
+        """
+        Pull (if missing) and load into memory the Ollama models of a list of agent configs.
+
+        One model list request, then one background thread per distinct model, so a
+        group's models come up concurrently. on_status(text) receives progress lines.
+        Returns the background thread, or None when no agent uses Ollama.
+        """
+        models = list(dict.fromkeys(a.get("model") for a in agents if a.get("provider") == "ollama" and a.get("model")))
+        if not models:
+            return None
+        report = on_status or (lambda text: print(f"[Ollama] {text}"))
+
+        def _run(model, downloaded):
+            present = model in downloaded or (":" not in model and any(m.startswith(f"{model}:") for m in downloaded))
+            if not present:
+                report(f"Model '{model}' not found. Starting automatic pull...")
+                if not self.pull_ollama_model(model):
+                    report(f"Error: Failed to pull Ollama model '{model}'.")
+                    return
+                report(f"Successfully pulled Ollama model '{model}'.")
+            try:
+                # A generate request without a prompt only loads the model
+                url, _, _, _ = self.get_provider_config("ollama")
+                get_client().post(f"{url.rstrip('/')}/api/generate",
+                                  json={"model": model, "keep_alive": self.app.settings.get("ollama_keep_alive", "30m")},
+                                  timeout=120)
+            except Exception as e:
+                report(f"Warm-up failed for {model}: {e}")
+
+        def _start():
+            downloaded = self.fetch_available_models("ollama") or []
+            workers = [threading.Thread(target=_run, args=(m, downloaded), daemon=True, name=f"ollama-warmup-{m}")
+                       for m in models]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        worker = threading.Thread(target=_start, daemon=True, name="ollama-warmup")
+        worker.start()
+        return worker
+
+    def get_provider_health(self, provider_id=None):
+        """Rolling p50/p95 latency, error rate and circuit state per model (all, or one provider)"""
+        provider_type = None
+        if provider_id:
+            provider_type = self.get_providers().get(provider_id, {}).get("type", provider_id)
+        return get_telemetry().stats(provider=provider_type)
+
+    def get_health_summary(self, provider_id=None):
+        """One-line health text for the status bar (active provider/model by default)"""
+        provider_id = provider_id or self.get_active_provider()
+        _, model, _, provider_type = self.get_provider_config(provider_id)
+        stats = get_telemetry().stats(provider=provider_type)
+        entry = stats.get(f"{provider_type}/{model}")
+        if entry is None and stats:
+            # Tier routing may have sent traffic to a sibling model: show the busiest one
+            model, entry = max(((k.split("/", 1)[1], v) for k, v in stats.items()), key=lambda kv: kv[1]["calls"])
+        if not entry or not entry["calls"]:
+            return ""
+        if entry["state"] != "closed":
+            return f"⛔ {model}: circuit {entry['state'].replace('_', '-')}"
+        if entry["p50"] is None:
+            return f"⚠ {model}: {entry['error_rate']:.0%} errors"
+        return f"⚡ p50 {entry['p50']:.1f}s · p95 {entry['p95']:.1f}s · err {entry['error_rate']:.0%}"
+
+    def get_local_model_stats(self):
+        """Resident local models, their footprint and idle time, plus batching counters"""
+        stats = get_model_registry().stats()
+        stats["batching"] = get_local_batcher().stats()
+        return stats
 
     def get_active_provider(self):
         """Get primary active provider ID"""
@@ -191,14 +338,8 @@ class AIManager:
         max_tokens = params.get("max_tokens", self.app.settings.get("max_tokens", 2000))
         system_prompt = params.get("system_prompt", self.app.settings.get("system_prompt", "You are a helpful AI coding assistant. Provide clear, concise code and explanations."))
 
-        response = call_llm(full_prompt, url, model, provider_type, token, temperature=temperature, max_tokens=max_tokens, system_prompt=system_prompt)
-        
-        # Log usage (tokens estimation if not provided by response)
-        # Note: In a real app, we'd get actual token counts from the API response
-        tokens_estimate = len(full_prompt.split()) + len(response.split())
-        self.log_usage(provider_id, model, tokens_estimate)
-        
-        return response
+        # Token usage is reported to log_usage by call_llm itself (see _on_llm_usage)
+        return call_llm(full_prompt, url, model, provider_type, token, temperature=temperature, max_tokens=max_tokens, system_prompt=system_prompt)
 
     def summarize_project(self, project_path):
         """Generate a token-efficient summary of the project"""
@@ -341,7 +482,7 @@ class AIManager:
                 if "/models" in url and provider_id in ["mistral", "together"]: # already has models
                     models_url = url
 
-                resp = requests.get(models_url, headers=headers, timeout=10)
+                resp = get_client().get(models_url, headers=headers, timeout=10)
                 if resp.status_code == 200:
                     data = resp.json()
                     # Handle different response structures
@@ -357,7 +498,7 @@ class AIManager:
             elif provider_type == "ollama":
                 # Ollama local API
                 base_url = url.rstrip("/")
-                resp = requests.get(f"{base_url}/api/tags", timeout=5)
+                resp = get_client().get(f"{base_url}/api/tags", timeout=5)
                 if resp.status_code == 200:
                     data = resp.json()
                     return [m["name"] for m in data.get("models", [])]
@@ -367,7 +508,7 @@ class AIManager:
                 try:
                     # Try using params for filtering as suggested by user
                     params = {"pipeline_tag": "text-generation", "limit": 50, "sort": "downloads", "direction": -1}
-                    resp = requests.get("https://huggingface.co/api/models", params=params, timeout=10)
+                    resp = get_client().get("https://huggingface.co/api/models", params=params, timeout=10)
                     if resp.status_code == 200:
                         return [m["modelId"] for m in resp.json()]
                 except Exception:
@@ -386,7 +527,7 @@ class AIManager:
                 # Google Gemini models
                 if token:
                     # Try both Vertex and AI Studio
-                    resp = requests.get(f"https://generativelanguage.googleapis.com/v1/models?key={token}", timeout=10)
+                    resp = get_client().get(f"https://generativelanguage.googleapis.com/v1/models?key={token}", timeout=10)
                     if resp.status_code == 200:
                         data = resp.json()
                         return [m["name"].split("/")[-1] for m in data.get("models", []) if "generateContent" in m.get("supportedGenerationMethods", [])]
@@ -418,7 +559,7 @@ class AIManager:
         try:
             import json
             # Stream the pull response
-            resp = requests.post(f"{base_url}/api/pull", json={"name": model_name}, stream=True, timeout=None)
+            resp = get_client().post(f"{base_url}/api/pull", json={"name": model_name}, stream=True, timeout=None)
             for line in resp.iter_lines():
                 if line:
                     status = json.loads(line)
@@ -436,7 +577,7 @@ class AIManager:
         url, _, _, _ = self.get_provider_config("ollama")
         base_url = url.rstrip("/")
         try:
-            resp = requests.delete(f"{base_url}/api/delete", json={"name": model_name}, timeout=10)
+            resp = get_client().delete(f"{base_url}/api/delete", json={"name": model_name}, timeout=10)
             return resp.status_code == 200
         except Exception as e:
             print(f"Error deleting Ollama model {model_name}: {e}")
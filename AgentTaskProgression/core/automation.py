@@ -14,6 +14,7 @@ class AutomationManager:
         self.scheduled_jobs = {} # {id: {script, interval, last_run, next_run}}
         self.running = False
         self.monitor_thread = None
+        self._wakeup = threading.Condition()  # Signalled when jobs change or on stop
         
         # Setup automation logger
         self.logger = logging.getLogger("automation")
@@ -33,6 +34,8 @@ class AutomationManager:
     def stop_scheduler(self):
         """Stop the scheduler"""
         self.running = False
+        with self._wakeup:
+            self._wakeup.notify_all()
         if self.monitor_thread:
             self.monitor_thread.join(timeout=1.0)
             
@@ -46,7 +49,14 @@ class AutomationManager:
                     # Reschedule
                     job['last_run'] = now
                     job['next_run'] = now + job['interval']
-            time.sleep(1) # Check every second
+            # Sleep until the next job is due (or until jobs change / stop is requested)
+            with self._wakeup:
+                if not self.running:
+                    break
+                next_due = min((job['next_run'] for job in self.scheduled_jobs.values()), default=None)
+                timeout = None if next_due is None else max(0.0, next_due - time.time())
+                if timeout is None or timeout > 0:
+                    self._wakeup.wait(timeout)
 
     def schedule_script(self, script_path, interval_seconds):
         """Schedule a script to run periodically"""
@@ -62,6 +72,8 @@ class AutomationManager:
             "created_at": datetime.now().isoformat()
         }
         self.logger.info(f"Scheduled job {job_id}: {script_path} every {interval_seconds}s")
+        with self._wakeup:
+            self._wakeup.notify_all()
         return job_id, "Scheduled successfully"
 
     def _run_job(self, job_id):
@@ -2,13 +2,15 @@
 Base Agent - Abstract base class for all AI agents
 """
 from abc import ABC, abstractmethod
-import threading
 import queue
 import json
+import time
 from datetime import datetime
 
 class BaseAgent(ABC):
     """Abstract base class for AI agents"""
+
+    HISTORY_MESSAGE_TOKENS = 64  # Per-message cap for shared history injected into prompts
     
     def __init__(self, name, role, model_provider, model_name, orchestrator=None):
         self.name = name
@@ -20,37 +22,58 @@ class BaseAgent(ABC):
         self.status = "idle"  # idle, working, waiting
         self.message_queue = queue.Queue()
         self.history = []  # Conversation history
+        self.max_concurrency = 1  # Messages processed at once (1 keeps them in order)
         self._running = False
-        self._thread = None
         self._manual_token = None
         
     def start(self):
-        """Start the agent's message processing loop"""
+        """Start processing queued messages on the shared agent executor"""
+        from core.agent_runtime import get_agent_executor
         self._running = True
-        self._thread = threading.Thread(target=self._run_loop, daemon=True)
-        self._thread.start()
+        get_agent_executor().notify(self)
         
     def stop(self):
-        """Stop the agent"""
+        """Stop the agent (the message in progress finishes; queued ones are kept)"""
         self._running = False
-        if self._thread:
-            self._thread.join(timeout=1)
-            
-    def _run_loop(self):
-        """Main processing loop"""
-        while self._running:
+
+    def is_running(self):
+        return self._running
+
+    def _set_status(self, status):
+        self.status = status
+        if self.orchestrator and hasattr(self.orchestrator, "notify_agent_status"):
+            self.orchestrator.notify_agent_status(self)
+
+    def _handle_queued(self, message):
+        """Process one queued message (called on an executor worker)"""
+        from core.metrics import get_metrics, get_tracer
+        tracer = get_tracer()
+        trace = message.get("trace")
+        if message.get("queued_at"):
+            tracer.record("queue_wait", time.perf_counter() - message["queued_at"], parent=trace,
+                          agent=self.name, phase="queue_wait")
+        task = message.get("task")
+        if task is not None and not task.start(self.name):
+            return  # Cancelled or expired while queued
+        self._set_status("working")
+        result, error = None, None
+        with tracer.span("process", parent=trace, agent=self.name, phase="process", sender=message["from"]) as span:
             try:
-                message = self.message_queue.get(timeout=0.5)
-                self.status = "working"
-                self.receive_message(message["from"], message["content"])
-                self.status = "idle"
-                try:
-                    if hasattr(self.orchestrator, 'app') and self.orchestrator.app:
-                        self.orchestrator.app.event_generate('<<AgentDone>>', when='tail')
-                except Exception:
-                    pass
-            except queue.Empty:
-                pass
+                result = self.receive_message(message["from"], message["content"])
+            except Exception as e:
+                error = str(e)
+                self.log(f"Error processing message: {e}")
+            finally:
+                metrics = get_metrics()
+                metrics.counter("agent_messages_total", "Messages processed per agent", ("agent",)).inc(agent=self.name)
+                if error or (isinstance(result, str) and result.startswith("Error")):
+                    span.status = "error"
+                    metrics.counter("agent_errors_total", "Messages that ended in an error", ("agent",)).inc(agent=self.name)
+                if task is not None:
+                    task.complete(result, error)
+                self._set_status("idle")
+        if self.orchestrator and hasattr(self.orchestrator, "notify_agent_done"):
+            self.orchestrator.notify_agent_done(self)
                 
     def send_message(self, to_agent, content):
         """Send message to another agent via orchestrator"""
@@ -70,71 +93,119 @@ class BaseAgent(ABC):
         response = self.process(content)
         return response
         
-    def queue_message(self, from_agent, content):
-        """Queue a message for processing"""
-        self.message_queue.put({"from": from_agent, "content": content})
+    def queue_message(self, from_agent, content, task=None, trace=None):
+        """Queue a message for processing and wake a worker for it (trace: sender's span context)"""
+        from core.agent_runtime import get_agent_executor
+        self.message_queue.put({"from": from_agent, "content": content, "task": task,
+                                "trace": trace, "queued_at": time.perf_counter()})
+        if self._running:
+            get_agent_executor().notify(self)
         
     @abstractmethod
     def process(self, task):
         """Process a task - must be implemented by subclasses"""
         pass
         
-    def call_model(self, prompt, system_prompt=None):
-        """Call the configured AI model with shared context"""
-        # Inject shared history into prompt if available
-        context_str = ""
+    def build_model_request(self, prompt, system_prompt=None):
+        """Build the call_llm arguments for this agent (shared context, endpoint, key)"""
+        from core.token_budget import PromptBudget, PRIORITY_SYSTEM, PRIORITY_TASK, PRIORITY_HISTORY, truncate_to_tokens
+
+        # Fit system prompt, task and shared history into the model's context window
+        budget = PromptBudget(self.model_name, self.model_provider,
+                              reserve_output=self._get_setting("max_tokens", 512))
+        budget.add("system", system_prompt or "You are a helpful AI assistant.", PRIORITY_SYSTEM)
+        budget.add("task", prompt, PRIORITY_TASK)
+        # Group memory: summary of older turns, unchanged between summary versions so it
+        # can sit at the end of the system prompt as a cacheable prefix
+        ctx = getattr(self.orchestrator, "group_context", None) if self.orchestrator else None
+        if ctx is not None:
+            budget.add("memory", ctx.memory_block(), PRIORITY_HISTORY)
         if self.orchestrator and hasattr(self.orchestrator, 'shared_history'):
-            history = self.orchestrator.shared_history[-10:] # Last 10 messages
-            if history:
-                context_str = "\n--- Recent Inter-Agent Conversation ---\n"
-                for msg in history:
-                    context_str += f"{msg['from']} to {msg['to']}: {msg['content'][:200]}\n"
-                context_str += "--------------------------------------\n\n"
+            # Only the turns the summary does not cover yet (last 10 messages without a group memory)
+            history = ctx.recent_turns(10) if ctx is not None else self.orchestrator.shared_history[-10:]
+            budget.add_messages("history", [
+                f"{msg['from']} to {msg['to']}: {truncate_to_tokens(msg['content'], self.HISTORY_MESSAGE_TOKENS, self.model_name)}"
+                for msg in history
+            ])
+        fitted, _ = budget.fit()
+        prompt = fitted.get("task", prompt)
+        context_str = ""
+        if fitted.get("history"):
+            context_str = "\n--- Recent Inter-Agent Conversation ---\n" + fitted["history"] + "\n"
+            context_str += "--------------------------------------\n\n"
         
         full_prompt = context_str + prompt if context_str else prompt
+        system_prompt = system_prompt or "You are a helpful AI assistant."
+        if fitted.get("memory"):
+            system_prompt += "\n\n" + fitted["memory"]
         
+        # Resolve URL and Key
+        provider_type = self.model_provider
+        url = ""
+        key = ""
+        
+        if provider_type == "openai":
+            url = self._get_setting("openai_url", "https://api.openai.com/v1/chat/completions")
+            key = self._get_setting("openai_key", "")
+        elif provider_type == "anthropic":
+            url = self._get_setting("anthropic_url", "https://api.anthropic.com/v1/messages")
+            key = self._get_setting("anthropic_key", "")
+        elif provider_type == "google":
+            url = self._get_setting("google_url", "https://generativelanguage.googleapis.com/v1/models")
+            key = self._get_setting("google_key", "")
+        elif provider_type == "ollama":
+            url = self._get_setting("ollama_url", "http://localhost:11434")
+        elif provider_type == "huggingface":
+            url = self._get_setting("huggingface_url", "https://router.huggingface.co/hf-inference/v1/chat/completions")
+            key = self._get_hf_token()
+        else:
+            url = self._get_setting("custom_endpoint", "")
+            key = self._get_setting("custom_key", "")
+
+        # Get stop_event if available from orchestrator/app
+        stop_event = None
+        if self.orchestrator and hasattr(self.orchestrator, 'app') and self.orchestrator.app:
+            stop_event = getattr(self.orchestrator.app, 'stop_event', None)
+
+        request = {
+            "prompt": full_prompt,
+            "api_url": url,
+            "model": self.model_name,
+            "api_provider": provider_type,
+            "token": key,
+            "system_prompt": system_prompt,
+            "stop_event": stop_event,
+            "role": self.role
+        }
+        if fitted.get("memory"):
+            request["cache_system"] = True      # Anthropic cache_control on the system block
+        if provider_type == "ollama":
+            request["keep_alive"] = self._get_setting("ollama_keep_alive", "30m")  # Keep the evaluated prefix loaded
+        return request
+
+    def call_model(self, prompt, system_prompt=None, **kwargs):
+        """
+        Call the configured AI model with shared context (on the executor's LLM I/O pool).
+        Extra kwargs go to call_llm (e.g. cache=True to reuse a stored response).
+        """
         # Use centralized LLM caller
         try:
             from core.llm import call_llm
-            
-            # Resolve URL and Key
-            provider_type = self.model_provider
-            url = ""
-            key = ""
-            
-            if provider_type == "openai":
-                url = self._get_setting("openai_url", "https://api.openai.com/v1/chat/completions")
-                key = self._get_setting("openai_key", "")
-            elif provider_type == "anthropic":
-                url = self._get_setting("anthropic_url", "https://api.anthropic.com/v1/messages")
-                key = self._get_setting("anthropic_key", "")
-            elif provider_type == "google":
-                url = self._get_setting("google_url", "https://generativelanguage.googleapis.com/v1/models")
-                key = self._get_setting("google_key", "")
-            elif provider_type == "ollama":
-                url = self._get_setting("ollama_url", "http://localhost:11434")
-            elif provider_type == "huggingface":
-                url = self._get_setting("huggingface_url", "https://router.huggingface.co/hf-inference/v1/chat/completions")
-                key = self._get_hf_token()
-            else:
-                url = self._get_setting("custom_endpoint", "")
-                key = self._get_setting("custom_key", "")
-
-            # Get stop_event if available from orchestrator/app
-            stop_event = None
-            if self.orchestrator and hasattr(self.orchestrator, 'app') and self.orchestrator.app:
-                stop_event = getattr(self.orchestrator.app, 'stop_event', None)
+            from core.agent_runtime import get_agent_executor
+            request = self.build_model_request(prompt, system_prompt)
+            request.update(kwargs)
+            return get_agent_executor().run_llm(call_llm, **request)
+        except Exception as e:
+            self.log(f"Model call error: {e}")
+            return f"Error: {e}"
 
-            return call_llm(
-                prompt=full_prompt,
-                api_url=url,
-                model=self.model_name,
-                provider=provider_type,
-                token=key,
-                system_prompt=system_prompt or "You are a helpful AI assistant.",
-                stop_event=stop_event,
-                role=self.role
-            )
+    async def acall_model(self, prompt, system_prompt=None, **kwargs):
+        """Coroutine version of call_model for use with core.llm_async.llm_gather"""
+        try:
+            from core.llm_async import acall_llm
+            request = self.build_model_request(prompt, system_prompt)
+            request.update(kwargs)
+            return await acall_llm(**request)
         except Exception as e:
             self.log(f"Model call error: {e}")
             return f"Error: {e}"
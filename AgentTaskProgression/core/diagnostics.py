@@ -0,0 +1,277 @@
+"""
+Diagnostics - Background spelling/grammar checks and linting for editor buffers, reported as tag deltas
+"""
+import re
+import threading
+import zlib
+from collections import deque
+
+SPELL_WORDS = (
+    "the", "be", "to", "of", "and", "a", "in", "that", "have", "I", "it", "for", "not", "on", "with", "he", "as",
+    "you", "do", "at", "this", "but", "his", "by", "from", "they", "we", "say", "her", "she", "or", "an", "will",
+    "my", "one", "all", "would", "there", "their", "is", "are", "was", "were", "can", "could", "should", "shall",
+    "may", "might", "must", "if", "else", "elif", "while", "return", "class", "def", "import",
+)
+DIAGNOSTIC_TAGS = ("sp_error", "gr_error")
+LONG_LINE = 80                  # Longer lines not ending a sentence are flagged
+MAX_SUGGEST_DISTANCE = 3        # Edit distance searched for spelling suggestions
+
+_WORD = re.compile(r"[A-Za-z]{4,}")
+_SPACES = re.compile(r"\s{3,}")
+
+
+def edit_distance(a, b, limit=None):
+    """Levenshtein distance; with a limit, anything above it is returned as limit + 1"""
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        prev, row[0] = row[0], i
+        for j, cb in enumerate(b, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (ca != cb))
+        if limit is not None and min(row) > limit:
+            return limit + 1
+    return row[-1]
+
+
+class BKTree:
+    """
+    Lower-cased word set with edit-distance search.
+
+    Each node keeps its children by their distance to it, so a search within d of a
+    word only descends into children whose edge lies within d of the word's distance
+    to the node (triangle inequality) instead of measuring the whole dictionary.
+    """
+
+    def __init__(self, words=()):
+        self._root = None               # [word, {distance: child node}]
+        self._words = set()
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return len(self._words)
+
+    def __contains__(self, word):
+        return word.lower() in self._words
+
+    def add(self, word):
+        word = word.lower()
+        if not word or word in self._words:
+            return
+        self._words.add(word)
+        if self._root is None:
+            self._root = [word, {}]
+            return
+        node = self._root
+        while True:
+            d = edit_distance(word, node[0])
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [word, {}]
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        """[(distance, word)] within max_distance, nearest first"""
+        word = word.lower()
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_word, children = stack.pop()
+            d = edit_distance(word, node_word)
+            if d <= max_distance:
+                found.append((d, node_word))
+            for edge, child in children.items():
+                if d - max_distance <= edge <= d + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda item: (item[0], len(item[1]), item[1]))
+        return found
+
+    def suggest(self, word, limit=5, max_distance=MAX_SUGGEST_DISTANCE):
+        return [w for _, w in self.search(word, max_distance)[:limit]]
+
+
+def text_fingerprint(text):
+    """(length, CRC32) of a buffer snapshot, to tell whether a widget still shows it"""
+    return (len(text), zlib.crc32(text.encode("utf-8", "surrogatepass")))
+
+
+def check_line(line, dictionary):
+    """Problems in one line: ((tag, start column, end column), ...)"""
+    problems = [("gr_error", m.start(), m.end()) for m in _SPACES.finditer(line)]
+    stripped = line.strip()
+    if len(stripped) > LONG_LINE and stripped[-1] not in ".!?":
+        problems.append(("gr_error", max(0, len(line) - 1), len(line)))
+    problems += [("sp_error", m.start(), m.end()) for m in _WORD.finditer(line) if m.group(0) not in dictionary]
+    return tuple(problems)
+
+
+class TagDelta:
+    """
+    Result of a check: the problems of lines [first, first + len(lines)) of the checked
+    snapshot, which replaced old_count lines of the previously accepted one. Lines are
+    0-based; every other line is unchanged and keeps its tags.
+    """
+    __slots__ = ("key", "generation", "first", "old_count", "lines", "line_count", "fingerprint")
+
+    def __init__(self, key, generation, first, old_count, lines, line_count, fingerprint=None):
+        self.key = key
+        self.generation = generation
+        self.first = first
+        self.old_count = old_count
+        self.lines = lines              # Per line: ((tag, start column, end column), ...)
+        self.line_count = line_count
+        self.fingerprint = fingerprint  # text_fingerprint() of the checked snapshot
+
+
+class DiagnosticsService:
+    """
+    Worker threads checking buffer snapshots and linting files off the UI thread.
+
+    check() takes the buffer text; the worker compares its lines with the last snapshot
+    the caller accepted for that buffer, re-checks only the changed run of lines and
+    hands back a TagDelta. Queued work for the same buffer (or file) is coalesced to the
+    newest. A delta becomes the baseline for the next check only once accept() is
+    called, so a caller may drop a delta whose buffer changed meanwhile and the next
+    check still covers both edits.
+
+    Lint runs on its own worker: Linter.lint_file starts subprocesses (up to 10 s
+    each), and a save must not hold up the spelling deltas of every open tab.
+    """
+
+    def __init__(self, dictionary=None, linter=None):
+        self.dictionary = dictionary if dictionary is not None else BKTree(SPELL_WORDS)
+        self.linter = linter           # core.linter.Linter, created on first lint() if not given
+        self._cond = threading.Condition()
+        self._jobs = {}                 # (kind, key) -> job, newest only
+        self._order = {"check": deque(), "lint": deque()}     # Per worker, oldest first
+        self._baselines = {}            # key -> (lines, problems) accepted by the caller
+        self._candidates = {}           # key -> (generation, lines, problems) awaiting accept()
+        self._generation = 0
+        self._threads = {}              # kind -> worker thread
+        self._closed = False
+
+    # --- Public API ---
+    def check(self, key, text, callback, touched=None):
+        """
+        Queue a buffer snapshot; callback(TagDelta) runs on the worker if any line changed.
+        touched: (first, last) 0-based lines edited since the last check, re-checked even
+        if their text came back the same (an undo reinserts text without its tags).
+        """
+        with self._cond:
+            self._generation += 1
+            self._submit(("check", key), (self._generation, text, callback, touched))
+            return self._generation
+
+    def lint(self, file_path, callback):
+        """Queue a Linter run on a saved file; callback(issues) runs on the worker"""
+        with self._cond:
+            self._submit(("lint", file_path), callback)
+
+    def accept(self, key, generation):
+        """The caller applied the delta of this generation: later checks diff against it"""
+        with self._cond:
+            candidate = self._candidates.get(key)
+            if candidate is not None and candidate[0] == generation:
+                self._baselines[key] = candidate[1:]
+                del self._candidates[key]
+
+    def forget(self, key):
+        with self._cond:
+            self._baselines.pop(key, None)
+            self._candidates.pop(key, None)
+            self._jobs.pop(("check", key), None)
+
+    def suggest(self, word, limit=5):
+        return self.dictionary.suggest(word, limit)
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            self._jobs.clear()
+            self._cond.notify_all()
+
+    # --- Worker ---
+    def _submit(self, job_key, job):
+        if self._closed:
+            return
+        kind = job_key[0]
+        if job_key not in self._jobs:
+            self._order[kind].append(job_key)
+        self._jobs[job_key] = job
+        if kind not in self._threads:
+            name = "diagnostics" if kind == "check" else "diagnostics-" + kind
+            self._threads[kind] = threading.Thread(target=self._run, args=(kind,), daemon=True, name=name)
+            self._threads[kind].start()
+        self._cond.notify_all()
+
+    def _run(self, kind):
+        order = self._order[kind]
+        while True:
+            with self._cond:
+                while not order and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                job_key = order.popleft()
+                job = self._jobs.pop(job_key, None)
+                baseline = self._baselines.get(job_key[1], ((), ()))
+            if job is None:
+                continue                # Forgotten while queued
+            try:
+                if kind == "check":
+                    self._check(job_key[1], job, baseline)
+                else:
+                    job(self._lint(job_key[1]))
+            except Exception as e:
+                print(f"[Diagnostics] {e}")
+
+    def _check(self, key, job, baseline):
+        generation, text, callback, touched = job
+        old_lines, old_problems = baseline
+        lines = text.split("\n")
+        limit = min(len(old_lines), len(lines))
+        head = 0
+        while head < limit and old_lines[head] == lines[head]:
+            head += 1
+        tail = 0
+        while tail < limit - head and old_lines[-1 - tail] == lines[-1 - tail]:
+            tail += 1
+        if touched is not None:
+            first, last = (max(0, min(line, len(lines) - 1)) for line in touched)
+            head = min(head, first)
+            tail = min(tail, len(lines) - 1 - last)
+        old_count = len(old_lines) - head - tail
+        changed = [check_line(line, self.dictionary) for line in lines[head:len(lines) - tail]]
+        problems = old_problems[:head] + tuple(changed) + old_problems[len(old_problems) - tail:]
+        with self._cond:
+            if ("check", key) in self._jobs:
+                return                  # Superseded by a newer snapshot of the same buffer
+            if not changed and not old_count:
+                self._baselines[key] = (lines, problems)
+                return
+            self._candidates[key] = (generation, lines, problems)
+        callback(TagDelta(key, generation, head, old_count, changed, len(lines), text_fingerprint(text)))
+
+    def _lint(self, file_path):
+        if self.linter is None:
+            from core.linter import Linter
+            self.linter = Linter()
+        return self.linter.lint_file(file_path)
+
+
+_SERVICE = None
+_SERVICE_LOCK = threading.Lock()
+
+
+def get_diagnostics():
+    """Process-wide diagnostics service shared by all editor tabs"""
+    global _SERVICE
+    if _SERVICE is None:
+        with _SERVICE_LOCK:
+            if _SERVICE is None:
+                _SERVICE = DiagnosticsService()
+    return _SERVICE
@@ -0,0 +1,200 @@
+"""
+Document - Piece table text buffer with a line index, incremental fingerprint and line-level diff apply
+"""
+import re
+import zlib
+from bisect import bisect_left, bisect_right
+from difflib import SequenceMatcher
+
+DIFF_MAX_LINES = 20000          # Changed region size above which apply_text replaces it as one edit
+LOAD_PIECE_CHARS = 1 << 20      # Initial text is split into pieces of this size (bounds fingerprint rework)
+
+_NEWLINE = re.compile("\n")
+
+
+class _Source:
+    """An immutable string a piece points into, with the offsets of its newlines computed once"""
+    __slots__ = ("text", "newlines")
+
+    def __init__(self, text):
+        self.text = text
+        self.newlines = [m.start() for m in _NEWLINE.finditer(text)]
+
+
+class _Piece:
+    __slots__ = ("source", "start", "end", "nl_lo", "nl_hi")
+
+    def __init__(self, source, start, end):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.nl_lo = bisect_left(source.newlines, start)   # Newlines of source inside [start, end)
+        self.nl_hi = bisect_left(source.newlines, end)
+
+    def text(self):
+        return self.source.text[self.start:self.end]
+
+
+class Document:
+    """
+    Canonical text of an open file.
+
+    Text lives in immutable sources (the file as read, then one per insert) and the
+    document is a list of pieces pointing into them, so an edit splits at most one piece
+    instead of copying the buffer. Lines are located through per-source newline offsets
+    and per-piece prefix counts; fingerprint() re-checksums only from the first piece
+    changed since it was last called. Line numbers here are 0-based.
+    """
+
+    def __init__(self, text=""):
+        source = _Source(text)
+        self._pieces = [_Piece(source, i, min(i + LOAD_PIECE_CHARS, len(text)))
+                        for i in range(0, len(text), LOAD_PIECE_CHARS)]
+        self.version = 0
+        self._crcs = []                 # CRC32 of the text up to and including piece i
+        self._reindex()
+
+    # --- Index ---
+    def _reindex(self, changed_from=0):
+        self._offsets, self._line_prefix = [], []   # Char offset / newlines before piece i
+        offset = lines = 0
+        for piece in self._pieces:
+            self._offsets.append(offset)
+            self._line_prefix.append(lines)
+            offset += piece.end - piece.start
+            lines += piece.nl_hi - piece.nl_lo
+        self._length, self._newlines = offset, lines
+        del self._crcs[changed_from:]
+
+    def __len__(self):
+        return self._length
+
+    def line_count(self):
+        return self._newlines + 1
+
+    def line_offset(self, line):
+        """Char offset where a line starts (line_count() maps to the end)"""
+        if line <= 0:
+            return 0
+        if line > self._newlines:
+            return self._length
+        k = bisect_right(self._line_prefix, line - 1) - 1
+        piece = self._pieces[k]
+        nl = piece.source.newlines[piece.nl_lo + line - 1 - self._line_prefix[k]]
+        return self._offsets[k] + nl - piece.start + 1
+
+    def line_of(self, offset):
+        """Line containing a char offset"""
+        if offset >= self._length:
+            return self._newlines
+        k = bisect_right(self._offsets, offset) - 1
+        piece = self._pieces[k]
+        local = piece.start + offset - self._offsets[k]
+        return self._line_prefix[k] + bisect_left(piece.source.newlines, local, piece.nl_lo, piece.nl_hi) - piece.nl_lo
+
+    # --- Reading ---
+    def get(self, start=0, end=None):
+        end = self._length if end is None else min(end, self._length)
+        if start >= end:
+            return ""
+        k = bisect_right(self._offsets, start) - 1
+        parts = []
+        while k < len(self._pieces) and self._offsets[k] < end:
+            piece, base = self._pieces[k], self._offsets[k]
+            parts.append(piece.source.text[piece.start + max(0, start - base):piece.start + min(end - base, piece.end - piece.start)])
+            k += 1
+        return "".join(parts)
+
+    def get_lines(self, first, count):
+        """Text of `count` lines from `first`, without the final line break"""
+        end_line = first + count
+        end = self.line_offset(end_line) - 1 if end_line <= self._newlines else self._length
+        return self.get(self.line_offset(first), end)
+
+    def chunks(self):
+        """The text piece by piece (for writing large files without joining them)"""
+        for piece in self._pieces:
+            yield piece.text()
+
+    def text(self):
+        return "".join(self.chunks())
+
+    def fingerprint(self):
+        """(length, CRC32) of the text; pieces unchanged since the last call are not re-read"""
+        crc = self._crcs[-1] if self._crcs else 0
+        for piece in self._pieces[len(self._crcs):]:
+            crc = zlib.crc32(piece.text().encode("utf-8", "surrogatepass"), crc)
+            self._crcs.append(crc)
+        return (self._length, crc)
+
+    # --- Editing ---
+    def _split(self, offset):
+        """Index of the piece starting at offset, splitting the piece that spans it"""
+        if offset >= self._length:
+            return len(self._pieces)
+        k = bisect_right(self._offsets, offset) - 1
+        if self._offsets[k] == offset:
+            return k
+        piece = self._pieces[k]
+        cut = piece.start + offset - self._offsets[k]
+        self._pieces[k:k + 1] = [_Piece(piece.source, piece.start, cut), _Piece(piece.source, cut, piece.end)]
+        self._offsets.insert(k + 1, offset)     # Kept valid for the second _split of replace()
+        return k + 1
+
+    def replace(self, start, end, text):
+        """Replace chars [start, end) with text"""
+        start = max(0, min(start, self._length))
+        end = max(start, min(end, self._length))
+        if start == end and not text:
+            return
+        first = self._split(start)
+        last = self._split(end)
+        self._pieces[first:last] = [_Piece(_Source(text), 0, len(text))] if text else []
+        self.version += 1
+        self._reindex(changed_from=max(0, first - 1))  # A split also changed the piece before
+
+    def insert(self, offset, text):
+        self.replace(offset, offset, text)
+
+    def delete(self, start, end):
+        self.replace(start, end, "")
+
+    def replace_lines(self, first, count, lines):
+        """Replace `count` lines from `first` with a list of lines"""
+        if first + count <= self._newlines:     # A line follows: edit whole lines with their breaks
+            self.replace(self.line_offset(first), self.line_offset(first + count),
+                         "".join(line + "\n" for line in lines))
+        elif first > 0:                         # Runs to the end: attach to the previous line's break
+            start = self.line_offset(first) - 1 if first <= self._newlines else self._length
+            self.replace(start, self._length, "".join("\n" + line for line in lines))
+        else:
+            self.replace(0, self._length, "\n".join(lines))
+
+    def diff(self, new_text):
+        """Line edits (first, old count, new lines) turning this text into new_text, last edit first"""
+        old_lines = self.text().split("\n")
+        new_lines = new_text.split("\n")
+        head = 0
+        limit = min(len(old_lines), len(new_lines))
+        while head < limit and old_lines[head] == new_lines[head]:
+            head += 1
+        tail = 0
+        while tail < limit - head and old_lines[-1 - tail] == new_lines[-1 - tail]:
+            tail += 1
+        old_mid = old_lines[head:len(old_lines) - tail]
+        new_mid = new_lines[head:len(new_lines) - tail]
+        if not old_mid and not new_mid:
+            return []
+        if len(old_mid) + len(new_mid) > DIFF_MAX_LINES:
+            return [(head, len(old_mid), new_mid)]
+        edits = [(head + i1, i2 - i1, new_mid[j1:j2])
+                 for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_mid, new_mid, autojunk=False).get_opcodes()
+                 if tag != "equal"]
+        return edits[::-1]
+
+    def apply_text(self, new_text):
+        """Change the text to new_text through minimal line edits; returns the edits applied"""
+        edits = self.diff(new_text)
+        for first, count, lines in edits:
+            self.replace_lines(first, count, lines)
+        return edits
@@ -0,0 +1,171 @@
+"""
+Group Context - Rolling, incrementally summarized memory of an agent group's conversation
+"""
+import json
+import os
+import threading
+
+from core.token_budget import count_tokens, truncate_to_tokens
+
+RECENT_TURNS = 6                # Turns always kept verbatim after the summary
+SUMMARIZE_BATCH = 8             # Unsummarized turns beyond RECENT_TURNS that trigger a summary update
+SUMMARY_TOKENS = 400            # Target size of the running summary
+TURN_TOKENS = 300               # Per-turn cap when feeding turns to the summarizer
+
+SUMMARY_SYSTEM_PROMPT = ("You maintain the running memory of a multi-agent coding session. "
+                         "Merge the new messages into the summary. Keep decisions, file names, "
+                         "open problems and who is doing what; drop pleasantries and repeated code. "
+                         "Reply with the updated summary only.")
+
+
+class GroupContext:
+    """
+    Shared memory for the current agent group.
+
+    Every routed message is appended as a turn. Once more than RECENT_TURNS +
+    SUMMARIZE_BATCH turns are unsummarized, the older ones are condensed in the
+    background (once, by a cheap model via `summarizer(prompt, system_prompt, max_tokens)`; an extractive digest
+    when that fails) into a running summary whose version then increases. Agents put
+    memory_block() - identical for every call until the next version - at the end of
+    their system prompt, so provider prefix caches stay warm, and only the few recent
+    verbatim turns vary between hops.
+    """
+
+    def __init__(self, summarizer=None, recent_turns=RECENT_TURNS, summarize_batch=SUMMARIZE_BATCH,
+                 summary_tokens=SUMMARY_TOKENS):
+        self.summarizer = summarizer
+        self.keep_recent = recent_turns
+        self.summarize_batch = summarize_batch
+        self.summary_tokens = summary_tokens
+        self.group = None
+        self.path = None
+        self.summary = ""
+        self.version = 0
+        self.covered_until = ""         # Timestamp of the newest summarized turn
+        self._turns = []                # Unsummarized turns, oldest first
+        self._cache = {}                # (group, version) -> memory block text
+        self._summarizing = False
+        self._generation = 0            # Bumped by reset() so stale summaries are discarded
+        self._lock = threading.Lock()
+
+    # --- Group lifecycle ---
+    def reset(self, group, history=(), path=None):
+        """Switch to a group: restore its saved summary and keep the turns it does not cover"""
+        with self._lock:
+            self.group, self.path = group, path
+            self._generation += 1
+            self.summary, self.version, self.covered_until = "", 0, ""
+            saved = self._read(path)
+            if saved:
+                self.summary = saved.get("summary", "")
+                self.version = int(saved.get("version", 0))
+                self.covered_until = saved.get("covered_until", "")
+            self._turns = [t for t in history if t.get("timestamp", "") > self.covered_until]
+        self._maybe_summarize()
+
+    def bind(self, group, path):
+        """Keep the current memory under a (new) group name, e.g. after save_config"""
+        with self._lock:
+            self.group, self.path = group, path
+            self._write_locked()
+
+    def append(self, message):
+        with self._lock:
+            self._turns.append(message)
+        self._maybe_summarize()
+
+    # --- Prompt parts ---
+    def memory_block(self):
+        """Stable summary text for the system prompt ("" until the first summary exists)"""
+        with self._lock:
+            if not self.summary:
+                return ""
+            key = (self.group, self.version)
+            block = self._cache.get(key)
+            if block is None:
+                block = f"--- Shared memory of this agent group (v{self.version}) ---\n{self.summary}"
+                self._cache = {key: block}
+            return block
+
+    def recent_turns(self, limit=10):
+        """Verbatim turns not yet folded into the summary (newest last)"""
+        with self._lock:
+            return list(self._turns[-limit:])
+
+    # --- Summarization ---
+    def _maybe_summarize(self):
+        with self._lock:
+            if self._summarizing or len(self._turns) <= self.keep_recent + self.summarize_batch:
+                return
+            batch = self._turns[:len(self._turns) - self.keep_recent]
+            previous, generation = self.summary, self._generation
+            self._summarizing = True
+        threading.Thread(target=self._summarize, args=(generation, previous, batch),
+                         name="group-summary", daemon=True).start()
+
+    def _summarize(self, generation, previous, batch):
+        try:
+            summary = self._condense(previous, batch)
+        except Exception as e:
+            print(f"[GroupContext] Summary failed: {e}")
+            summary = self._digest(previous, batch)
+        with self._lock:
+            self._summarizing = False
+            if generation != self._generation:
+                return      # Group reloaded while summarizing
+            self.summary = summary
+            self.version += 1
+            self.covered_until = batch[-1].get("timestamp", self.covered_until)
+            self._turns = self._turns[len(batch):]
+            self._write_locked()
+        self._maybe_summarize()
+
+    def _format_turns(self, batch):
+        return "\n".join(f"{t.get('from', '?')} -> {t.get('to', '?')}: "
+                         f"{truncate_to_tokens(str(t.get('content', '')), TURN_TOKENS)}" for t in batch)
+
+    def _condense(self, previous, batch):
+        if self.summarizer is None:
+            return self._digest(previous, batch)
+        prompt = (f"Current summary:\n{previous or '(empty)'}\n\nNew messages:\n{self._format_turns(batch)}\n\n"
+                  f"Updated summary (at most {self.summary_tokens} tokens):")
+        result = self.summarizer(prompt, SUMMARY_SYSTEM_PROMPT, self.summary_tokens)
+        if not isinstance(result, str) or not result.strip() or result.startswith("Error"):
+            return self._digest(previous, batch)
+        return truncate_to_tokens(result.strip(), self.summary_tokens * 2)
+
+    def _digest(self, previous, batch):
+        """Extractive fallback: previous summary plus one clipped line per turn, newest kept"""
+        lines = [previous] if previous else []
+        lines += [f"- {t.get('from', '?')} -> {t.get('to', '?')}: "
+                  f"{truncate_to_tokens(' '.join(str(t.get('content', '')).split()), 40)}" for t in batch]
+        return truncate_to_tokens("\n".join(lines), self.summary_tokens, keep="tail")
+
+    # --- Persistence ---
+    def _read(self, path):
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else None
+        except Exception as e:
+            print(f"[GroupContext] Failed to read {path}: {e}")
+            return None
+
+    def _write_locked(self):
+        if not self.path:
+            return
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"group": self.group, "version": self.version, "summary": self.summary,
+                           "covered_until": self.covered_until}, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"[GroupContext] Failed to save {self.path}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {"group": self.group, "version": self.version, "unsummarized": len(self._turns),
+                    "summary_tokens": count_tokens(self.summary), "summarizing": self._summarizing}
@@ -0,0 +1,180 @@
+"""
+History Journal - Append-only JSONL store for agent-group shared history
+"""
+import json
+import os
+import threading
+from collections import deque
+
+DEFAULT_WINDOW = 100            # Messages kept in memory and after compaction
+DEFAULT_FLUSH_INTERVAL = 1.0    # Seconds between batched fsyncs
+COMPACT_FACTOR = 4              # Compact once the journal holds window * factor lines
+
+
+class HistoryWindow(deque):
+    """Bounded deque that also supports slicing (history[-10:]) like the old list"""
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        return super().__getitem__(index)
+
+
+class HistoryJournal:
+    """
+    Append-only journal for one agent group.
+
+    append() writes a single JSON line instead of re-serializing the whole history;
+    fsync is batched on a debounce timer. Once the file grows past COMPACT_FACTOR
+    windows it is atomically rewritten with just the last window. load() skips torn
+    or corrupt lines left by a crash and repairs the file before appending again.
+    """
+
+    def __init__(self, path, window=DEFAULT_WINDOW, flush_interval=DEFAULT_FLUSH_INTERVAL, legacy_path=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.window = window
+        self.flush_interval = flush_interval
+        self._tail = deque(maxlen=window)
+        self._lines = 0
+        self._fh = None
+        self._dirty = False
+        self._timer = None
+        self._lock = threading.Lock()
+
+    # --- Recovery ---
+    def load(self):
+        """Read the journal (or migrate the legacy JSON file); returns the last window of entries"""
+        with self._lock:
+            self._close_locked()
+            entries, needs_repair = self._read_journal()
+            if entries is None:
+                entries = self._read_legacy()
+                needs_repair = bool(entries)
+            self._tail = deque(entries, maxlen=self.window)
+            self._lines = len(entries)
+            if needs_repair or self._lines > len(self._tail):
+                self._compact_locked()
+            return list(self._tail)
+
+    def _read_journal(self):
+        """(entries, needs_repair), or (None, False) when there is no journal yet"""
+        if not os.path.exists(self.path):
+            return None, False
+        entries, needs_repair = [], False
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if data and not data.endswith(b"\n"):
+            needs_repair = True     # torn final write
+        for raw in data.splitlines():
+            if not raw.strip():
+                continue
+            try:
+                item = json.loads(raw.decode("utf-8"))
+            except (ValueError, UnicodeDecodeError):
+                needs_repair = True
+                continue
+            if isinstance(item, dict):
+                entries.append(item)
+        if needs_repair:
+            print(f"[History] Recovered {len(entries)} entries from damaged journal {self.path}")
+        return entries, needs_repair
+
+    def _read_legacy(self):
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return []
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return [item for item in data if isinstance(item, dict)] if isinstance(data, list) else []
+        except Exception as e:
+            print(f"[History] Failed to read legacy history {self.legacy_path}: {e}")
+            return []
+
+    # --- Writing ---
+    def append(self, entry):
+        """Append one message; durable after the next debounced flush"""
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._fh is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._fh = open(self.path, "a", encoding="utf-8", newline="\n")
+            self._fh.write(line)
+            self._tail.append(entry)
+            self._lines += 1
+            self._dirty = True
+            if self._lines > self.window * COMPACT_FACTOR:
+                self._compact_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def rewrite(self, entries):
+        """Replace the journal with entries (e.g. history carried into a newly saved group)"""
+        with self._lock:
+            self._tail = deque(entries, maxlen=self.window)
+            self._compact_locked()
+
+    def cursor(self):
+        """Flushed journal size in bytes: where a reader that has seen everything so far stands"""
+        with self._lock:
+            self._flush_locked()
+            try:
+                return os.path.getsize(self.path)
+            except OSError:
+                return 0
+
+    def adopt(self, entries, cursor):
+        """
+        Use entries as the window without reading the file, if nothing was written since
+        cursor() (e.g. restoring a snapshot); returns False when the caller must load().
+        """
+        with self._lock:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                size = 0
+            if size != cursor:
+                return False
+            self._close_locked()
+            self._tail = deque(entries, maxlen=self.window)
+            self._lines = len(self._tail)
+            return True
+
+    def flush(self):
+        """Flush and fsync pending appends"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._fh is not None and self._dirty:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+        self._dirty = False
+
+    def _compact_locked(self):
+        """Atomically rewrite the journal with the in-memory window"""
+        self._close_locked()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+            for entry in self._tail:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._lines = len(self._tail)
+
+    def _close_locked(self):
+        self._flush_locked()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def close(self):
+        with self._lock:
+            self._close_locked()
@@ -0,0 +1,171 @@
+"""
+Provider HTTP Client - Shared, pooled keep-alive transport for all LLM traffic
+"""
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_CONNECTIONS = 10   # Number of host pools kept per session
+DEFAULT_POOL_MAXSIZE = 16       # Concurrent keep-alive connections per host
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 20.0
+
+
+class ProviderClient:
+    """
+    Thread-safe HTTP client with one pooled session per host.
+
+    Every provider endpoint (api.openai.com, router.huggingface.co, localhost:11434, ...)
+    gets its own requests.Session so TCP/TLS connections are reused across agent turns.
+    urllib3 pools are safe to share between threads; only session creation is locked.
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._response_hooks = []
+
+    def configure(self, pool_connections=None, pool_maxsize=None, connect_timeout=None, read_timeout=None):
+        """Update pool sizes / timeouts. Pool size changes rebuild the sessions lazily."""
+        rebuild = False
+        with self._lock:
+            if pool_connections and pool_connections != self.pool_connections:
+                self.pool_connections = int(pool_connections)
+                rebuild = True
+            if pool_maxsize and pool_maxsize != self.pool_maxsize:
+                self.pool_maxsize = int(pool_maxsize)
+                rebuild = True
+            if connect_timeout:
+                self.connect_timeout = float(connect_timeout)
+            if read_timeout:
+                self.read_timeout = float(read_timeout)
+        if rebuild:
+            self.close()
+
+    def _host_key(self, url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=False,
+            max_retries=0
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Connection": "keep-alive"})
+        return session
+
+    def session_for(self, url):
+        """Get (or lazily create) the pooled session for the host of url"""
+        key = self._host_key(url)
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = self._new_session()
+                    self._sessions[key] = session
+        return session
+
+    def resolve_timeout(self, timeout=None):
+        """
+        Split a timeout into (connect, read).
+
+        Callers historically pass a single number meaning "how long to wait for the model";
+        that becomes the read timeout while the connect timeout stays short.
+        """
+        if isinstance(timeout, (tuple, list)):
+            return tuple(timeout)
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        return (min(self.connect_timeout, float(timeout)), float(timeout))
+
+    def add_response_hook(self, hook):
+        """Register hook(response) called after every request (e.g. rate-limit header tracking)"""
+        if hook not in self._response_hooks:
+            self._response_hooks.append(hook)
+
+    def request(self, method, url, timeout=None, **kwargs):
+        session = self.session_for(url)
+        # timeout=None on a streaming pull means "no read timeout"
+        if timeout is None and kwargs.get("stream"):
+            resolved = (self.connect_timeout, None)
+        else:
+            resolved = self.resolve_timeout(timeout)
+        response = session.request(method, url, timeout=resolved, **kwargs)
+        for hook in self._response_hooks:
+            try:
+                hook(response)
+            except Exception:
+                pass
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def stats(self):
+        """Return the hosts currently holding a pooled session"""
+        with self._lock:
+            return {
+                "hosts": sorted(self._sessions.keys()),
+                "pool_connections": self.pool_connections,
+                "pool_maxsize": self.pool_maxsize,
+                "connect_timeout": self.connect_timeout,
+                "read_timeout": self.read_timeout
+            }
+
+    def close(self):
+        """Close all pooled connections"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client():
+    """Process-wide provider client shared by core.llm and AIManager"""
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = ProviderClient()
+    return _CLIENT
+
+
+def configure_client(settings):
+    """Apply http_* values from the IDE settings dict to the shared client"""
+    if not settings:
+        return get_client()
+    client = get_client()
+    client.configure(
+        pool_connections=settings.get("http_pool_connections"),
+        pool_maxsize=settings.get("http_pool_maxsize"),
+        connect_timeout=settings.get("http_connect_timeout"),
+        read_timeout=settings.get("http_read_timeout")
+    )
+    return client
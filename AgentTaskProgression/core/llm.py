@@ -5,7 +5,15 @@ import requests
 import json
 import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Optional
+from core.http_client import get_client
+from core.llm_cache import get_llm_cache, make_cache_key
+from core.rate_limiter import get_scheduler
+from core.token_budget import count_tokens, report_usage, take_provider_usage, note_provider_usage
+from core.telemetry import classify_error, get_telemetry
+from core.metrics import get_metrics, get_tracer
 try:
     from huggingface_hub import InferenceClient, list_models
     HAS_HF = True
@@ -15,23 +23,23 @@ except Exception:
 # Model Tiers with capability metadata
 MODEL_TIERS = {
     "openai": {
-        "small": {"name": "gpt-4o-mini", "coding": 3, "reasoning": 3, "speed": 5},
-        "large": {"name": "gpt-4o", "coding": 5, "reasoning": 5, "speed": 3},
+        "small": {"name": "gpt-4o-mini", "coding": 3, "reasoning": 3, "speed": 5, "context": 128000},
+        "large": {"name": "gpt-4o", "coding": 5, "reasoning": 5, "speed": 3, "context": 128000},
         "default": "small"
     },
     "anthropic": {
-        "small": {"name": "claude-3-haiku-20240307", "coding": 3, "reasoning": 3, "speed": 5},
-        "large": {"name": "claude-3-5-sonnet-20240620", "coding": 5, "reasoning": 5, "speed": 4},
+        "small": {"name": "claude-3-haiku-20240307", "coding": 3, "reasoning": 3, "speed": 5, "context": 200000},
+        "large": {"name": "claude-3-5-sonnet-20240620", "coding": 5, "reasoning": 5, "speed": 4, "context": 200000},
         "default": "small"
     },
     "google": {
-        "small": {"name": "gemini-1.5-flash", "coding": 3, "reasoning": 3, "speed": 5},
-        "large": {"name": "gemini-1.5-pro", "coding": 5, "reasoning": 5, "speed": 2},
+        "small": {"name": "gemini-1.5-flash", "coding": 3, "reasoning": 3, "speed": 5, "context": 1000000},
+        "large": {"name": "gemini-1.5-pro", "coding": 5, "reasoning": 5, "speed": 2, "context": 2000000},
         "default": "small"
     },
     "ollama": {
-        "small": {"name": "llama3:8b", "coding": 2, "reasoning": 2, "speed": 4},
-        "large": {"name": "llama3:70b", "coding": 4, "reasoning": 4, "speed": 2},
+        "small": {"name": "llama3:8b", "coding": 2, "reasoning": 2, "speed": 4, "context": 8192},
+        "large": {"name": "llama3:70b", "coding": 4, "reasoning": 4, "speed": 2, "context": 8192},
         "default": "small"
     }
 }
@@ -46,6 +54,23 @@ def get_model_for_task(api_provider, tier="small"):
         return tier_info.get("name")
     return tier_info
 
+def _resolve_tier_model(model, api_provider, tier="small", task_type=None):
+    """
+    Map tier keywords / provider names to a concrete model id.
+
+    Tier requests are routed adaptively: the fastest healthy model that meets the
+    tier's capability score wins (see core.telemetry.ProviderTelemetry.choose_model).
+    """
+    # If the provided model is a tier keyword or provider name
+    if model in ["small", "large", "default"]:
+        if model == "default":
+            model = MODEL_TIERS.get(api_provider, {}).get("default", "small")
+        return get_telemetry().choose_model(api_provider, model, task_type) or get_model_for_task(api_provider, model)
+    if model in MODEL_TIERS:
+        return get_telemetry().choose_model(model, tier, task_type) or get_model_for_task(model, tier)
+    # If it's a specific model string like "gpt-4o", use it directly.
+    return model
+
 def call_llm(prompt, api_url, model, api_provider="openai", token=None, stop_event=None, **kwargs):
     """
     Call LLM with automatic model tier routing and capability awareness
@@ -60,23 +85,138 @@ def call_llm(prompt, api_url, model, api_provider="openai", token=None, stop_eve
         **kwargs: 
             tier: "small", "large" (default: "small")
             task_type: "coding", "reasoning", "speed" (future use)
+            cache: True/False to force response caching on/off
+                   (default: cache only deterministic calls, i.e. temperature 0)
                 
     Returns:
         Generated text response
     """
+    with get_tracer().span("llm", phase="llm", provider=api_provider, model=str(model)) as span:
+        response = _call_llm(prompt, api_url, model, api_provider, token, stop_event=stop_event, **kwargs)
+        if classify_error(response):
+            span.status = "error"
+        return response
+
+def _call_llm(prompt, api_url, model, api_provider="openai", token=None, stop_event=None, **kwargs):
+    """call_llm body: tier routing, response cache, circuit breaker, scheduled dispatch"""
     if stop_event and stop_event.is_set():
         return "Error: Task cancelled by user."
 
-    # Resolve model based on tier
-    tier = kwargs.get("tier", "small")
-    
-    # If the provided model is a tier keyword or provider name
-    if model in ["small", "large", "default"]:
-        model = get_model_for_task(api_provider, model)
-    elif model in MODEL_TIERS:
-        model = get_model_for_task(model, tier)
-    # If it's a specific model string like "gpt-4o", use it directly.
+    model, cache_key, response = _admit(prompt, api_url, model, api_provider, kwargs)
+    if response is not None:
+        return response
 
+    response = _scheduled_dispatch(prompt, api_url, model, api_provider, token, stop_event=stop_event, **kwargs)
+    _remember(cache_key, response)
+    return response
+
+def _admit(prompt, api_url, model, api_provider, kwargs):
+    """
+    Front half shared by call_llm and core.llm_async.acall_llm: tier routing (adaptive:
+    fastest healthy model for the tier), response cache lookup and circuit breaker.
+
+    Pops "cache" from kwargs. Returns (model, cache_key, response); a response means the
+    request is already answered (cache hit, or circuit open) and must not be sent.
+    """
+    model = _resolve_tier_model(model, api_provider, kwargs.get("tier", "small"), kwargs.get("task_type"))
+
+    use_cache = kwargs.pop("cache", None)
+    if use_cache is None:
+        try:
+            use_cache = float(kwargs.get("temperature", 0.7)) == 0.0
+        except (TypeError, ValueError):
+            use_cache = False
+    cache = get_llm_cache()
+    cache_key = None
+    if use_cache and cache.enabled:
+        cache_key = make_cache_key(api_provider, api_url, model, prompt, **kwargs)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            get_metrics().counter("llm_cache_hits_total", "Responses served from the LLM cache",
+                                  ("provider",)).inc(provider=api_provider)
+            return model, None, cached
+
+    if not get_telemetry().allow(api_provider, model):
+        return model, None, f"Error: {api_provider}/{model} is temporarily unavailable (circuit open after repeated failures)."
+    return model, cache_key, None
+
+def _remember(cache_key, response):
+    """Store a successful response under the key _admit() returned"""
+    if cache_key and isinstance(response, str) and response and not response.startswith("Error"):
+        get_llm_cache().put(cache_key, response)
+
+def _retry_delay(api_provider, model, status, response, attempt):
+    """Backoff before retrying a 429/503 attempt, or None when its response stands"""
+    scheduler = get_scheduler()
+    # A race can see a 429 on one route and still get text from another
+    if status not in (429, 503) or classify_error(response) is None or attempt == scheduler.max_retries:
+        return None
+    delay = scheduler.backoff_delay(attempt)
+    get_metrics().counter("llm_retries_total", "Provider calls retried after 429/503",
+                          ("provider", "model")).inc(provider=api_provider, model=model)
+    print(f"[RateLimit] {api_provider}/{model} returned {status}; retry {attempt + 1}/{scheduler.max_retries} in {delay:.1f}s")
+    return delay
+
+def _estimate_request_tokens(prompt, kwargs):
+    """Prompt + completion token cost used for tokens-per-minute budgeting"""
+    try:
+        max_tokens = int(kwargs.get("max_tokens", 512))
+    except (TypeError, ValueError):
+        max_tokens = 512
+    return count_tokens(prompt) + count_tokens(kwargs.get("system_prompt")) + max_tokens
+
+def _scheduled_dispatch(prompt, api_url, model, api_provider, token, stop_event=None, **kwargs):
+    """
+    Dispatch through the rate-limit scheduler.
+
+    Waits for request/token budget (higher-priority roles first), then retries
+    429/503 responses with jittered exponential backoff, honouring Retry-After.
+    """
+    scheduler = get_scheduler()
+    telemetry = get_telemetry()
+    priority = scheduler.priority_for(kwargs.get("role"), kwargs.get("priority"))
+    est_tokens = _estimate_request_tokens(prompt, kwargs)
+    response = "Error: Rate limit exceeded. Please try again later."
+    settled = False
+    try:
+        for attempt in range(scheduler.max_retries + 1):
+            if not scheduler.acquire(api_provider, model, est_tokens, priority, stop_event=stop_event):
+                return "Error: Task cancelled by user."
+            call = scheduler.begin_call(api_provider, model)
+            take_provider_usage()
+            telemetry.take_ttfb()
+            started = time.monotonic()
+            try:
+                response = _dispatch_llm(prompt, api_url, model, api_provider, token, stop_event=stop_event, **kwargs)
+            finally:
+                status = scheduler.end_call(call)
+            _record_call(api_provider, model, prompt, response, time.monotonic() - started, telemetry.take_ttfb())
+            settled = True
+            delay = _retry_delay(api_provider, model, status, response, attempt)
+            if delay is None:
+                return response
+            if stop_event:
+                if stop_event.wait(delay):
+                    return "Error: Task cancelled by user."
+            else:
+                time.sleep(delay)
+    finally:
+        if not settled:
+            # Cancelled while waiting for budget, or the provider call raised: release a
+            # half-open probe claimed by allow() without counting a health failure
+            telemetry.record(api_provider, model, 0.0, error="cancelled")
+    return response
+
+def _record_call(api_provider, model, prompt, response, latency, ttfb=None):
+    """Report token usage and latency/health telemetry for one provider round-trip"""
+    error = classify_error(response)
+    tokens = 0
+    if error is None and isinstance(response, str) and response:
+        tokens = sum(report_usage(api_provider, model, prompt, response, take_provider_usage()))
+    get_telemetry().record(api_provider, model, latency, ttfb=ttfb, error=error, tokens=tokens)
+
+def _dispatch_llm(prompt, api_url, model, api_provider, token, stop_event=None, **kwargs):
+    """Send a resolved request to the provider-specific implementation"""
     if api_provider == "openai":
         return call_openai(prompt, api_url, model, token, stop_event=stop_event, **kwargs)
     elif api_provider == "ollama":
@@ -90,182 +230,207 @@ def call_llm(prompt, api_url, model, api_provider="openai", token=None, stop_eve
     else:
         raise ValueError(f"Unsupported provider: {api_provider}")
 
+# Missing-credential messages for providers that require an API key
+_KEY_REQUIRED = {
+    "openai": "Error: OpenAI API key required. Get one at platform.openai.com/api-keys",
+    "anthropic": "Error: Anthropic API key required",
+    "google": "Error: Google API key required",
+}
+
+def _openai_request(prompt, api_url, model, token, **kwargs):
+    """Build (endpoint, headers, payload) for an OpenAI-compatible chat completion"""
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+    
+    # Use the provided API URL or default to OpenAI
+    if not api_url or api_url == "":
+        api_url = "https://api.openai.com/v1/chat/completions"
+    
+    # Allow overrides via kwargs
+    temperature = kwargs.get("temperature", 0.7)
+    max_tokens = kwargs.get("max_tokens", 512)
+    system_prompt = kwargs.get("system_prompt", "You are a helpful AI coding assistant. Provide clear, concise code and explanations.")
+
+    # Prepare payload: handle string vs list of messages (with optional images)
+    messages = _chat_messages(prompt, system_prompt, kwargs.get("images"))
+
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "top_p": 0.95
+    }
+    return api_url, headers, payload
+
+def _openai_parse(response, prompt=None):
+    """Turn an OpenAI-compatible response (requests or httpx) into text"""
+    if response.status_code == 200:
+        result = response.json()
+        note_provider_usage(result)
+        choices = result.get("choices", [])
+        
+        if choices and len(choices) > 0:
+            choice = choices[0]
+            message = choice.get("message", {})
+            
+            if isinstance(message, dict):
+                return message.get("content", "").strip()
+            elif isinstance(message, str):
+                return message.strip()
+            else:
+                return str(choice)
+        
+        return str(result)
+        
+    elif response.status_code == 401:
+        return "Error: Invalid API key. Please check your OpenAI API key."
+        
+    elif response.status_code == 429:
+        return "Error: Rate limit exceeded. Please try again later."
+        
+    elif response.status_code == 400:
+        error_data = response.json()
+        error_msg = error_data.get("error", {}).get("message", "")
+        return f"Error: {error_msg}"
+        
+    else:
+        return f"Error {response.status_code}: {response.text[:200]}"
+
 def call_openai(prompt, api_url, model, token, stop_event=None, **kwargs):
     """Call OpenAI API - WORKING VERSION"""
     if stop_event and stop_event.is_set():
         return "Error: Task cancelled by user."
     if not token:
-        return "Error: OpenAI API key required. Get one at platform.openai.com/api-keys"
+        return _KEY_REQUIRED["openai"]
     
     try:
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
-        # Use the provided API URL or default to OpenAI
-        if not api_url or api_url == "":
-            api_url = "https://api.openai.com/v1/chat/completions"
-        
-        # Allow overrides via kwargs
-        temperature = kwargs.get("temperature", 0.7)
-        max_tokens = kwargs.get("max_tokens", 512)
-        system_prompt = kwargs.get("system_prompt", "You are a helpful AI coding assistant. Provide clear, concise code and explanations.")
-
-        # Prepare payload: handle string vs list of messages
-        if isinstance(prompt, list):
-            messages = list(prompt) # Create a copy
-            # Ensure system prompt is present if it's not already in history
-            if not any(m.get("role") == "system" for m in messages):
-                messages.insert(0, {"role": "system", "content": system_prompt})
-        else:
-            # Prepare content with optional images
-            user_content = []
-            if kwargs.get("images"):
-                user_content.append({"type": "text", "text": prompt})
-                for img_b64 in kwargs.get("images"):
-                    user_content.append({
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}
-                    })
-            else:
-                user_content = prompt
-
-            messages = [
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": user_content
-                }
-            ]
-
-        payload = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max_tokens,
-            "top_p": 0.95
-        }
-        
-        response = requests.post(
-            api_url,
+        endpoint, headers, payload = _openai_request(prompt, api_url, model, token, **kwargs)
+        response = get_client().post(
+            endpoint,
             headers=headers,
             json=payload,
             timeout=kwargs.get("timeout", 20)
         )
-        
-        if response.status_code == 200:
-            result = response.json()
-            choices = result.get("choices", [])
-            
-            if choices and len(choices) > 0:
-                choice = choices[0]
-                message = choice.get("message", {})
-                
-                if isinstance(message, dict):
-                    return message.get("content", "").strip()
-                elif isinstance(message, str):
-                    return message.strip()
-                else:
-                    return str(choice)
-            
-            return str(result)
-            
-        elif response.status_code == 401:
-            return "Error: Invalid API key. Please check your OpenAI API key."
-            
-        elif response.status_code == 429:
-            return "Error: Rate limit exceeded. Please try again later."
-            
-        elif response.status_code == 400:
-            error_data = response.json()
-            error_msg = error_data.get("error", {}).get("message", "")
-            return f"Error: {error_msg}"
-            
-        else:
-            return f"Error {response.status_code}: {response.text[:200]}"
+        return _openai_parse(response)
             
     except requests.exceptions.ConnectionError:
         return "Error: Could not connect to OpenAI API. Check your internet connection."
     except Exception as e:
         return f"Error: {str(e)}"
 
-def call_anthropic(prompt, api_url, model, token, stop_event=None, **kwargs):
-    """Call Anthropic Claude Messages API"""
-    if stop_event and stop_event.is_set():
-        return "Error: Task cancelled by user."
-    if not token:
-        return "Error: Anthropic API key required"
-    try:
-        headers = {
-            "x-api-key": token,
-            "anthropic-version": "2023-06-01",
-            "Content-Type": "application/json"
-        }
-        temperature = kwargs.get("temperature", 0.7)
-        max_tokens = kwargs.get("max_tokens", 512)
-        system_prompt = kwargs.get("system_prompt", "You are a helpful AI assistant.")
-        # Prepare content with optional images
-        user_content = []
-        if kwargs.get("images"):
-            user_content.append({"type": "text", "text": prompt})
-            for img_b64 in kwargs.get("images"):
-                user_content.append({
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": "image/jpeg",
-                        "data": img_b64
-                    }
-                })
-        else:
-            user_content = [{"type": "text", "text": prompt}]
-
+def _anthropic_request(prompt, api_url, model, token, **kwargs):
+    """Build (endpoint, headers, payload) for the Anthropic Messages API"""
+    headers = {
+        "x-api-key": token,
+        "anthropic-version": "2023-06-01",
+        "Content-Type": "application/json"
+    }
+    temperature = kwargs.get("temperature", 0.7)
+    max_tokens = kwargs.get("max_tokens", 512)
+    system_prompt = kwargs.get("system_prompt", "You are a helpful AI assistant.")
+    if isinstance(prompt, list):
+        # Chat history: system turns go to the system field, the rest stay separate messages
+        messages = []
+        for m in prompt:
+            if m.get("role") == "system":
+                system_prompt = m.get("content") or system_prompt
+            else:
+                messages.append({"role": "assistant" if m.get("role") == "assistant" else "user",
+                                 "content": m.get("content", "")})
         payload = {
             "model": model,
             "max_tokens": max_tokens,
-            "messages": [
-                {"role": "user", "content": user_content}
-            ],
-            "system": system_prompt,
+            "messages": messages,
+            "system": _anthropic_system(system_prompt, kwargs),
             "temperature": temperature
         }
-        endpoint = api_url or "https://api.anthropic.com/v1/messages"
-        response = requests.post(endpoint, headers=headers, json=payload, timeout=kwargs.get("timeout", 20))
-        if response.status_code == 200:
-            data = response.json()
-            try:
-                content = data.get("content", [])
-                if content and isinstance(content, list):
-                    for part in content:
-                        if part.get("type") == "text":
-                            return part.get("text", "").strip()
-                # Fallback to string conversion
-                return json.dumps(data)[:1000]
-            except Exception:
-                return response.text[:1000]
-        elif response.status_code == 401:
-            return "Error 401: Invalid Anthropic API key"
-        else:
-            return f"Error {response.status_code}: {response.text[:200]}"
-    except Exception as e:
-        return f"Error: {str(e)}"
+        return api_url or "https://api.anthropic.com/v1/messages", headers, payload
+    # Prepare content with optional images
+    user_content = []
+    if kwargs.get("images"):
+        user_content.append({"type": "text", "text": prompt})
+        for img_b64 in kwargs.get("images"):
+            user_content.append({
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": "image/jpeg",
+                    "data": img_b64
+                }
+            })
+    else:
+        user_content = [{"type": "text", "text": prompt}]
 
-def call_gemini(prompt, api_url, model, token, stop_event=None, **kwargs):
-    """Call Google Gemini Generative Language API"""
+    payload = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "messages": [
+            {"role": "user", "content": user_content}
+        ],
+        "system": _anthropic_system(system_prompt, kwargs),
+        "temperature": temperature
+    }
+    endpoint = api_url or "https://api.anthropic.com/v1/messages"
+    return endpoint, headers, payload
+
+def _anthropic_system(system_prompt, kwargs):
+    """System field; cache_system=True marks it as a cacheable prefix (stable group memory)"""
+    if kwargs.get("cache_system"):
+        return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+    return system_prompt
+
+def _anthropic_parse(response, prompt=None):
+    if response.status_code == 200:
+        data = response.json()
+        note_provider_usage(data)
+        try:
+            content = data.get("content", [])
+            if content and isinstance(content, list):
+                for part in content:
+                    if part.get("type") == "text":
+                        return part.get("text", "").strip()
+            # Fallback to string conversion
+            return json.dumps(data)[:1000]
+        except Exception:
+            return response.text[:1000]
+    elif response.status_code == 401:
+        return "Error 401: Invalid Anthropic API key"
+    else:
+        return f"Error {response.status_code}: {response.text[:200]}"
+
+def call_anthropic(prompt, api_url, model, token, stop_event=None, **kwargs):
+    """Call Anthropic Claude Messages API"""
     if stop_event and stop_event.is_set():
         return "Error: Task cancelled by user."
     if not token:
-        return "Error: Google API key required"
+        return _KEY_REQUIRED["anthropic"]
     try:
-        temperature = kwargs.get("temperature", 0.7)
-        max_tokens = kwargs.get("max_tokens", 512)
-        system_prompt = kwargs.get("system_prompt", "You are a helpful AI assistant.")
-        endpoint_base = (api_url or "https://generativelanguage.googleapis.com/v1/models").rstrip("/")
-        endpoint = f"{endpoint_base}/{model}:generateContent?key={token}"
+        endpoint, headers, payload = _anthropic_request(prompt, api_url, model, token, **kwargs)
+        response = get_client().post(endpoint, headers=headers, json=payload, timeout=kwargs.get("timeout", 20))
+        return _anthropic_parse(response)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+def _gemini_request(prompt, api_url, model, token, **kwargs):
+    """Build (endpoint, headers, payload) for Gemini generateContent"""
+    temperature = kwargs.get("temperature", 0.7)
+    max_tokens = kwargs.get("max_tokens", 512)
+    system_prompt = kwargs.get("system_prompt", "You are a helpful AI assistant.")
+    endpoint_base = (api_url or "https://generativelanguage.googleapis.com/v1/models").rstrip("/")
+    endpoint = f"{endpoint_base}/{model}:generateContent?key={token}"
+    if isinstance(prompt, list):
+        # Chat history: Gemini calls the assistant "model" and takes the system turn separately
+        contents = []
+        for m in prompt:
+            if m.get("role") == "system":
+                system_prompt = m.get("content") or system_prompt
+            else:
+                contents.append({"role": "model" if m.get("role") == "assistant" else "user",
+                                 "parts": [{"text": str(m.get("content", ""))}]})
+    else:
         # Prepare parts with optional images
         parts = [{"text": prompt}]
         if kwargs.get("images"):
@@ -276,157 +441,245 @@ def call_gemini(prompt, api_url, model, token, stop_event=None, **kwargs):
                         "data": img_b64
                     }
                 })
+        contents = [{"role": "user", "parts": parts}]
 
-        payload = {
-            "contents": [
-                {"role": "user", "parts": parts}
-            ],
-            "systemInstruction": {"role": "system", "parts": [{"text": system_prompt}]},
-            "generationConfig": {
-                "temperature": temperature,
-                "maxOutputTokens": max_tokens,
-                "topP": 0.95
-            }
+    payload = {
+        "contents": contents,
+        "systemInstruction": {"role": "system", "parts": [{"text": system_prompt}]},
+        "generationConfig": {
+            "temperature": temperature,
+            "maxOutputTokens": max_tokens,
+            "topP": 0.95
         }
-        response = requests.post(endpoint, headers={"Content-Type": "application/json"}, json=payload, timeout=kwargs.get("timeout", 20))
-        if response.status_code == 200:
-            data = response.json()
-            try:
-                candidates = data.get("candidates", [])
-                if candidates:
-                    parts = candidates[0].get("content", {}).get("parts", [])
-                    for part in parts:
-                        if "text" in part:
-                            return part["text"].strip()
-                return json.dumps(data)[:1000]
-            except Exception:
-                return response.text[:1000]
-        elif response.status_code == 401:
-            return "Error 401: Invalid Google API key"
-        elif response.status_code == 400:
-            try:
-                err = response.json().get("error", {}).get("message", "")
-                if err:
-                    return f"Error 400: {err}"
-            except Exception:
-                pass
-            return f"Error 400: {response.text[:200]}"
-        elif response.status_code == 404:
-            return "Error 404: Gemini model or endpoint not found"
-        else:
-            return f"Error {response.status_code}: {response.text[:200]}"
+    }
+    return endpoint, {"Content-Type": "application/json"}, payload
+
+def _gemini_parse(response, prompt=None):
+    if response.status_code == 200:
+        data = response.json()
+        note_provider_usage(data)
+        try:
+            candidates = data.get("candidates", [])
+            if candidates:
+                parts = candidates[0].get("content", {}).get("parts", [])
+                for part in parts:
+                    if "text" in part:
+                        return part["text"].strip()
+            return json.dumps(data)[:1000]
+        except Exception:
+            return response.text[:1000]
+    elif response.status_code == 401:
+        return "Error 401: Invalid Google API key"
+    elif response.status_code == 400:
+        try:
+            err = response.json().get("error", {}).get("message", "")
+            if err:
+                return f"Error 400: {err}"
+        except Exception:
+            pass
+        return f"Error 400: {response.text[:200]}"
+    elif response.status_code == 404:
+        return "Error 404: Gemini model or endpoint not found"
+    else:
+        return f"Error {response.status_code}: {response.text[:200]}"
+
+def call_gemini(prompt, api_url, model, token, stop_event=None, **kwargs):
+    """Call Google Gemini Generative Language API"""
+    if stop_event and stop_event.is_set():
+        return "Error: Task cancelled by user."
+    if not token:
+        return _KEY_REQUIRED["google"]
+    try:
+        endpoint, headers, payload = _gemini_request(prompt, api_url, model, token, **kwargs)
+        response = get_client().post(endpoint, headers=headers, json=payload, timeout=kwargs.get("timeout", 20))
+        return _gemini_parse(response)
     except Exception as e:
         return f"Error: {str(e)}"
 
+def _ollama_request(prompt, api_url, model, token=None, **kwargs):
+    """Build (endpoint, headers, payload) for Ollama /api/chat or /api/generate"""
+    system_prompt = kwargs.get("system_prompt", "You are a helpful AI assistant.")
+    # Hardware-aware options
+    options = {
+        "temperature": kwargs.get("temperature", 0.7),
+        "top_p": kwargs.get("top_p", 0.9),
+        "num_ctx": 8192,
+    }
+    
+    try:
+        from utils.hardware_info import get_gpu_info
+        gpu = get_gpu_info()
+        if gpu.get("cuda_available"):
+            # Ollama uses num_gpu to control GPU offloading. 
+            # Force high number to offload all layers
+            options["num_gpu"] = 99
+            # Lower thread count on GPU to avoid CPU overhead
+            options["num_thread"] = 2
+        else:
+            import multiprocessing
+            options["num_thread"] = max(1, multiprocessing.cpu_count() - 2)
+    except:
+        pass
+
+    # Check if we should use chat API
+    if isinstance(prompt, list):
+        messages = list(prompt) # Create a copy
+        if not any(m.get("role") == "system" for m in messages):
+            messages.insert(0, {"role": "system", "content": system_prompt})
+        
+        endpoint = f"{api_url.rstrip('/')}/api/chat"
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": False,
+            "options": options
+        }
+    else:
+        endpoint = f"{api_url.rstrip('/')}/api/generate"
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "system": system_prompt,
+            "stream": False,
+            "options": options
+        }
+    
+    if kwargs.get("images"):
+        # For /api/generate it's "images", for /api/chat it's within messages (handled if list)
+        if not isinstance(prompt, list):
+            payload["images"] = kwargs.get("images")
+    
+    # Keep model (and its evaluated prompt prefix) in VRAM
+    payload["keep_alive"] = kwargs.get("keep_alive", "10m")
+    return endpoint, None, payload
+
+def _ollama_parse(response, prompt=None):
+    if response.status_code == 200:
+        data = response.json()
+        note_provider_usage(data)
+        if isinstance(prompt, list):
+            return data.get("message", {}).get("content", "").strip()
+        return data.get("response", "").strip()
+    else:
+        return f"Error {response.status_code}: {response.text[:200]}"
+
 def call_ollama(prompt, api_url, model, stop_event=None, **kwargs):
     """Call Ollama API - Simplified with chat support"""
     if stop_event and stop_event.is_set():
         return "Error: Task cancelled by user."
     try:
-        system_prompt = kwargs.get("system_prompt", "You are a helpful AI assistant.")
-        # Hardware-aware options
-        options = {
-            "temperature": 0.7,
-            "top_p": 0.9,
-            "num_ctx": 8192,
-        }
-        
-        try:
-            from utils.hardware_info import get_gpu_info
-            gpu = get_gpu_info()
-            if gpu.get("cuda_available"):
-                # Ollama uses num_gpu to control GPU offloading. 
-                # Force high number to offload all layers
-                options["num_gpu"] = 99
-                # Lower thread count on GPU to avoid CPU overhead
-                options["num_thread"] = 2
-            else:
-                import multiprocessing
-                options["num_thread"] = max(1, multiprocessing.cpu_count() - 2)
-        except:
-            pass
-
-        # Check if we should use chat API
-        if isinstance(prompt, list):
-            messages = list(prompt) # Create a copy
-            if not any(m.get("role") == "system" for m in messages):
-                messages.insert(0, {"role": "system", "content": system_prompt})
-            
-            endpoint = f"{api_url.rstrip('/')}/api/chat"
-            payload = {
-                "model": model,
-                "messages": messages,
-                "stream": False,
-                "options": options
-            }
-        else:
-            endpoint = f"{api_url.rstrip('/')}/api/generate"
-            payload = {
-                "model": model,
-                "prompt": prompt,
-                "stream": False,
-                "options": options
-            }
-        
-        if kwargs.get("images"):
-            # For /api/generate it's "images", for /api/chat it's within messages (handled if list)
-            if not isinstance(prompt, list):
-                payload["images"] = kwargs.get("images")
-        
-        # Keep model in VRAM
-        payload["keep_alive"] = "10m"
-        
-        response = requests.post(endpoint, json=payload, timeout=kwargs.get("timeout", 120))
-        
-        if response.status_code == 200:
-            data = response.json()
-            if isinstance(prompt, list):
-                return data.get("message", {}).get("content", "").strip()
-            return data.get("response", "").strip()
-        else:
-            return f"Error {response.status_code}: {response.text[:200]}"
+        endpoint, _, payload = _ollama_request(prompt, api_url, model, **kwargs)
+        response = get_client().post(endpoint, json=payload, timeout=kwargs.get("timeout", 120))
+        return _ollama_parse(response, prompt)
             
     except Exception as e:
         return f"Error: {str(e)}"
 
-def call_huggingface(prompt, api_url, model, token, stop_event=None, **kwargs):
-    """Call Hugging Face with robust fallback: provider-resolved router, client, alternatives."""
-    if stop_event and stop_event.is_set():
-        return "Error: Task cancelled by user."
-    if not token:
-        token = os.environ.get("HF_TOKEN", "")
-    
-    # Check if this is a local model request
-    is_local = "localhost" in str(api_url) or "127.0.0.1" in str(api_url) or not api_url
-    
-    if is_local:
-        try:
-            import torch
-            from transformers import AutoModelForCausalLM, AutoTokenizer
-            return call_local_transformers(prompt, model, stop_event=stop_event, **kwargs)
-        except ImportError:
-            _hf_log("Local inference requested but 'torch' or 'transformers' not installed. Falling back to API.")
-        except Exception as e:
-            _hf_log(f"Local inference failed: {e}. Falling back to API.")
+# Providers whose whole request is a single HTTP POST: (build_request, parse_response, default_timeout).
+# Shared by the blocking call_* functions and the asyncio client in core.llm_async.
+HTTP_PROVIDERS = {
+    "openai": (_openai_request, _openai_parse, 20),
+    "anthropic": (_anthropic_request, _anthropic_parse, 20),
+    "google": (_gemini_request, _gemini_parse, 20),
+    "ollama": (_ollama_request, _ollama_parse, 120),
+}
 
-    if not token and not is_local:
-        return "Error: Hugging Face token required for remote API"
+# --- Hugging Face route resolution ---
+HF_ROUTE_RACE_WIDTH = 3          # Candidate routes raced in parallel per round
+HF_PROVIDER_MAP_TTL = 600        # Seconds to trust an inferenceProviderMapping lookup
+HF_DEAD_MODEL_TTL = 300          # Seconds to skip a model after every route failed
 
+_HF_ROUTE_TABLE = {}             # (model, role) -> name of the route that last succeeded
+_HF_PROVIDER_MAPS = {}           # model id -> (fetched_at, mapping dict)
+_HF_DEAD_MODELS = {}             # model id -> failed_at
+_HF_ROUTE_LOCK = threading.Lock()
+
+class _HFRouteFailed(Exception):
+    """A single Hugging Face route did not produce a completion"""
+
+def _hf_provider_mapping(mid, headers):
+    """inferenceProviderMapping for a model, cached with a TTL"""
+    now = time.time()
+    with _HF_ROUTE_LOCK:
+        cached = _HF_PROVIDER_MAPS.get(mid)
+    if cached and now - cached[0] < HF_PROVIDER_MAP_TTL:
+        return cached[1]
+    mapping = {}
+    try:
+        u = f"https://huggingface.co/api/models/{mid}?expand=inferenceProviderMapping"
+        r = get_client().get(u, headers=headers, timeout=10)
+        if r.status_code == 200:
+            mp = r.json().get("inferenceProviderMapping", {})
+            if isinstance(mp, dict):
+                mapping = mp
+    except Exception:
+        return {}
+    with _HF_ROUTE_LOCK:
+        _HF_PROVIDER_MAPS[mid] = (now, mapping)
+    return mapping
+
+def _hf_provider_preference(task: str, role_hint: str) -> List[str]:
+    if role_hint in ("coder", "gui_coder"):
+        return ["hf-inference", "together", "cerebras", "fal-ai", "featherless-ai"]
+    if role_hint in ("tester",):
+        return ["featherless-ai", "hf-inference", "cerebras", "together", "fal-ai"]
+    if role_hint in ("image_agent", "vision"):
+        return ["hf-inference", "fal-ai", "together", "cerebras", "featherless-ai"]
+    if role_hint in ("planner", "architect"):
+        return ["cerebras", "featherless-ai", "hf-inference", "together", "fal-ai"]
+    return ["cerebras", "featherless-ai", "hf-inference", "fal-ai", "together"]
+
+def _hf_router_v1_request(prompt, api_url, model, token, **kwargs):
+    """Build (endpoint, headers, payload) for the router's /v1 chat route, provider resolved per role"""
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    role = (kwargs.get("role") or "").lower()
+    resolved_task = "conversational" if (kwargs.get("task", "chat") or "chat").lower() == "chat" else "text-generation"
+    mapping = _hf_provider_mapping(model, headers)
+    resolved_model = model
+    if mapping:
+        resolved_model = f"{model}:{next(iter(mapping.keys()))}"
+        live = [name for name, info in mapping.items() if isinstance(info, dict) and info.get("status") == "live"]
+        if live:
+            resolved_model = f"{model}:{live[0]}"
+        for pname in _hf_provider_preference(resolved_task, role):
+            info = mapping.get(pname)
+            if isinstance(info, dict) and info.get("status") == "live" and info.get("task") == resolved_task:
+                resolved_model = f"{model}:{pname}"
+                break
+    payload = {
+        "model": resolved_model,
+        "messages": _chat_messages(prompt, kwargs.get("system_prompt", "You are a helpful AI assistant.")),
+        "temperature": kwargs.get("temperature", 0.7),
+        "max_tokens": kwargs.get("max_tokens", 500)
+    }
+    # Only add top_p if explicitly requested and < 1.0, or use a safe default
+    tp = kwargs.get("top_p", 0.9)
+    if tp and tp < 1.0:
+        payload["top_p"] = tp
+    return "https://router.huggingface.co/v1/chat/completions", headers, payload
+
+def _hf_chat_text(data):
+    """Extract text from an OpenAI-style chat completion; anything else fails the route"""
+    choices = data.get("choices", []) if isinstance(data, dict) else []
+    if choices:
+        msg = choices[0].get("message", {})
+        if isinstance(msg, dict):
+            return (msg.get("content") or "").strip()
+    raise _HFRouteFailed(f"Error: Unexpected response: {str(data)[:200]}")
+
+def _hf_routes(prompt, api_url, model, token, stop_event=None, cancel=None, **kwargs):
+    """
+    Ordered list of (name, callable) candidate routes for one request.
+
+    Each callable returns the completion text or raises _HFRouteFailed. Terminal
+    HTTP errors carry their user-facing message in the exception. Routes check
+    stop_event and cancel (set by _hf_race once another route won) before each
+    request they make.
+    """
     temperature = kwargs.get("temperature", 0.7)
     max_tokens = kwargs.get("max_tokens", 500)
     system_prompt = kwargs.get("system_prompt", "You are a helpful AI assistant.")
-
-    # Hardware-aware options for potential local inference
-    try:
-        from utils.hardware_info import get_gpu_info
-        gpu = get_gpu_info()
-        # If api_url is local and we have GPU, we might want to signal it, 
-        # though usually the local server (TGI/vLLM) handles it.
-        # But for documentation/logging, it's good to know.
-        if gpu.get("cuda_available") and ("localhost" in str(api_url) or "127.0.0.1" in str(api_url)):
-            _hf_log("Local Hugging Face endpoint detected with CUDA available.")
-    except:
-        pass
+    timeout = kwargs.get("timeout", 20)
 
     headers = {
         "Authorization": f"Bearer {token}",
@@ -437,389 +690,487 @@ def call_huggingface(prompt, api_url, model, token, stop_event=None, **kwargs):
     non_chat_patterns = [
         "starcoder", "bigcode", "codellama", "llama-2", "gpt2", "bloom", "mpt", "phi", "rwkv"
     ]
+    is_non_chat = any(p in (model or "").lower() for p in non_chat_patterns)
 
-    # Prepare messages for chat completions (moved up to avoid NameError)
     if isinstance(prompt, list):
         messages_chat = list(prompt)
         if not any(m.get("role") == "system" for m in messages_chat):
             messages_chat.insert(0, {"role": "system", "content": system_prompt})
+        flat_prompt = "\n".join([f"{m.get('role', 'user')}: {m.get('content', '')}" for m in prompt])
     else:
         messages_chat = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": prompt}
         ]
+        flat_prompt = prompt
 
-    # Simple response cache
-    global _HF_RESP_CACHE
-    try:
-        _HF_RESP_CACHE
-    except NameError:
-        _HF_RESP_CACHE = {}
-    
-    # Ensure prompt is hashable for cache key
-    if isinstance(prompt, list):
-        cache_prompt = str(prompt)[:500]
-    else:
-        cache_prompt = str(prompt)[:500]
-    
-    # Ensure model is hashable
-    hashable_model = str(model) if isinstance(model, list) else model
-    
-    # Also ensure max_tokens and temperature are numbers
-    try:
-        max_tokens_val = int(max_tokens)
-    except:
-        max_tokens_val = 500
-        
-    try:
-        temp_val = float(temperature)
-    except:
-        temp_val = 0.7
-        
-    cache_key = (hashable_model, cache_prompt, max_tokens_val, round(temp_val, 2))
-    cache_entry = _HF_RESP_CACHE.get(cache_key)
-    if cache_entry and (time.time() - cache_entry[0] < 60):
-        return cache_entry[1]
+    def check_cancelled():
+        if stop_event and stop_event.is_set():
+            raise _HFRouteFailed("Error: Task cancelled by user.")
+        if cancel is not None and cancel.is_set():
+            raise _HFRouteFailed("Error: Route abandoned (another route won)")
 
-    # Direct Inference API attempt for custom models
-    try:
-        # If model looks like a full repo ID (contains /), try direct inference first
-        if "/" in str(model):
-            direct_endpoint = f"https://api-inference.huggingface.co/models/{model}"
-            
-            # Use simple text generation for non-chat models
-            if any(p in (model or "").lower() for p in non_chat_patterns):
-                payload_direct = {
-                    "inputs": prompt if isinstance(prompt, str) else "\n".join([f"{m.get('role', 'user')}: {m.get('content', '')}" for m in prompt]),
-                    "parameters": {"max_new_tokens": max_tokens, "temperature": temperature}
-                }
-            else:
-                # Try chat completions format on direct endpoint
-                payload_direct = {
-                    "model": model,
-                    "messages": messages_chat,
-                    "temperature": temperature,
-                    "max_tokens": max_tokens
-                }
+    def post(url, **kw):
+        check_cancelled()
+        return get_client().post(url, **kw)
 
-            r_direct = requests.post(direct_endpoint, headers=headers, json=payload_direct, timeout=kwargs.get("timeout", 20))
-            if stop_event and stop_event.is_set():
-                return "Error: Task cancelled by user."
-            if r_direct.status_code == 200:
-                data = r_direct.json()
-                if isinstance(data, list) and data:
-                    text = data[0].get("generated_text", "")
-                    if text:
-                        _HF_RESP_CACHE[cache_key] = (time.time(), text)
-                        return text
-                elif isinstance(data, dict):
-                    # Check for chat completion response
-                    choices = data.get("choices", [])
-                    if choices:
-                        out = choices[0].get("message", {}).get("content", "").strip()
-                        if out:
-                            _HF_RESP_CACHE[cache_key] = (time.time(), out)
-                            return out
-                    # Check for direct text
-                    out = data.get("generated_text", "")
-                    if out:
-                        _HF_RESP_CACHE[cache_key] = (time.time(), out)
-                        return out
-    except Exception:
-        pass
+    def _strip_echo(text, source):
+        source = str(source)
+        return text[len(source):].strip() if text.startswith(source) else text
 
-    try:
-        if any(p in (model or "").lower() for p in non_chat_patterns):
-            # If prompt is a list (history), join it for non-chat inference
-            infer_prompt = prompt
-            if isinstance(prompt, list):
-                infer_prompt = "\n".join([f"{m.get('role', 'user')}: {m.get('content', '')}" for m in prompt])
-
-            payload_infer = {
-                "inputs": infer_prompt,
-                "parameters": {
-                    "max_new_tokens": max_tokens,
-                    "temperature": temperature
-                }
-            }
-            endpoint = f"https://router.huggingface.co/models/{model}"
-            if stop_event and stop_event.is_set():
-                return "Error: Task cancelled by user."
-            response = requests.post(endpoint, headers=headers, json=payload_infer, timeout=kwargs.get("timeout", 20))
-            if response.status_code == 200:
-                result = response.json()
-                if isinstance(result, list) and result:
-                    item = result[0]
-                    if isinstance(item, dict) and "generated_text" in item:
-                        text = item["generated_text"]
-                        if text.startswith(str(infer_prompt)):
-                            text = text[len(str(infer_prompt)):].strip()
-                        _HF_RESP_CACHE[cache_key] = (time.time(), text)
-                        return text
-                return str(result)[:500]
-            # If this fails, continue to normal flow
-    except Exception:
-        pass
+    def direct_inference():
+        # If model looks like a full repo ID (contains /), try direct inference first
+        direct_endpoint = f"https://api-inference.huggingface.co/models/{model}"
+        if is_non_chat:
+            payload = {"inputs": flat_prompt, "parameters": {"max_new_tokens": max_tokens, "temperature": temperature}}
+        else:
+            payload = {"model": model, "messages": messages_chat, "temperature": temperature, "max_tokens": max_tokens}
+        r = post(direct_endpoint, headers=headers, json=payload, timeout=timeout)
+        if r.status_code != 200:
+            raise _HFRouteFailed(f"Error {r.status_code}: {r.text[:200]}")
+        data = r.json()
+        if isinstance(data, list) and data:
+            text = data[0].get("generated_text", "")
+            if text:
+                return text
+        elif isinstance(data, dict):
+            choices = data.get("choices", [])
+            if choices:
+                out = choices[0].get("message", {}).get("content", "").strip()
+                if out:
+                    return out
+            out = data.get("generated_text", "")
+            if out:
+                return out
+        raise _HFRouteFailed("Direct inference returned no text")
 
-    # If api_url provided, try it. If it looks like standard HF inference, append model
-    try:
-        if api_url:
-            endpoint = api_url
-            if ("api-inference.huggingface.co/models/" in api_url or "router.huggingface.co/models/" in api_url) and model not in api_url:
-                endpoint = f"{api_url.rstrip('/')}/{model}"
-            
-            # Prepare messages: handle string vs list of messages
-            if isinstance(prompt, list):
-                messages = list(prompt) # Create a copy to avoid modifying the original list
-                # Ensure there is a system message if needed
-                if not any(m.get("role") == "system" for m in messages):
-                    messages.insert(0, {"role": "system", "content": system_prompt})
-            else:
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ]
-
-            payload = {
-                "model": model,
-                "messages": messages,
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-                "top_p": 0.95
-            }
-            if stop_event and stop_event.is_set():
-                return "Error: Task cancelled by user."
-            resp = requests.post(endpoint, headers=headers, json=payload, timeout=kwargs.get("timeout", 20))
-            if resp.status_code == 200:
-                data = resp.json()
-                choices = data.get("choices", [])
-                if choices:
-                    msg = choices[0].get("message", {})
-                    if isinstance(msg, dict):
-                        out = (msg.get("content") or "").strip()
-                        _HF_RESP_CACHE[cache_key] = (time.time(), out)
-                        return out
-                return str(data)[:500]
-            if resp.status_code in (401, 429, 500, 503):
-                _hf_log(f"Direct URL error {resp.status_code}; fallback engaged")
-            elif resp.status_code == 404:
-                _hf_log("Direct URL 404; verifying provider path and model id; continuing")
-            else:
-                return f"Error {resp.status_code}: {resp.text[:200]}"
-    except requests.exceptions.ConnectionError:
-        _hf_log("Connection error on direct URL; continuing")
-    except Exception:
-        pass
+    def router_text_generation():
+        payload = {"inputs": flat_prompt, "parameters": {"max_new_tokens": max_tokens, "temperature": temperature}}
+        r = post(f"https://router.huggingface.co/models/{model}", headers=headers, json=payload, timeout=timeout)
+        if r.status_code == 200:
+            result = r.json()
+            if isinstance(result, list) and result:
+                item = result[0]
+                if isinstance(item, dict) and "generated_text" in item:
+                    return _strip_echo(item["generated_text"], flat_prompt)
+            raise _HFRouteFailed(f"Error: Unexpected response: {str(result)[:200]}")
+        if r.status_code == 401:
+            raise _HFRouteFailed("Error 401: Invalid Hugging Face credentials")
+        raise _HFRouteFailed(f"Error {r.status_code}: {r.text[:200]}")
 
-    # Role-aware routing preferences
-    role = (kwargs.get("role") or "").lower()
-    task_kw = (kwargs.get("task", "chat") or "chat").lower()
-    resolved_task = "conversational" if task_kw == "chat" else "text-generation"
-
-    def _hf_provider_preference(task: str, role_hint: str) -> List[str]:
-        if role_hint in ("coder", "gui_coder"):
-            return ["hf-inference", "together", "cerebras", "fal-ai", "featherless-ai"]
-        if role_hint in ("tester",):
-            return ["featherless-ai", "hf-inference", "cerebras", "together", "fal-ai"]
-        if role_hint in ("image_agent", "vision"):
-            return ["hf-inference", "fal-ai", "together", "cerebras", "featherless-ai"]
-        if role_hint in ("planner", "architect"):
-            return ["cerebras", "featherless-ai", "hf-inference", "together", "fal-ai"]
-        return ["cerebras", "featherless-ai", "hf-inference", "fal-ai", "together"]
-    def _resolve_model_with_provider(mid: str) -> str:
+    def configured_url():
+        endpoint = api_url
+        if ("api-inference.huggingface.co/models/" in api_url or "router.huggingface.co/models/" in api_url) and model not in api_url:
+            endpoint = f"{api_url.rstrip('/')}/{model}"
+        payload = {"model": model, "messages": messages_chat, "temperature": temperature, "max_tokens": max_tokens, "top_p": 0.95}
         try:
-            u = f"https://huggingface.co/api/models/{mid}?expand=inferenceProviderMapping"
-            r = requests.get(u, headers=headers, timeout=10)
-            if r.status_code == 200:
-                mp = r.json().get("inferenceProviderMapping", {})
-                if isinstance(mp, dict) and mp:
-                    pref = _hf_provider_preference(resolved_task, role)
-                    for pname in pref:
-                        info = mp.get(pname)
-                        if isinstance(info, dict) and info.get("status") == "live" and info.get("task") == resolved_task:
-                            return f"{mid}:{pname}"
-                    for name, info in mp.items():
-                        if info.get("status") == "live":
-                            return f"{mid}:{name}"
-                    return f"{mid}:{next(iter(mp.keys()))}"
-        except Exception:
-            pass
-        return mid
-    resolved_model = _resolve_model_with_provider(model)
-    try:
-        url = "https://router.huggingface.co/v1/chat/completions"
-        payload_chat = {
-            "model": resolved_model,
-            "messages": messages_chat,
-            "temperature": temperature,
-            "max_tokens": max_tokens,
-        }
-        # Only add top_p if explicitly requested and < 1.0, or use a safe default
-        tp = kwargs.get("top_p", 0.9)
-        if tp and tp < 1.0:
-            payload_chat["top_p"] = tp
-        
-        if stop_event and stop_event.is_set():
-            return "Error: Task cancelled by user."
-        r = requests.post(url, headers=headers, json=payload_chat, timeout=kwargs.get("timeout", 20))
+            r = post(endpoint, headers=headers, json=payload, timeout=timeout)
+        except requests.exceptions.ConnectionError:
+            _hf_log("Connection error on direct URL; continuing")
+            raise _HFRouteFailed("Error: Could not connect to configured Hugging Face URL")
         if r.status_code == 200:
-            data = r.json()
-            choices = data.get("choices", [])
-            if choices:
-                msg = choices[0].get("message", {})
-                if isinstance(msg, dict):
-                    out = (msg.get("content") or "").strip()
-                    _HF_RESP_CACHE[cache_key] = (time.time(), out)
-                    return out
-            return str(data)[:500]
-        elif r.status_code == 400:
+            return _hf_chat_text(r.json())
+        if r.status_code in (401, 429, 500, 503):
+            _hf_log(f"Direct URL error {r.status_code}; fallback engaged")
+        elif r.status_code == 404:
+            _hf_log("Direct URL 404; verifying provider path and model id; continuing")
+        raise _HFRouteFailed(f"Error {r.status_code}: {r.text[:200]}")
+
+    def router_v1():
+        url, _, payload = _hf_router_v1_request(prompt, api_url, model, token, **kwargs)
+        mapping = _hf_provider_mapping(model, headers)
+        r = post(url, headers=headers, json=payload, timeout=timeout)
+        if r.status_code == 200:
+            return _hf_chat_text(r.json())
+        if r.status_code == 400:
             _hf_log(f"Router v1 400 Error: {r.text[:500]}")
-            # Fallback to non-chat if it's a model support issue
+            # Fallback to every mapped provider if it's a model support issue
             if "model_not_supported" in r.text or "not a chat model" in r.text.lower():
-                try:
-                    u = f"https://huggingface.co/api/models/{model}?expand=inferenceProviderMapping"
-                    rr = requests.get(u, headers=headers, timeout=10)
-                    if rr.status_code == 200:
-                        mp = rr.json().get("inferenceProviderMapping", {})
-                        if isinstance(mp, dict):
-                            for name in mp.keys():
-                                alt_payload = dict(payload_chat)
-                                alt_payload["model"] = f"{model}:{name}"
-                                ar = requests.post(url, headers=headers, json=alt_payload, timeout=kwargs.get("timeout", 20))
-                                if ar.status_code == 200:
-                                    data = ar.json()
-                                    choices = data.get("choices", [])
-                                    if choices:
-                                        msg = choices[0].get("message", {})
-                                        if isinstance(msg, dict):
-                                            out = (msg.get("content") or "").strip()
-                                            _HF_RESP_CACHE[cache_key] = (time.time(), out)
-                                            return out
-                                    return str(data)[:500]
-                except Exception:
-                    pass
+                for name in mapping.keys():
+                    alt_payload = dict(payload)
+                    alt_payload["model"] = f"{model}:{name}"
+                    ar = post(url, headers=headers, json=alt_payload, timeout=timeout)
+                    if ar.status_code == 200:
+                        return _hf_chat_text(ar.json())
         if r.status_code in (401, 404):
             _hf_log(f"Router v1 returned {r.status_code}; trying fallbacks")
-    except Exception:
-        pass
+        raise _HFRouteFailed(f"Error {r.status_code}: {r.text[:200]}")
 
-    if HAS_HF:
+    def inference_client():
+        check_cancelled()
         try:
             client = InferenceClient(model=model, token=token, timeout=kwargs.get("timeout"))
+        except Exception as e:
+            _hf_log(f"HF InferenceClient init failed: {e}")
+            raise _HFRouteFailed(f"Error: {e}")
+        try:
+            res = client.chat_completion(messages=messages_chat, model=model, temperature=temperature, max_tokens=max_tokens)
+            if hasattr(res, "choices") and res.choices:
+                msg = getattr(res.choices[0], "message", None)
+                content = getattr(msg, "content", None)
+                if isinstance(content, str):
+                    return content.strip()
+                if isinstance(msg, dict):
+                    return (msg.get("content") or "").strip()
+        except Exception as e:
+            _hf_log(f"HF chat-completions failed: {e}")
+        check_cancelled()
+        try:
+            txt = client.text_generation(str(prompt), temperature=temperature, max_new_tokens=max_tokens)
+            if isinstance(txt, str):
+                return _strip_echo(txt, prompt).strip()
+        except Exception as e:
+            _hf_log(f"HF text-generation failed: {e}")
+        raise _HFRouteFailed("Error: InferenceClient returned no text")
+
+    def provider_route(provider_name):
+        def route():
+            url = f"https://router.huggingface.co/{provider_name}/models/{model}/v1/chat/completions"
+            payload = {"model": model, "messages": messages_chat, "temperature": temperature, "max_tokens": max_tokens}
             try:
-                res = client.chat_completion(
-                    messages=messages_chat,
-                    model=model,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                )
-                if hasattr(res, "choices") and res.choices:
-                    msg = getattr(res.choices[0], "message", None)
-                    content = getattr(msg, "content", None)
-                    if isinstance(content, str):
-                        out = content.strip()
-                        _HF_RESP_CACHE[cache_key] = (time.time(), out)
-                        return out
-                    if isinstance(msg, dict):
-                        out = (msg.get("content") or "").strip()
-                        _HF_RESP_CACHE[cache_key] = (time.time(), out)
-                        return out
-            except Exception as e:
-                _hf_log(f"HF chat-completions failed: {e}")
+                r = post(url, headers=headers, json=payload, timeout=timeout)
+            except requests.exceptions.ConnectionError:
+                _hf_log(f"Connection error to {url}; trying next")
+                raise _HFRouteFailed("Error: Could not connect to Hugging Face router. Check connectivity or try again later.")
+            if r.status_code == 200:
+                return _hf_chat_text(r.json())
+            if r.status_code == 503:
+                raise _HFRouteFailed("Error 503: Hugging Face router temporarily unavailable. Please retry.")
+            _hf_log(f"Provider {url} returned {r.status_code}; trying next")
+            raise _HFRouteFailed(f"Error {r.status_code}: {r.text[:200]}")
+        return route
+
+    routes = []
+    if "/" in str(model):
+        routes.append(("direct_inference", direct_inference))
+    if is_non_chat:
+        routes.append(("router_text_generation", router_text_generation))
+    if api_url:
+        routes.append(("configured_url", configured_url))
+    routes.append(("router_v1", router_v1))
+    if HAS_HF:
+        routes.append(("inference_client", inference_client))
+    routes.append(("provider_hf_inference", provider_route("hf-inference")))
+    routes.append(("provider_fal_ai", provider_route("fal-ai")))
+    if not is_non_chat:
+        routes.append(("router_text_generation", router_text_generation))
+    return routes
+
+def _serve_route(call, fn):
+    if call is None:
+        return fn()
+    with get_scheduler().serving(call):
+        return fn()
+
+def _hf_winner(text):
+    """A route result that may win a race: non-empty text that is not an error"""
+    return isinstance(text, str) and bool(text.strip()) and classify_error(text) is None
+
+def _hf_race(routes, stop_event=None, width=HF_ROUTE_RACE_WIDTH, cancel=None):
+    """
+    Run candidate routes N at a time; the first to return usable text wins.
+
+    Once a route wins, cancel (the event the routes were built with) is set so losers
+    still in flight make no further requests, and queued routes are cancelled.
+    Returns (route_name, text) or (None, last_error).
+    """
+    last_error = None
+    call = get_scheduler().current_call()      # Pool threads report their 429/503s to the same request
+    for start in range(0, len(routes), max(1, width)):
+        if stop_event and stop_event.is_set():
+            return None, "Error: Task cancelled by user."
+        batch = routes[start:start + width]
+        if len(batch) == 1:
+            name, fn = batch[0]
             try:
-                txt = client.text_generation(
-                    str(prompt),
-                    temperature=temperature,
-                    max_new_tokens=max_tokens,
-                )
-                if isinstance(txt, str):
-                    prompt_str = str(prompt)
-                    out = txt[len(prompt_str):].strip() if txt.startswith(prompt_str) else txt.strip()
-                    _HF_RESP_CACHE[cache_key] = (time.time(), out)
-                    return out
+                text = fn()
             except Exception as e:
-                _hf_log(f"HF text-generation failed: {e}")
-        except Exception as e:
-            _hf_log(f"HF InferenceClient init failed: {e}")
+                last_error = str(e)
+                continue
+            if _hf_winner(text):
+                return name, text
+            last_error = text if isinstance(text, str) and text else f"Error: Route '{name}' returned no text"
+            continue
+        pool = ThreadPoolExecutor(max_workers=len(batch), thread_name_prefix="hf-route")
+        futures = {pool.submit(_serve_route, call, fn): name for name, fn in batch}
+        try:
+            for future in as_completed(futures):
+                try:
+                    text = future.result()
+                except Exception as e:
+                    last_error = str(e)
+                    continue
+                if not _hf_winner(text):
+                    last_error = text if isinstance(text, str) and text else f"Error: Route '{futures[future]}' returned no text"
+                    continue
+                if cancel is not None:
+                    cancel.set()
+                return futures[future], text
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+    return None, last_error
 
-    # Try provider-specific OpenAI-compatible routes
-    candidates = [
-        f"https://router.huggingface.co/hf-inference/models/{model}/v1/chat/completions",
-        f"https://router.huggingface.co/fal-ai/models/{model}/v1/chat/completions",
-    ]
-    payload_chat_final = {
-        "model": model,
-        "messages": messages_chat,
-        "temperature": temperature,
-        "max_tokens": max_tokens
-    }
-    for url in candidates:
+def call_huggingface(prompt, api_url, model, token, stop_event=None, **kwargs):
+    """
+    Call Hugging Face with robust fallback: provider-resolved router, client, alternatives.
+
+    The route that last worked for (model, role) is tried alone first. Otherwise the
+    candidate routes are raced HF_ROUTE_RACE_WIDTH at a time and the winner is remembered.
+    """
+    if stop_event and stop_event.is_set():
+        return "Error: Task cancelled by user."
+    if not token:
+        token = os.environ.get("HF_TOKEN", "")
+    
+    # Check if this is a local model request
+    is_local = "localhost" in str(api_url) or "127.0.0.1" in str(api_url) or not api_url
+    
+    if is_local:
         try:
-            r = requests.post(url, headers=headers, json=payload_chat_final, timeout=kwargs.get("timeout", 20))
-            if r.status_code == 200:
-                data = r.json()
-                choices = data.get("choices", [])
-                if choices:
-                    msg = choices[0].get("message", {})
-                    if isinstance(msg, dict):
-                        return (msg.get("content") or "").strip()
-                return str(data)[:500]
-            if r.status_code in (401, 404):
-                _hf_log(f"Provider {url} returned {r.status_code}; trying next")
+            import torch
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+            return call_local_transformers(prompt, model, stop_event=stop_event, **kwargs)
+        except ImportError:
+            _hf_log("Local inference requested but 'torch' or 'transformers' not installed. Falling back to API.")
+        except Exception as e:
+            _hf_log(f"Local inference failed: {e}. Falling back to API.")
+
+    if not token and not is_local:
+        return "Error: Hugging Face token required for remote API"
+
+    role = (kwargs.get("role") or "").lower()
+    route_key = (str(model), role)
+    cancel = threading.Event()          # Set by the race once a route won; losers stop there
+    routes = _hf_routes(prompt, api_url, model, token, stop_event=stop_event, cancel=cancel, **kwargs)
+
+    with _HF_ROUTE_LOCK:
+        known = _HF_ROUTE_TABLE.get(route_key)
+    last_error = None
+    if known:
+        remembered = [r for r in routes if r[0] == known]
+        if remembered:
+            name, text = _hf_race(remembered, stop_event, width=1)
+            if name:
+                return text
+            last_error = text
+            _hf_log(f"Remembered route '{known}' failed for {model}; re-racing")
+            with _HF_ROUTE_LOCK:
+                _HF_ROUTE_TABLE.pop(route_key, None)
+            routes = [r for r in routes if r[0] != known]
+
+    name, text = _hf_race(routes, stop_event, cancel=cancel)
+    if name:
+        with _HF_ROUTE_LOCK:
+            _HF_ROUTE_TABLE[route_key] = name
+            _HF_DEAD_MODELS.pop(str(model), None)
+        _hf_log(f"Route '{name}' won for {model} ({role or 'default'})")
+        return text
+    last_error = text or last_error
+    if stop_event and stop_event.is_set():
+        return "Error: Task cancelled by user."
+
+    with _HF_ROUTE_LOCK:
+        _HF_DEAD_MODELS[str(model)] = time.time()
+
+    # Model-level fallback (skip models that recently had no working route)
+    if kwargs.get("_hf_fallback", True):
+        task = kwargs.get("task", "chat")
+        for alt in _hf_recommended(task):
+            if alt == model:
                 continue
-            if r.status_code == 503:
-                return "Error 503: Hugging Face router temporarily unavailable. Please retry."
-        except requests.exceptions.ConnectionError:
-            _hf_log(f"Connection error to {url}; trying next")
+            with _HF_ROUTE_LOCK:
+                dead_at = _HF_DEAD_MODELS.get(alt)
+            if dead_at and time.time() - dead_at < HF_DEAD_MODEL_TTL:
+                continue
+            _hf_log(f"Trying fallback model: {alt}")
+            out = call_huggingface(prompt, api_url, alt, token, stop_event=stop_event, _hf_fallback=False, **kwargs)
+            if not out.startswith("Error"):
+                return out
+    return last_error or "Error: No working Hugging Face route found"
+
+# --- Streaming ---
+def _iter_sse(response, stop_event=None):
+    """Yield decoded `data:` payloads from a server-sent-events response"""
+    for raw in response.iter_lines(decode_unicode=True):
+        if stop_event and stop_event.is_set():
+            return
+        if not raw or not raw.startswith("data:"):
             continue
-        except Exception:
+        data = raw[5:].strip()
+        if data == "[DONE]":
+            return
+        try:
+            yield json.loads(data)
+        except ValueError:
             continue
 
-    # Fallback: standard inference text generation route
-    try:
-        payload_infer = {
-            "inputs": prompt,
-            "parameters": {
-                "max_new_tokens": max_tokens,
-                "temperature": temperature
-            }
-        }
-        endpoint = f"https://router.huggingface.co/models/{model}"
-        response = requests.post(endpoint, headers=headers, json=payload_infer, timeout=kwargs.get("timeout", 20))
-        if response.status_code == 200:
-            result = response.json()
-            if isinstance(result, list) and result:
-                item = result[0]
-                if isinstance(item, dict) and "generated_text" in item:
-                        text = item["generated_text"]
-                        prompt_str = str(prompt)
-                        if text.startswith(prompt_str):
-                            text = text[len(prompt_str):].strip()
-                        _HF_RESP_CACHE[cache_key] = (time.time(), text)
-                        return text
-            return str(result)[:500]
-        elif response.status_code == 404:
-            _hf_log("Router endpoint 404; attempting alternative models")
-        elif response.status_code == 401:
-            return "Error 401: Invalid Hugging Face credentials"
-        else:
-            return f"Error {response.status_code}: {response.text[:200]}"
-    except requests.exceptions.ConnectionError:
-        return "Error: Could not connect to Hugging Face router. Check connectivity or try again later."
-    except Exception as e:
-        _hf_log(f"Final router error: {e}")
-
-    # Model-level fallback
-    task = kwargs.get("task", "chat")
-    for alt in _hf_recommended(task):
-        if alt == model:
+def _iter_ndjson(response, stop_event=None):
+    """Yield objects from a newline-delimited JSON response (Ollama)"""
+    for raw in response.iter_lines(decode_unicode=True):
+        if stop_event and stop_event.is_set():
+            return
+        if not raw:
             continue
         try:
-            _hf_log(f"Trying fallback model: {alt}")
-            return call_huggingface(prompt, api_url, alt, token, **kwargs)
-        except Exception:
+            yield json.loads(raw)
+        except ValueError:
             continue
-    return "Error: No working Hugging Face route found"
+
+def _chat_messages(prompt, system_prompt, images=None, image_style="openai"):
+    """Build an OpenAI-style message list from a string prompt or history list"""
+    if isinstance(prompt, list):
+        messages = list(prompt)
+        if not any(m.get("role") == "system" for m in messages):
+            messages.insert(0, {"role": "system", "content": system_prompt})
+        return messages
+    user_content = prompt
+    if images and image_style == "openai":
+        user_content = [{"type": "text", "text": prompt}]
+        for img_b64 in images:
+            user_content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}})
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content}
+    ]
+
+class _StreamError(str):
+    """An error reported by the provider after the stream started (e.g. an Anthropic "error" event)"""
+
+def _hf_streams(api_url, model, token, kwargs):
+    """Stream Hugging Face only where the route table says the router's /v1 chat route works"""
+    if "localhost" in str(api_url) or "127.0.0.1" in str(api_url) or not api_url:
+        return False
+    if not (token or os.environ.get("HF_TOKEN")):
+        return False
+    with _HF_ROUTE_LOCK:
+        return _HF_ROUTE_TABLE.get((str(model), (kwargs.get("role") or "").lower())) == "router_v1"
+
+def _stream_request(prompt, api_url, model, api_provider, token, **kwargs):
+    """(endpoint, headers, payload, timeout) for a streaming call, from the call_llm builders"""
+    if api_provider == "huggingface":
+        endpoint, headers, payload = _hf_router_v1_request(prompt, api_url, model, token or os.environ.get("HF_TOKEN", ""), **kwargs)
+        default_timeout = 20
+    else:
+        build_request, _, default_timeout = HTTP_PROVIDERS[api_provider]
+        endpoint, headers, payload = build_request(prompt, api_url, model, token, **kwargs)
+    if api_provider == "google":
+        endpoint = endpoint.replace(":generateContent?", ":streamGenerateContent?alt=sse&", 1)
+    else:
+        payload["stream"] = True
+    return endpoint, headers, payload, kwargs.get("timeout", default_timeout)
+
+def _stream_deltas(api_provider, prompt, response, stop_event):
+    """Text deltas of a streaming response, per provider wire format"""
+    if api_provider == "ollama":
+        for chunk in _iter_ndjson(response, stop_event):
+            text = (chunk.get("message") or {}).get("content") if isinstance(prompt, list) else chunk.get("response")
+            if text:
+                yield text
+            if chunk.get("done"):
+                return
+    elif api_provider == "anthropic":
+        for event in _iter_sse(response, stop_event):
+            kind = event.get("type")
+            if kind == "content_block_delta":
+                text = (event.get("delta") or {}).get("text")
+                if text:
+                    yield text
+            elif kind == "error":
+                error = event.get("error") or {}
+                yield _StreamError(f"Error: {error.get('type', 'error')}: {error.get('message', '')}".rstrip(": "))
+                return
+            elif kind == "message_stop":
+                return
+    elif api_provider == "google":
+        for event in _iter_sse(response, stop_event):
+            for cand in event.get("candidates", [])[:1]:
+                for part in cand.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+    else:
+        # OpenAI-compatible (OpenAI, Hugging Face router)
+        for event in _iter_sse(response, stop_event):
+            choices = event.get("choices") or []
+            if choices:
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    yield text
+
+def stream_llm(prompt, api_url, model, api_provider="openai", token=None, stop_event=None, **kwargs):
+    """
+    Streaming counterpart of call_llm. Yields text deltas as they arrive.
+
+    Latency, time-to-first-chunk and errors are recorded in core.telemetry, and the
+    circuit breaker is honoured just like in call_llm. Requests are built by the same
+    builders as call_llm. Hugging Face streams only once its route table picked the
+    router's /v1 chat route; other providers and routes yield the whole call_llm
+    response once (call_llm records that request itself).
+    """
+    model = _resolve_tier_model(model, api_provider, kwargs.get("tier", "small"), kwargs.get("task_type"))
+    if not (api_provider in HTTP_PROVIDERS or (api_provider == "huggingface" and _hf_streams(api_url, model, token, kwargs))):
+        yield call_llm(prompt, api_url, model, api_provider, token, stop_event=stop_event, **kwargs)
+        return
+    telemetry = get_telemetry()
+    if not telemetry.allow(api_provider, model):
+        yield f"Error: {api_provider}/{model} is temporarily unavailable (circuit open after repeated failures)."
+        return
+    started = time.monotonic()
+    ttfb, first, parts, failed = None, None, [], None
+    chunks = _stream_llm(prompt, api_url, model, api_provider, token, stop_event=stop_event, **kwargs)
+    try:
+        for chunk in chunks:
+            if first is None:
+                ttfb, first = time.monotonic() - started, chunk
+            if isinstance(chunk, _StreamError):
+                failed = str(chunk)
+            parts.append(chunk)
+            if stop_event and stop_event.is_set():
+                break
+            yield chunk
+            if stop_event and stop_event.is_set():
+                break
+    finally:
+        chunks.close()              # Drops the HTTP response if we stopped mid-stream
+        text = failed or ("".join(parts) if first is not None else "Error: empty stream")
+        if stop_event and stop_event.is_set() and not (first or "").startswith("Error"):
+            text = "Error: Task cancelled by user."
+        _record_call(api_provider, model, prompt, text, time.monotonic() - started, ttfb)
+
+def _stream_llm(prompt, api_url, model, api_provider="openai", token=None, stop_event=None, **kwargs):
+    """
+    Provider-specific streaming implementation behind stream_llm.
+
+    Uses SSE for OpenAI / Anthropic / Gemini / HF router and NDJSON for Ollama.
+    Setting stop_event closes the connection mid-stream.
+    Errors are yielded as a single "Error ..." chunk, matching call_llm's convention.
+    """
+    if stop_event and stop_event.is_set():
+        yield "Error: Task cancelled by user."
+        return
+    if api_provider in _KEY_REQUIRED and not token:
+        yield _KEY_REQUIRED[api_provider]
+        return
+
+    scheduler = get_scheduler()
+    priority = scheduler.priority_for(kwargs.get("role"), kwargs.get("priority"))
+    if not scheduler.acquire(api_provider, model, _estimate_request_tokens(prompt, kwargs), priority, stop_event=stop_event):
+        yield "Error: Task cancelled by user."
+        return
+
+    try:
+        endpoint, headers, payload, timeout = _stream_request(prompt, api_url, model, api_provider, token, **kwargs)
+        response = get_client().post(endpoint, headers=headers, json=payload, timeout=timeout, stream=True)
+        try:
+            if response.status_code != 200:
+                yield f"Error {response.status_code}: {response.text[:200]}"
+                return
+            yield from _stream_deltas(api_provider, prompt, response, stop_event)
+        finally:
+            response.close()
+    except requests.exceptions.ConnectionError:
+        yield f"Error: Could not connect to {api_provider} API. Check your internet connection."
+    except Exception as e:
+        yield f"Error: {str(e)}"
 
 def test_llm_connection(api_provider, api_url, model, token=None):
     """Test LLM connection - Simplified"""
@@ -883,32 +1234,12 @@ def call_local_transformers(prompt, model_id, stop_event=None, **kwargs):
     """
     Call local model using Hugging Face Transformers with CUDA optimizations.
     Implements user-recommended practices: device mapping, mixed precision, and VRAM management.
+    Weights stay resident in the shared LocalModelRegistry, and concurrent prompts for the
+    same model are batched into one generate() call by the LocalBatcher.
     """
     try:
-        import torch
-        from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
-        
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        _hf_log(f"Using device: {device} for local inference with model {model_id}")
-        
-        # Load tokenizer and model
-        tokenizer = AutoTokenizer.from_pretrained(model_id)
-        
-        # Load model with quantization if VRAM is low (as suggested by user)
-        model_kwargs = {
-            "device_map": "auto",
-            "torch_dtype": torch.float16 if device == "cuda" else torch.float32,
-        }
-        
-        # Check for low VRAM
-        if device == "cuda":
-            vram_gb = torch.cuda.get_device_properties(0).total_memory / (1024**3)
-            if vram_gb < 8:
-                _hf_log(f"Low VRAM ({vram_gb:.1f}GB). Attempting 8-bit quantization.")
-                model_kwargs["load_in_8bit"] = True
-        
-        model = AutoModelForCausalLM.from_pretrained(model_id, **model_kwargs)
-        
+        from core.local_models import get_local_batcher
+
         # Prepare prompt
         if isinstance(prompt, list):
             # Convert chat history to string
@@ -919,38 +1250,16 @@ def call_local_transformers(prompt, model_id, stop_event=None, **kwargs):
         else:
             full_prompt = prompt
 
-        inputs = tokenizer(full_prompt, return_tensors="pt").to(device)
-        
         if stop_event and stop_event.is_set():
             return "Error: Task cancelled by user."
 
-        # Inference with Mixed Precision (user recommendation)
-        with torch.no_grad():
-            if device == "cuda":
-                with torch.cuda.amp.autocast():
-                    outputs = model.generate(
-                        **inputs,
-                        max_new_tokens=kwargs.get("max_tokens", 512),
-                        temperature=kwargs.get("temperature", 0.7),
-                        do_sample=True,
-                        pad_token_id=tokenizer.eos_token_id
-                    )
-            else:
-                outputs = model.generate(
-                    **inputs,
-                    max_new_tokens=kwargs.get("max_tokens", 512),
-                    temperature=kwargs.get("temperature", 0.7),
-                    do_sample=True,
-                    pad_token_id=tokenizer.eos_token_id
-                )
-        
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
-        # Strip the input prompt from response if model repeats it
-        if response.startswith(full_prompt):
-            response = response[len(full_prompt):].strip()
-            
-        return response
+        return get_local_batcher().generate(
+            model_id, full_prompt,
+            max_new_tokens=kwargs.get("max_tokens", 512),
+            temperature=kwargs.get("temperature", 0.7),
+            dtype=kwargs.get("dtype"),
+            stop_event=stop_event
+        )
 
     except Exception as e:
         _hf_log(f"Local transformers error: {e}")
@@ -1036,7 +1345,7 @@ def run_hf_diagnostics(model: str, token: str) -> Dict[str, str]:
         url = "https://router.huggingface.co/hf-inference/models/INVALID/v1/chat/completions"
         headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
         payload = {"model": model, "messages": [{"role": "user", "content": "OK"}]}
-        resp = requests.post(url, headers=headers, json=payload, timeout=5)
+        resp = get_client().post(url, headers=headers, json=payload, timeout=5)
         results["raw_http_status"] = f"{resp.status_code}"
     except Exception as e:
         results["raw_http_status"] = f"Error: {e}"
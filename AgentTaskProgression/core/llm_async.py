@@ -0,0 +1,295 @@
+"""
+Async LLM Interface - asyncio counterpart of core.llm.call_llm with concurrent fan-out
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+import weakref
+
+try:
+    import httpx
+    HAS_HTTPX = True
+except Exception:
+    HAS_HTTPX = False
+
+from core.llm import (HTTP_PROVIDERS, _KEY_REQUIRED, _admit, _call_llm, _estimate_request_tokens,
+                      _record_call, _remember, _retry_delay)
+from core.http_client import get_client
+from core.rate_limiter import get_scheduler
+from core.token_budget import take_provider_usage
+from core.telemetry import classify_error, get_telemetry
+from core.metrics import get_tracer
+
+# Max in-flight requests per provider on one event loop
+PROVIDER_CONCURRENCY = {
+    "openai": 8,
+    "anthropic": 4,
+    "google": 4,
+    "huggingface": 4,
+    "ollama": 2,
+}
+DEFAULT_PROVIDER_CONCURRENCY = 4
+
+# Semaphores and httpx clients are bound to the loop that created them
+_LOOP_STATE = weakref.WeakKeyDictionary()
+_STATE_LOCK = threading.Lock()
+
+
+def _loop_state():
+    loop = asyncio.get_running_loop()
+    with _STATE_LOCK:
+        state = _LOOP_STATE.get(loop)
+        if state is None:
+            state = {"semaphores": {}, "client": None}
+            _LOOP_STATE[loop] = state
+    return state
+
+
+def _provider_semaphore(api_provider):
+    semaphores = _loop_state()["semaphores"]
+    sem = semaphores.get(api_provider)
+    if sem is None:
+        sem = asyncio.Semaphore(PROVIDER_CONCURRENCY.get(api_provider, DEFAULT_PROVIDER_CONCURRENCY))
+        semaphores[api_provider] = sem
+    return sem
+
+
+def _async_client():
+    state = _loop_state()
+    if state["client"] is None:
+        pool = get_client()
+        state["client"] = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool.pool_maxsize * pool.pool_connections,
+                                max_keepalive_connections=pool.pool_maxsize),
+            timeout=httpx.Timeout(pool.read_timeout, connect=pool.connect_timeout)
+        )
+    return state["client"]
+
+
+async def acall_llm(prompt, api_url, model, api_provider="openai", token=None, stop_event=None, **kwargs):
+    """
+    Coroutine version of call_llm.
+
+    OpenAI / Anthropic / Gemini / Ollama are awaited natively on the event loop via httpx.
+    Hugging Face (multi-route fallback chain) and providers without httpx installed
+    run the blocking call path in the default executor.
+    """
+    with get_tracer().span("llm", phase="llm", provider=api_provider, model=str(model)) as span:
+        response = await _acall_llm(prompt, api_url, model, api_provider, token, stop_event=stop_event, **kwargs)
+        if classify_error(response):
+            span.status = "error"
+        return response
+
+
+async def _acall_llm(prompt, api_url, model, api_provider, token, stop_event=None, **kwargs):
+    if stop_event and stop_event.is_set():
+        return "Error: Task cancelled by user."
+
+    async with _provider_semaphore(api_provider):
+        if not HAS_HTTPX or api_provider not in HTTP_PROVIDERS:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(_call_llm, prompt, api_url, model, api_provider, token,
+                                     stop_event=stop_event, **kwargs)
+            return await loop.run_in_executor(None, contextvars.copy_context().run, call)
+
+        if api_provider in _KEY_REQUIRED and not token:
+            return _KEY_REQUIRED[api_provider]
+
+        model, cache_key, response = _admit(prompt, api_url, model, api_provider, kwargs)
+        if response is not None:
+            return response
+
+        response = await _ascheduled_dispatch(prompt, api_url, model, api_provider, token, stop_event=stop_event, **kwargs)
+        _remember(cache_key, response)
+        return response
+
+
+async def _ascheduled_dispatch(prompt, api_url, model, api_provider, token, stop_event=None, **kwargs):
+    """Coroutine version of core.llm._scheduled_dispatch for the httpx providers"""
+    build_request, parse_response, default_timeout = HTTP_PROVIDERS[api_provider]
+    scheduler = get_scheduler()
+    priority = scheduler.priority_for(kwargs.get("role"), kwargs.get("priority"))
+    est_tokens = _estimate_request_tokens(prompt, kwargs)
+    response = "Error: Rate limit exceeded. Please try again later."
+    settled = False
+    try:
+        endpoint, headers, payload = build_request(prompt, api_url, model, token, **kwargs)
+        timeout = get_client().resolve_timeout(kwargs.get("timeout", default_timeout))
+        for attempt in range(scheduler.max_retries + 1):
+            if not await scheduler.aacquire(api_provider, model, est_tokens, priority, stop_event=stop_event):
+                return "Error: Task cancelled by user."
+            take_provider_usage()
+            started = time.monotonic()
+            try:
+                http = await _async_client().post(
+                    endpoint, headers=headers, json=payload,
+                    timeout=httpx.Timeout(timeout[1], connect=timeout[0])
+                )
+            except httpx.ConnectError:
+                response = f"Error: Could not connect to {api_provider} API. Check your internet connection."
+                _record_call(api_provider, model, prompt, response, 0.0)
+                settled = True
+                return response
+            scheduler.observe(api_provider, model, http.status_code, http.headers)
+            response = parse_response(http, prompt)
+            _record_call(api_provider, model, prompt, response, time.monotonic() - started)
+            settled = True
+            delay = _retry_delay(api_provider, model, http.status_code, response, attempt)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+        if stop_event and stop_event.is_set():
+            return "Error: Task cancelled by user."
+        return response
+    except Exception as e:
+        response = f"Error: {str(e)}"
+        if not settled:
+            _record_call(api_provider, model, prompt, response, 0.0)
+            settled = True
+        return response
+    finally:
+        if not settled:
+            # Cancelled while waiting for budget, lost a race (llm_first) or the loop shut
+            # down: release a half-open probe claimed by allow() without counting a failure
+            get_telemetry().record(api_provider, model, 0.0, error="cancelled")
+
+
+async def llm_gather(requests, max_concurrency=8):
+    """
+    Issue many LLM requests concurrently on the running loop.
+
+    Each request is a dict of acall_llm arguments (prompt, api_url, model, api_provider,
+    token, plus any call_llm kwargs). Results come back in request order; failures are
+    returned as "Error: ..." strings like every other call_llm path.
+    """
+    overall = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _one(req):
+        async with overall:
+            try:
+                return await acall_llm(**req)
+            except Exception as e:
+                return f"Error: {str(e)}"
+
+    return await asyncio.gather(*(_one(dict(req)) for req in requests))
+
+
+async def llm_first(requests, accept, timeout=None, stop_event=None):
+    """
+    Issue requests concurrently and return the first response that accept() approves.
+
+    accept(index, text) -> (ok, value) runs in the default executor as responses
+    arrive, one at a time, while the remaining requests keep streaming in. As soon as
+    one is accepted the others are cancelled (their HTTP requests are closed).
+    Returns (index, value, rejected) where rejected maps index -> text/reason; index
+    is None when nothing was accepted before timeout (seconds) or stop_event.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = {asyncio.ensure_future(acall_llm(**dict(req))): i for i, req in enumerate(requests)}
+    pending, rejected = set(tasks), {}
+    deadline = loop.time() + timeout if timeout else None
+    try:
+        while pending:
+            if stop_event and stop_event.is_set():
+                break
+            wait = 0.5 if stop_event else None
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                wait = min(wait, remaining) if wait else remaining
+            done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=tasks.get):
+                index = tasks[task]
+                try:
+                    text = task.result()
+                except Exception as e:
+                    text = f"Error: {str(e)}"
+                if not isinstance(text, str) or not text or text.startswith("Error"):
+                    rejected[index] = text
+                    continue
+                try:
+                    ok, value = await loop.run_in_executor(None, accept, index, text)
+                except Exception as e:
+                    ok, value = False, f"Error: validation failed: {e}"
+                if ok:
+                    return index, value, rejected
+                rejected[index] = value
+        return None, None, rejected
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def run_llm_first(requests, accept, timeout=None, stop_event=None):
+    """Blocking helper for worker threads: llm_first on the shared LLM event loop"""
+    return _run_on_llm_loop(llm_first(requests, accept, timeout=timeout, stop_event=stop_event))
+
+
+def run_llm_batch(requests, max_concurrency=8):
+    """
+    Blocking helper for worker threads: run llm_gather on the shared LLM event loop.
+
+    Lets thread-based code (chat pipeline, agents) fan out N prompts without N threads.
+    Every batch shares the loop's keep-alive connections and its per-provider limits.
+    """
+    return _run_on_llm_loop(llm_gather(requests, max_concurrency=max_concurrency))
+
+
+# --- Shared event loop ---
+_LLM_LOOP = None
+_LLM_LOOP_LOCK = threading.Lock()
+
+
+def get_llm_loop():
+    """
+    Process-wide event loop on its own daemon thread, used by the blocking helpers.
+
+    Its httpx.AsyncClient and provider semaphores (see _loop_state) live as long as the
+    loop, so pooled connections are reused across batches and PROVIDER_CONCURRENCY
+    caps in-flight requests across all callers, not just within one batch.
+    """
+    global _LLM_LOOP
+    if _LLM_LOOP is None:
+        with _LLM_LOOP_LOCK:
+            if _LLM_LOOP is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, daemon=True, name="llm-async-loop").start()
+                _LLM_LOOP = loop
+    return _LLM_LOOP
+
+
+def _run_on_llm_loop(coro):
+    loop = get_llm_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("Blocking LLM helper called on the LLM event loop; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def shutdown_llm_loop(timeout=5.0):
+    """Close the shared client and stop the loop (application exit)"""
+    global _LLM_LOOP
+    with _LLM_LOOP_LOCK:
+        loop, _LLM_LOOP = _LLM_LOOP, None
+    if loop is None:
+        return
+
+    async def _close():
+        client = _LOOP_STATE.get(loop, {}).get("client")
+        if client is not None:
+            await client.aclose()
+
+    try:
+        asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout)
+    except Exception as e:
+        print(f"[LLM] Error closing async client: {e}")
+    loop.call_soon_threadsafe(loop.stop)
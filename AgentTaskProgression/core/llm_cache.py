@@ -0,0 +1,203 @@
+"""
+LLM Response Cache - Content-addressed, two-tier (memory LRU + SQLite) cache for call_llm
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DB_PATH = os.path.join(os.path.expanduser("~"), ".ai_dev_ide_llm_cache.sqlite")
+DEFAULT_MEMORY_ENTRIES = 256
+DEFAULT_DISK_MB = 64
+
+
+def make_cache_key(api_provider, api_url, model, prompt, **kwargs):
+    """
+    Hash everything that can change the completion.
+
+    The full prompt / message list is hashed (no truncation), and images are
+    hashed individually so large base64 payloads do not bloat the key material.
+    """
+    images = kwargs.get("images") or []
+    material = {
+        "provider": api_provider,
+        "url": api_url or "",
+        "model": str(model),
+        "prompt": prompt,
+        "system_prompt": kwargs.get("system_prompt"),
+        "cache_system": bool(kwargs.get("cache_system")),
+        "role": kwargs.get("role"),
+        "temperature": kwargs.get("temperature"),
+        "max_tokens": kwargs.get("max_tokens"),
+        "top_p": kwargs.get("top_p"),
+        "images": [hashlib.sha256(str(img).encode("utf-8")).hexdigest() for img in images],
+    }
+    blob = json.dumps(material, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    In-memory LRU in front of an on-disk SQLite store.
+
+    The memory tier holds at most `memory_entries` responses; the disk tier is
+    trimmed by least-recent access once its payload exceeds `disk_mb`.
+    """
+
+    def __init__(self, db_path=CACHE_DB_PATH, memory_entries=DEFAULT_MEMORY_ENTRIES, disk_mb=DEFAULT_DISK_MB):
+        self.db_path = db_path
+        self.memory_entries = memory_entries
+        self.disk_bytes = int(disk_mb * 1024 * 1024)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes_since_trim = 0
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self):
+        if self._conn is None and self.db_path:
+            try:
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                    "created REAL NOT NULL, accessed REAL NOT NULL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+                self._conn.commit()
+            except Exception as e:
+                print(f"LLM cache disabled on disk: {e}")
+                self._conn = None
+                self.db_path = None
+        return self._conn
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            conn = self._db()
+            if conn is not None:
+                try:
+                    row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+                    if row:
+                        conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+                        conn.commit()
+                        self._remember(key, row[0])
+                        self.hits += 1
+                        return row[0]
+                except Exception:
+                    pass
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+            conn = self._db()
+            if conn is None:
+                return
+            try:
+                now = time.time()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value.encode("utf-8")), now, now)
+                )
+                conn.commit()
+                self._writes_since_trim += 1
+                if self._writes_since_trim >= 32:
+                    self._trim_disk(conn)
+            except Exception:
+                pass
+
+    def _trim_disk(self, conn):
+        """Evict least-recently-accessed rows until the store fits its byte budget"""
+        self._writes_since_trim = 0
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.disk_bytes:
+            return
+        excess = total - self.disk_bytes
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        conn.commit()
+
+    def configure(self, memory_entries=None, disk_mb=None, enabled=None):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if memory_entries:
+                self.memory_entries = int(memory_entries)
+                while len(self._memory) > self.memory_entries:
+                    self._memory.popitem(last=False)
+            if disk_mb:
+                self.disk_bytes = int(float(disk_mb) * 1024 * 1024)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            conn = self._db()
+            if conn is not None:
+                conn.execute("DELETE FROM responses")
+                conn.commit()
+
+    def stats(self):
+        with self._lock:
+            disk_entries, disk_size = 0, 0
+            conn = self._db()
+            if conn is not None:
+                try:
+                    disk_entries, disk_size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+                except Exception:
+                    pass
+            return {
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "disk_bytes": disk_size,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_llm_cache():
+    """Process-wide response cache used by core.llm.call_llm"""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = LLMCache()
+    return _CACHE
+
+
+def configure_llm_cache(settings):
+    """Apply llm_cache_* values from the IDE settings dict"""
+    cache = get_llm_cache()
+    if settings:
+        cache.configure(
+            memory_entries=settings.get("llm_cache_memory_entries"),
+            disk_mb=settings.get("llm_cache_disk_mb"),
+            enabled=settings.get("llm_cache_enabled", True)
+        )
+    return cache
@@ -0,0 +1,435 @@
+"""
+Local Model Registry - Keeps Hugging Face transformers models resident between calls
+"""
+import gc
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+DEFAULT_MEMORY_GB = 8.0         # Combined weight footprint kept resident
+DEFAULT_IDLE_SECONDS = 900      # Unload models nobody has used for this long
+REAPER_INTERVAL = 30.0
+
+DEFAULT_BATCH_SIZE = 8          # Max prompts folded into one generate() call
+DEFAULT_BATCH_WAIT_MS = 25      # How long the first prompt waits for company
+BATCH_WORKER_IDLE = 60.0        # Batch worker threads exit after this long without work
+
+
+class LocalModel:
+    """A loaded tokenizer/model pair plus bookkeeping"""
+
+    def __init__(self, key, tokenizer, model, device, size_bytes):
+        self.key = key
+        self.model_id = key[0]
+        self.tokenizer = tokenizer
+        self.model = model
+        self.device = device
+        self.size_bytes = size_bytes
+        self.last_used = time.monotonic()
+        self.in_use = 0
+
+
+class LocalModelRegistry:
+    """
+    Process-wide cache of loaded transformers models keyed by (model_id, dtype, device).
+
+    Loading is serialized per key so concurrent callers share one load. Entries are
+    kept in LRU order and evicted when the weight footprint exceeds the memory budget
+    or when idle for longer than `idle_seconds`. Models currently generating are never
+    evicted.
+    """
+
+    def __init__(self, memory_gb=DEFAULT_MEMORY_GB, idle_seconds=DEFAULT_IDLE_SECONDS):
+        self.memory_bytes = int(memory_gb * 1024 ** 3)
+        self.idle_seconds = idle_seconds
+        self._models = OrderedDict()
+        self._load_locks = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+        self.loads = 0
+        self.hits = 0
+
+    # --- Loading ---
+    @staticmethod
+    def _resolve(dtype=None):
+        """Pick device / dtype / load kwargs the same way call_local_transformers always has"""
+        import torch
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        load_kwargs = {"device_map": "auto"}
+        if dtype is None:
+            torch_dtype = torch.float16 if device == "cuda" else torch.float32
+        else:
+            torch_dtype = getattr(torch, str(dtype).replace("torch.", ""))
+        load_kwargs["torch_dtype"] = torch_dtype
+        dtype_name = str(torch_dtype).replace("torch.", "")
+        if device == "cuda":
+            vram_gb = torch.cuda.get_device_properties(0).total_memory / (1024 ** 3)
+            if vram_gb < 8:
+                load_kwargs["load_in_8bit"] = True
+                dtype_name = "int8"
+        return device, dtype_name, load_kwargs
+
+    @staticmethod
+    def _footprint(model):
+        try:
+            return int(model.get_memory_footprint())
+        except Exception:
+            try:
+                return sum(p.numel() * p.element_size() for p in model.parameters())
+            except Exception:
+                return 0
+
+    def _load(self, model_id, device, dtype_name, load_kwargs):
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        from core.llm import _hf_log
+        started = time.monotonic()
+        if load_kwargs.get("load_in_8bit"):
+            _hf_log(f"Low VRAM. Attempting 8-bit quantization for {model_id}.")
+        tokenizer = AutoTokenizer.from_pretrained(model_id)
+        model = AutoModelForCausalLM.from_pretrained(model_id, **load_kwargs)
+        model.eval()
+        _hf_log(f"Loaded {model_id} ({dtype_name}) on {device} in {time.monotonic() - started:.1f}s")
+        return tokenizer, model
+
+    def get(self, model_id, dtype=None, _pin=False):
+        """Return the resident LocalModel for model_id, loading it on first use"""
+        device, dtype_name, load_kwargs = self._resolve(dtype)
+        key = (str(model_id), dtype_name, device)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                entry.last_used = time.monotonic()
+                entry.in_use += int(_pin)
+                self.hits += 1
+                return entry
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._models.move_to_end(key)
+                    entry.last_used = time.monotonic()
+                    entry.in_use += int(_pin)
+                    self.hits += 1
+                    return entry
+            tokenizer, model = self._load(model_id, device, dtype_name, load_kwargs)
+            entry = LocalModel(key, tokenizer, model, device, self._footprint(model))
+            entry.in_use = int(_pin)
+            with self._lock:
+                self._models[key] = entry
+                self.loads += 1
+                self._evict_over_budget(keep=key)
+        self._ensure_reaper()
+        return entry
+
+    @contextmanager
+    def lease(self, model_id, dtype=None):
+        """Hold a model for the duration of a generate call so it cannot be evicted"""
+        entry = self.get(model_id, dtype, _pin=True)
+        try:
+            yield entry
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+
+    def warm_up(self, model_ids, background=True):
+        """Preload models (e.g. when an agent group is loaded). Returns the worker thread if backgrounded."""
+        model_ids = [m for m in dict.fromkeys(model_ids or []) if m]
+
+        def _run():
+            from core.llm import _hf_log
+            for model_id in model_ids:
+                try:
+                    self.get(model_id)
+                except Exception as e:
+                    _hf_log(f"Warm-up failed for {model_id}: {e}")
+
+        if not background:
+            _run()
+            return None
+        worker = threading.Thread(target=_run, daemon=True, name="local-model-warmup")
+        worker.start()
+        return worker
+
+    # --- Eviction ---
+    def _evict_over_budget(self, keep=None):
+        """Drop least-recently-used idle models until the footprint fits. Caller holds _lock."""
+        total = sum(e.size_bytes for e in self._models.values())
+        for key in list(self._models.keys()):
+            if total <= self.memory_bytes:
+                break
+            entry = self._models[key]
+            if key == keep or entry.in_use:
+                continue
+            self._unload(key)
+            total -= entry.size_bytes
+
+    def _unload(self, key):
+        """Remove one entry and release its memory. Caller holds _lock."""
+        entry = self._models.pop(key, None)
+        if entry is None:
+            return
+        entry.model = None
+        entry.tokenizer = None
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
+        print(f"[LocalModels] Unloaded {key[0]} ({key[1]}, {key[2]})")
+
+    def unload(self, model_id=None):
+        """Unload one model (all dtypes/devices) or everything when model_id is None"""
+        with self._lock:
+            for key in list(self._models.keys()):
+                if model_id is None or key[0] == model_id:
+                    if not self._models[key].in_use:
+                        self._unload(key)
+
+    def reap_idle(self):
+        """Unload models idle for longer than idle_seconds"""
+        if not self.idle_seconds:
+            return
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            for key, entry in list(self._models.items()):
+                if not entry.in_use and entry.last_used < cutoff:
+                    self._unload(key)
+
+    def _ensure_reaper(self):
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+
+        def _loop():
+            while True:
+                time.sleep(min(REAPER_INTERVAL, max(1.0, (self.idle_seconds or REAPER_INTERVAL) / 4)))
+                try:
+                    self.reap_idle()
+                except Exception:
+                    pass
+
+        self._reaper = threading.Thread(target=_loop, daemon=True, name="local-model-reaper")
+        self._reaper.start()
+
+    # --- Settings / status ---
+    def configure(self, memory_gb=None, idle_seconds=None):
+        with self._lock:
+            if memory_gb:
+                self.memory_bytes = int(float(memory_gb) * 1024 ** 3)
+                self._evict_over_budget()
+            if idle_seconds is not None:
+                self.idle_seconds = float(idle_seconds)
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "models": [
+                    {"model": e.model_id, "dtype": e.key[1], "device": e.device,
+                     "mb": round(e.size_bytes / (1024 ** 2), 1), "in_use": e.in_use,
+                     "idle_s": round(now - e.last_used, 1)}
+                    for e in self._models.values()
+                ],
+                "resident_mb": round(sum(e.size_bytes for e in self._models.values()) / (1024 ** 2), 1),
+                "budget_mb": round(self.memory_bytes / (1024 ** 2), 1),
+                "loads": self.loads,
+                "hits": self.hits
+            }
+
+
+class _BatchRequest:
+    def __init__(self, prompt, max_new_tokens, temperature, stop_event):
+        self.prompt = prompt
+        self.max_new_tokens = int(max_new_tokens)
+        self.temperature = float(temperature)
+        self.stop_event = stop_event
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LocalBatcher:
+    """
+    Dynamic batching front end for local transformers generation.
+
+    Prompts for the same (model_id, dtype) that arrive within `max_wait_ms` of each
+    other are left-padded into a single generate() call (up to `max_batch_size`),
+    and each caller gets back only its own continuation. Requests with different
+    temperatures are generated in separate sub-batches.
+    """
+
+    def __init__(self, registry, max_batch_size=DEFAULT_BATCH_SIZE, max_wait_ms=DEFAULT_BATCH_WAIT_MS):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queues = {}
+        self._workers = {}
+        self._cond = threading.Condition()
+        self.batches = 0
+        self.batched_requests = 0
+
+    def configure(self, max_batch_size=None, max_wait_ms=None):
+        with self._cond:
+            if max_batch_size:
+                self.max_batch_size = max(1, int(max_batch_size))
+            if max_wait_ms is not None:
+                self.max_wait_ms = max(0.0, float(max_wait_ms))
+
+    def generate(self, model_id, prompt, max_new_tokens=512, temperature=0.7, dtype=None, stop_event=None):
+        """Queue a prompt and block until its batch has been generated"""
+        key = (str(model_id), dtype)
+        request = _BatchRequest(prompt, max_new_tokens, temperature, stop_event)
+        with self._cond:
+            self._queues.setdefault(key, deque()).append(request)
+            worker = self._workers.get(key)
+            if worker is None or not worker.is_alive():
+                worker = threading.Thread(target=self._worker, args=(key,), daemon=True,
+                                          name=f"local-batch-{model_id}")
+                self._workers[key] = worker
+                worker.start()
+            self._cond.notify_all()
+        while not request.done.wait(0.25):
+            if stop_event and stop_event.is_set() and self._withdraw(key, request):
+                return "Error: Task cancelled by user."
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _withdraw(self, key, request):
+        """Remove a still-queued request; False if it is already generating"""
+        with self._cond:
+            queue = self._queues.get(key)
+            if queue and request in queue:
+                queue.remove(request)
+                return True
+        return False
+
+    def _worker(self, key):
+        while True:
+            with self._cond:
+                queue = self._queues.setdefault(key, deque())
+                idle_deadline = time.monotonic() + BATCH_WORKER_IDLE
+                while not queue:
+                    remaining = idle_deadline - time.monotonic()
+                    if remaining <= 0:
+                        if self._workers.get(key) is threading.current_thread():
+                            del self._workers[key]
+                        return
+                    self._cond.wait(remaining)
+                # First request is in: give concurrent callers a short window to join
+                window_end = time.monotonic() + self.max_wait_ms / 1000.0
+                while len(queue) < self.max_batch_size:
+                    remaining = window_end - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [queue.popleft() for _ in range(min(len(queue), self.max_batch_size))]
+
+            live = []
+            for request in batch:
+                if request.stop_event and request.stop_event.is_set():
+                    request.result = "Error: Task cancelled by user."
+                    request.done.set()      # Already off the queue, so generate() cannot withdraw it
+                else:
+                    live.append(request)
+            batch = live
+            groups = OrderedDict()
+            for request in batch:
+                groups.setdefault(request.temperature, []).append(request)
+            for group in groups.values():
+                try:
+                    self._run(key, group)
+                except Exception as e:
+                    for request in group:
+                        request.error = e
+                finally:
+                    for request in group:
+                        request.done.set()
+
+    def _run(self, key, group):
+        import torch
+        model_id, dtype = key
+        with self.registry.lease(model_id, dtype) as resident:
+            tokenizer, model, device = resident.tokenizer, resident.model, resident.device
+            if tokenizer.pad_token_id is None:
+                tokenizer.pad_token = tokenizer.eos_token
+            # Decoder-only models must be padded on the left so every row ends at its prompt
+            tokenizer.padding_side = "left"
+            inputs = tokenizer([r.prompt for r in group], return_tensors="pt", padding=True).to(device)
+            generate_kwargs = dict(
+                max_new_tokens=max(r.max_new_tokens for r in group),
+                temperature=group[0].temperature,
+                do_sample=True,
+                pad_token_id=tokenizer.pad_token_id
+            )
+            with torch.no_grad():
+                if device == "cuda":
+                    with torch.cuda.amp.autocast():
+                        outputs = model.generate(**inputs, **generate_kwargs)
+                else:
+                    outputs = model.generate(**inputs, **generate_kwargs)
+            prompt_len = inputs["input_ids"].shape[1]
+            for row, request in zip(outputs, group):
+                request.result = tokenizer.decode(
+                    row[prompt_len:prompt_len + request.max_new_tokens], skip_special_tokens=True
+                ).strip()
+        with self._cond:
+            self.batches += 1
+            self.batched_requests += len(group)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "queued": {k[0]: len(q) for k, q in self._queues.items() if q},
+                "batches": self.batches,
+                "avg_batch": round(self.batched_requests / self.batches, 2) if self.batches else 0.0
+            }
+
+
+_REGISTRY = None
+_BATCHER = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_model_registry():
+    """Process-wide registry used by core.llm.call_local_transformers"""
+    global _REGISTRY
+    if _REGISTRY is None:
+        with _REGISTRY_LOCK:
+            if _REGISTRY is None:
+                _REGISTRY = LocalModelRegistry()
+    return _REGISTRY
+
+
+def get_local_batcher():
+    """Process-wide batcher in front of the model registry"""
+    global _BATCHER
+    if _BATCHER is None:
+        registry = get_model_registry()
+        with _REGISTRY_LOCK:
+            if _BATCHER is None:
+                _BATCHER = LocalBatcher(registry)
+    return _BATCHER
+
+
+def configure_model_registry(settings):
+    """Apply local_model_* and local_batch_* values from the IDE settings dict"""
+    registry = get_model_registry()
+    if settings:
+        registry.configure(
+            memory_gb=settings.get("local_model_memory_gb"),
+            idle_seconds=settings.get("local_model_idle_seconds")
+        )
+        get_local_batcher().configure(
+            max_batch_size=settings.get("local_batch_max_size"),
+            max_wait_ms=settings.get("local_batch_max_wait_ms")
+        )
+    return registry
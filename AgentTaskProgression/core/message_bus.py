@@ -0,0 +1,282 @@
+"""
+Message Bus - Bounded pub/sub for agent communication with a ring-buffer log and replay
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from fnmatch import fnmatchcase
+
+DEFAULT_LOG_CAPACITY = 5000     # Messages kept in the replay log
+DEFAULT_QUEUE_SIZE = 256        # Pending deliveries per subscriber
+DEFAULT_BLOCK_TIMEOUT = 5.0     # Max seconds a publisher waits under the "block" policy
+
+DROP_OLDEST = "drop_oldest"
+BLOCK = "block"
+COALESCE = "coalesce"
+POLICIES = (DROP_OLDEST, BLOCK, COALESCE)
+
+
+def _is_pattern(topic):
+    return any(c in topic for c in "*?[")
+
+
+class Subscription:
+    """One subscriber: a topic or wildcard pattern, a bounded queue and a backpressure policy"""
+
+    def __init__(self, bus, pattern, callback, maxsize=DEFAULT_QUEUE_SIZE, policy=DROP_OLDEST,
+                 coalesce_key=None, block_timeout=DEFAULT_BLOCK_TIMEOUT):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.bus = bus
+        self.pattern = pattern
+        self.callback = callback
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.coalesce_key = coalesce_key or (lambda entry: entry["topic"])
+        self.block_timeout = block_timeout
+        self.pending = deque()
+        self.scheduled = False
+        self.active = True
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def matches(self, topic):
+        return self.pattern == topic or (_is_pattern(self.pattern) and fnmatchcase(topic, self.pattern))
+
+    def stats(self):
+        return {"pattern": self.pattern, "policy": self.policy, "pending": len(self.pending),
+                "delivered": self.delivered, "dropped": self.dropped, "coalesced": self.coalesced}
+
+
+class MessageBus:
+    """
+    Pub/sub message bus for agent communication.
+
+    publish() appends to a fixed-size ring-buffer log (indexed by topic and time) and
+    enqueues the message on each matching subscriber's bounded queue; callbacks run on
+    a small dispatcher pool, serially per subscriber, never under the bus lock.
+    Topics may be subscribed exactly or with fnmatch wildcards ("agent.*", "*").
+    """
+
+    def __init__(self, log_capacity=DEFAULT_LOG_CAPACITY, dispatch_workers=4):
+        self.log_capacity = int(log_capacity)
+        self._ring = [None] * self.log_capacity
+        self._next_seq = 0
+        self._topic_index = defaultdict(deque)     # topic -> seqs (oldest first)
+        self._exact = defaultdict(list)            # topic -> [Subscription]
+        self._patterns = []                        # [Subscription] with wildcards
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+        self._pool = ThreadPoolExecutor(max_workers=dispatch_workers, thread_name_prefix="bus")
+
+    # --- Subscriptions ---
+    def subscribe(self, topic, callback, maxsize=DEFAULT_QUEUE_SIZE, policy=DROP_OLDEST,
+                  coalesce_key=None, block_timeout=DEFAULT_BLOCK_TIMEOUT):
+        """Subscribe callback(message) to a topic or wildcard pattern; returns the Subscription"""
+        sub = Subscription(self, topic, callback, maxsize, policy, coalesce_key, block_timeout)
+        with self._lock:
+            if _is_pattern(topic):
+                self._patterns.append(sub)
+            else:
+                self._exact[topic].append(sub)
+        return sub
+
+    def unsubscribe(self, topic, callback=None):
+        """Unsubscribe by (topic, callback) or by passing the Subscription itself"""
+        with self._lock:
+            if isinstance(topic, Subscription):
+                subs = [topic]
+            else:
+                pool = self._patterns if _is_pattern(topic) else self._exact.get(topic, [])
+                subs = [s for s in pool if s.pattern == topic and (callback is None or s.callback == callback)]
+            for sub in subs:
+                sub.active = False
+                sub.pending.clear()
+                if sub in self._patterns:
+                    self._patterns.remove(sub)
+                elif sub in self._exact.get(sub.pattern, []):
+                    self._exact[sub.pattern].remove(sub)
+            self._space.notify_all()
+
+    def _matching(self, topic):
+        return list(self._exact.get(topic, ())) + [s for s in self._patterns if s.matches(topic)]
+
+    # --- Publishing ---
+    def publish(self, topic, message):
+        """Log the message and hand it to every matching subscriber; returns its sequence number"""
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            entry = {
+                "seq": seq,
+                "topic": topic,
+                "message": message,
+                "timestamp": datetime.now().isoformat(),
+                "ts": time.time()
+            }
+            self._ring[seq % self.log_capacity] = entry
+            index = self._topic_index[topic]
+            index.append(seq)
+            oldest = self._oldest_seq()
+            while index and index[0] < oldest:
+                index.popleft()
+            to_schedule = []
+            for sub in self._matching(topic):
+                if self._enqueue(sub, entry) and not sub.scheduled:
+                    sub.scheduled = True
+                    to_schedule.append(sub)
+        for sub in to_schedule:
+            self._schedule(sub)
+        return seq
+
+    def _enqueue(self, sub, entry):
+        """Apply the subscriber's backpressure policy. Caller holds _lock."""
+        if sub.policy == COALESCE:
+            key = sub.coalesce_key(entry)
+            for i, queued in enumerate(sub.pending):
+                if sub.coalesce_key(queued) == key:
+                    sub.pending[i] = entry
+                    sub.coalesced += 1
+                    return True
+        if len(sub.pending) >= sub.maxsize:
+            if sub.policy == BLOCK:
+                deadline = time.monotonic() + sub.block_timeout
+                while sub.active and len(sub.pending) >= sub.maxsize:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        sub.dropped += 1
+                        return False
+                    self._space.wait(remaining)
+                if not sub.active:
+                    return False
+            else:
+                sub.pending.popleft()
+                sub.dropped += 1
+        sub.pending.append(entry)
+        return True
+
+    def _schedule(self, sub):
+        try:
+            self._pool.submit(self._deliver, sub)
+        except RuntimeError:
+            with self._lock:
+                sub.scheduled = False
+
+    def _deliver(self, sub):
+        while True:
+            with self._lock:
+                if not sub.pending or not sub.active:
+                    sub.scheduled = False
+                    return
+                entry = sub.pending.popleft()
+                self._space.notify_all()
+            try:
+                sub.callback(entry["message"])
+                sub.delivered += 1
+            except Exception as e:
+                print(f"MessageBus error: {e}")
+
+    # --- Replay ---
+    def _oldest_seq(self):
+        return max(0, self._next_seq - self.log_capacity)
+
+    def _entry(self, seq):
+        entry = self._ring[seq % self.log_capacity]
+        return entry if entry is not None and entry["seq"] == seq else None
+
+    def _seq_at_time(self, since_ts):
+        """First logged seq with ts >= since_ts (binary search over the ring). Caller holds _lock."""
+        lo, hi = self._oldest_seq(), self._next_seq
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._ring[mid % self.log_capacity]["ts"] < since_ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def replay(self, topic=None, since_seq=None, since_time=None, limit=None):
+        """
+        Iterate logged entries oldest-first, optionally filtered by topic/pattern,
+        starting at a sequence number or a time.time() timestamp.
+        """
+        with self._lock:
+            start = self._oldest_seq()
+            if since_seq is not None:
+                start = max(start, since_seq)
+            if since_time is not None:
+                start = max(start, self._seq_at_time(since_time))
+            if topic and not _is_pattern(topic):
+                seqs = [s for s in self._topic_index.get(topic, ()) if s >= start]
+            else:
+                seqs = range(start, self._next_seq)
+        count = 0
+        for seq in seqs:
+            with self._lock:
+                entry = self._entry(seq)
+            if entry is None or (topic and _is_pattern(topic) and not fnmatchcase(entry["topic"], topic)):
+                continue
+            yield entry
+            count += 1
+            if limit and count >= limit:
+                return
+
+    def page(self, topic=None, before_seq=None, limit=50):
+        """
+        Newest-first page of history: returns (entries, cursor). Pass cursor back as
+        before_seq for the next (older) page; cursor is None when history is exhausted.
+        """
+        entries = []
+        with self._lock:
+            oldest = self._oldest_seq()
+            end = self._next_seq if before_seq is None else min(before_seq, self._next_seq)
+            if topic and not _is_pattern(topic):
+                index = self._topic_index.get(topic, ())
+                for seq in reversed(index):
+                    if seq >= end:
+                        continue
+                    if seq < oldest or len(entries) >= limit:
+                        break
+                    entries.append(self._ring[seq % self.log_capacity])
+            else:
+                seq = end - 1
+                while seq >= oldest and len(entries) < limit:
+                    entry = self._ring[seq % self.log_capacity]
+                    if not topic or fnmatchcase(entry["topic"], topic):
+                        entries.append(entry)
+                    seq -= 1
+            more = len(entries) >= limit and entries[-1]["seq"] > oldest
+            cursor = entries[-1]["seq"] if more else None
+        return entries, cursor
+
+    @property
+    def next_seq(self):
+        """Sequence number the next published message will get"""
+        with self._lock:
+            return self._next_seq
+
+    @property
+    def message_log(self):
+        """Snapshot of the retained log (oldest first)"""
+        return list(self.replay())
+
+    def stats(self):
+        with self._lock:
+            subs = [s for subs in self._exact.values() for s in subs] + self._patterns
+            return {
+                "published": self._next_seq,
+                "retained": self._next_seq - self._oldest_seq(),
+                "capacity": self.log_capacity,
+                "subscribers": [s.stats() for s in subs]
+            }
+
+    def close(self):
+        """Stop dispatching; pending deliveries are dropped"""
+        with self._lock:
+            for sub in [s for subs in self._exact.values() for s in subs] + self._patterns:
+                sub.active = False
+            self._space.notify_all()
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,370 @@
+"""
+Metrics - In-process counters/gauges/histograms and lightweight tracing for the agent runtime
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Seconds; agent phases range from sub-millisecond routing to multi-minute model calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SPAN_HISTORY = 5000             # Finished spans kept for trace queries
+
+
+def _label_key(labelnames, labels):
+    missing = [n for n in labelnames if n not in labels]
+    if missing:
+        raise ValueError(f"Missing labels: {', '.join(missing)}")
+    return tuple(str(labels[n]) for n in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(n, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                    for n, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text="", labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        return _Bound(self, _label_key(self.labelnames, labels))
+
+
+class _Bound:
+    """A metric with its label values fixed"""
+
+    def __init__(self, metric, key):
+        self._metric = metric
+        self._key = key
+
+    def __getattr__(self, name):
+        method = getattr(self._metric, "_" + name)
+        return lambda *args, **kwargs: method(self._key, *args, **kwargs)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        self._inc(_label_key(self.labelnames, labels), amount)
+
+    def _inc(self, key, amount=1):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Set directly, or computed at scrape time by a collector fn() -> {label tuple: value}"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text="", labelnames=(), collector=None):
+        super().__init__(name, help_text, labelnames)
+        self.collector = collector
+
+    def set(self, value, **labels):
+        self._set(_label_key(self.labelnames, labels), value)
+
+    def _set(self, key, value):
+        with self._lock:
+            self._values[key] = value
+
+    def _inc(self, key, amount=1):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _dec(self, key, amount=1):
+        self._inc(key, -amount)
+
+    def samples(self):
+        values = {}
+        if self.collector is not None:
+            try:
+                values = {tuple(str(k) for k in (key if isinstance(key, tuple) else (key,))): v
+                          for key, v in self.collector().items()}
+            except Exception as e:
+                print(f"[Metrics] Collector for {self.name} failed: {e}")
+        with self._lock:
+            values = {**self._values, **values}
+        return [(self.name, key, (), value) for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text="", labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        self._observe(_label_key(self.labelnames, labels), value)
+
+    def _observe(self, key, value):
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += 1
+            state[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, count, total) in self._values.items():
+                for bound, n in zip(self.buckets, counts):
+                    out.append((self.name + "_bucket", key, (("le", repr(float(bound))),), n))
+                out.append((self.name + "_bucket", key, (("le", "+Inf"),), count))
+                out.append((self.name + "_count", key, (), count))
+                out.append((self.name + "_sum", key, (), total))
+        return out
+
+    def summary(self):
+        """{label tuple: {"count", "sum", "avg"}} for JSON export"""
+        with self._lock:
+            return {key: {"count": c, "sum": round(s, 6), "avg": round(s / c, 6) if c else 0.0}
+                    for key, (_, c, s) in self._values.items()}
+
+
+class MetricsRegistry:
+    """Named metrics, created on first use, exportable as Prometheus text or JSON"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, help_text, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text="", labelnames=()):
+        return self._get(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text="", labelnames=(), collector=None):
+        gauge = self._get(Gauge, name, help_text, labelnames)
+        if collector is not None:
+            gauge.collector = collector
+        return gauge
+
+    def histogram(self, name, help_text="", labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(metric.labelnames, key, extra)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        out = {}
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            if isinstance(metric, Histogram):
+                values = metric.summary()
+            else:
+                values = {key: value for _, key, _, value in metric.samples()}
+            out[metric.name] = {
+                "type": metric.kind,
+                "values": [dict(zip(metric.labelnames, key), **(v if isinstance(v, dict) else {"value": v}))
+                           for key, v in values.items()]
+            }
+        return out
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+
+# --- Tracing ---
+_CURRENT_SPAN = contextvars.ContextVar("current_span", default=None)
+
+
+def _new_id(nbytes=8):
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_id, attrs):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.attrs = dict(attrs)
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration = None
+        self.status = "ok"
+
+    def context(self):
+        """Propagation header carried on messages to other threads/agents"""
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+    def to_dict(self):
+        return {"name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+                "parent_id": self.parent_id, "start": self.start, "duration": self.duration,
+                "status": self.status, "attrs": self.attrs}
+
+
+class Tracer:
+    """
+    Minimal tracer: spans nest through a context variable within a thread and are
+    continued across threads by passing Span.context() along with the message.
+    Finished spans feed agent_phase_seconds{agent, phase} and a bounded history.
+    """
+
+    def __init__(self, registry, history=SPAN_HISTORY):
+        self._spans = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._phase = registry.histogram("agent_phase_seconds", "Time spent per agent and phase",
+                                         ("agent", "phase"))
+
+    def current(self):
+        return _CURRENT_SPAN.get()
+
+    def current_context(self):
+        span = _CURRENT_SPAN.get()
+        return span.context() if span else None
+
+    @contextmanager
+    def span(self, name, parent=None, **attrs):
+        """
+        Start a span under parent (a context dict) or the current span; a new trace
+        is started when there is neither. attrs "agent" and "phase" label the histogram.
+        """
+        current = _CURRENT_SPAN.get()
+        if parent:
+            trace_id, parent_id = parent.get("trace_id"), parent.get("span_id")
+        elif current is not None:
+            trace_id, parent_id = current.trace_id, current.span_id
+        else:
+            trace_id, parent_id = _new_id(16), None
+        if current is not None and "agent" not in attrs and "agent" in current.attrs:
+            attrs["agent"] = current.attrs["agent"]
+        span = Span(name, trace_id, parent_id, attrs)
+        token = _CURRENT_SPAN.set(span)
+        try:
+            yield span
+        except BaseException:
+            span.status = "error"
+            raise
+        finally:
+            _CURRENT_SPAN.reset(token)
+            self._finish(span)
+
+    def record(self, name, duration, parent=None, **attrs):
+        """Record an already-measured interval (e.g. queue wait) as a finished span"""
+        current = _CURRENT_SPAN.get()
+        context = parent or (current.context() if current else None) or {}
+        span = Span(name, context.get("trace_id") or _new_id(16), context.get("span_id"), attrs)
+        span.start -= duration
+        span.duration = duration
+        self._store(span)
+
+    def _finish(self, span):
+        span.duration = time.perf_counter() - span._t0
+        self._store(span)
+
+    def _store(self, span):
+        with self._lock:
+            self._spans.append(span)
+        self._phase.observe(span.duration, agent=span.attrs.get("agent", "orchestrator"),
+                            phase=span.attrs.get("phase", span.name))
+
+    def spans(self, trace_id=None, limit=500):
+        with self._lock:
+            spans = [s for s in self._spans if trace_id is None or s.trace_id == trace_id]
+        return [s.to_dict() for s in spans[-limit:]]
+
+    def traces(self, limit=20):
+        """Most recent traces: id, root name, span count, wall time"""
+        with self._lock:
+            spans = list(self._spans)
+        by_trace = {}
+        for s in spans:
+            info = by_trace.setdefault(s.trace_id, {"trace_id": s.trace_id, "spans": 0, "start": s.start,
+                                                    "end": s.start + (s.duration or 0), "root": None})
+            info["spans"] += 1
+            info["start"] = min(info["start"], s.start)
+            info["end"] = max(info["end"], s.start + (s.duration or 0))
+            if s.parent_id is None:
+                info["root"] = s.name
+        out = sorted(by_trace.values(), key=lambda t: t["end"], reverse=True)[:limit]
+        for t in out:
+            t["wall_seconds"] = round(t.pop("end") - t["start"], 6)
+        return out
+
+    def summarize(self, trace_id):
+        """Time per (agent, phase) within one trace, largest first"""
+        totals = {}
+        for s in self.spans(trace_id, limit=SPAN_HISTORY):
+            key = (s["attrs"].get("agent", "orchestrator"), s["attrs"].get("phase", s["name"]))
+            entry = totals.setdefault(key, {"agent": key[0], "phase": key[1], "count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += s["duration"] or 0.0
+        return sorted(totals.values(), key=lambda e: e["seconds"], reverse=True)
+
+
+_REGISTRY = None
+_TRACER = None
+_METRICS_LOCK = threading.Lock()
+
+
+def get_metrics():
+    """Process-wide metrics registry"""
+    global _REGISTRY
+    if _REGISTRY is None:
+        with _METRICS_LOCK:
+            if _REGISTRY is None:
+                _REGISTRY = MetricsRegistry()
+    return _REGISTRY
+
+
+def get_tracer():
+    """Process-wide tracer (records into get_metrics())"""
+    global _TRACER
+    if _TRACER is None:
+        registry = get_metrics()
+        with _METRICS_LOCK:
+            if _TRACER is None:
+                _TRACER = Tracer(registry)
+    return _TRACER
@@ -0,0 +1,44 @@
+"""
+Orchestrator Snapshot - Compact binary checkpoint of the agent group for instant restore on restart
+"""
+import json
+import os
+import zlib
+
+MAGIC = b"AOSNAP"
+VERSION = 1
+
+
+def dump_snapshot(path, state):
+    """Atomically write state (JSON-compatible; other values are stringified) as a compressed snapshot"""
+    payload = zlib.compress(json.dumps(state, separators=(",", ":"), default=str).encode("utf-8"), 6)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + bytes([VERSION]) + payload)
+    os.replace(tmp, path)
+    return len(payload) + len(MAGIC) + 1
+
+
+def load_snapshot(path):
+    """State dict from a snapshot file, or None if it is missing, foreign or corrupt"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(MAGIC) or len(data) <= len(MAGIC) or data[len(MAGIC)] != VERSION:
+        return None
+    try:
+        state = json.loads(zlib.decompress(data[len(MAGIC) + 1:]).decode("utf-8"))
+    except (zlib.error, ValueError) as e:
+        print(f"[Snapshot] Ignoring corrupt snapshot {path}: {e}")
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def discard_snapshot(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,353 @@
+"""
+Rate Limiter - Per provider/model request and token budgets for LLM calls
+"""
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Conservative defaults (requests/min, tokens/min); None means unlimited.
+# Learned limits from response headers replace these at runtime.
+DEFAULT_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 200000},
+    "anthropic": {"rpm": 50, "tpm": 40000},
+    "google": {"rpm": 60, "tpm": 1000000},
+    "huggingface": {"rpm": 120, "tpm": None},
+    "ollama": {"rpm": None, "tpm": None},
+}
+
+# Lower number = served first when several agents wait on the same budget
+ROLE_PRIORITY = {
+    "planner": 1,
+    "coder": 2,
+    "gui_coder": 2,
+    "fixer": 2,
+    "image_agent": 2,
+    "tester": 3,
+    "reviser": 3,
+}
+DEFAULT_PRIORITY = 5
+
+RETRYABLE_STATUS = (429, 503)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute / 60` per second"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.capacity / 60.0)
+            self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` can be taken (0 if available now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.capacity
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def sync(self, remaining=None, limit=None):
+        """Align with the server's view of the budget"""
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.tokens = min(self.capacity, float(remaining))
+            self.updated = time.monotonic()
+
+
+class _Budget:
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.blocked_until = 0.0
+        self.waiting = Counter()      # priority -> number of waiters
+        self.throttled = 0
+
+
+def _parse_reset(value):
+    """Parse reset hints: '1s', '6m0s', '250ms', seconds, HTTP date or RFC 3339"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    if value and value[-1] in "sm" and any(c.isdigit() for c in value):
+        total, num = 0.0, ""
+        i = 0
+        while i < len(value):
+            c = value[i]
+            if c.isdigit() or c == ".":
+                num += c
+            elif value.startswith("ms", i):
+                total += float(num or 0) / 1000.0
+                num = ""
+                i += 1
+            elif c in "hms":
+                total += float(num or 0) * {"h": 3600, "m": 60, "s": 1}[c]
+                num = ""
+            i += 1
+        return total
+    for parser in (parsedate_to_datetime, lambda v: datetime.fromisoformat(v.replace("Z", "+00:00"))):
+        try:
+            when = parser(value)
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=timezone.utc)
+            return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+        except Exception:
+            continue
+    return None
+
+
+class ProviderCall:
+    """
+    One scheduled provider request. Responses seen by any thread serving it (pool
+    threads of a Hugging Face route race included) are reported here, and a 429/503
+    sticks so a later success or failure of another route cannot hide it.
+    """
+    __slots__ = ("key", "status")
+
+    def __init__(self, provider, model):
+        self.key = (provider, str(model))
+        self.status = None
+
+    def report(self, status_code):
+        if self.status not in RETRYABLE_STATUS:
+            self.status = status_code
+
+
+class RateLimitScheduler:
+    """
+    Central admission control for provider calls.
+
+    acquire() blocks until the (provider, model) request and token budgets allow the
+    call, serving higher-priority waiters first. observe() feeds response headers
+    (Retry-After, x-ratelimit-*, anthropic-ratelimit-*) back into the budgets.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = {k: dict(v) for k, v in DEFAULT_LIMITS.items()}
+        self._budgets = {}
+        self._cond = threading.Condition()
+        self._context = threading.local()     # .call: the ProviderCall the current thread serves
+        self.max_retries = 4
+        self.base_backoff = 1.0
+        self.max_backoff = 30.0
+        if limits:
+            self.configure(limits)
+
+    def configure(self, limits=None, max_retries=None):
+        """limits: {"openai": {"rpm": .., "tpm": ..}, "openai/gpt-4o": {...}}"""
+        with self._cond:
+            for key, value in (limits or {}).items():
+                if isinstance(value, dict):
+                    self.limits[key] = dict(value)
+            if max_retries is not None:
+                self.max_retries = int(max_retries)
+            # Rebuild budgets lazily with the new limits
+            if limits:
+                self._budgets.clear()
+
+    def _budget(self, provider, model):
+        key = (provider, str(model))
+        budget = self._budgets.get(key)
+        if budget is None:
+            limits = self.limits.get(f"{provider}/{model}") or self.limits.get(provider) or {}
+            budget = _Budget(limits.get("rpm"), limits.get("tpm"))
+            self._budgets[key] = budget
+        return budget
+
+    @staticmethod
+    def priority_for(role=None, priority=None):
+        if priority is not None:
+            return int(priority)
+        return ROLE_PRIORITY.get((role or "").lower(), DEFAULT_PRIORITY)
+
+    def _reserve(self, budget, tokens, priority):
+        """Try to take the budget now; returns seconds to wait (0 = granted). Caller holds _cond."""
+        now = time.monotonic()
+        if any(p < priority and n > 0 for p, n in budget.waiting.items()):
+            return 0.25
+        waits = [budget.blocked_until - now]
+        if budget.requests:
+            waits.append(budget.requests.wait_time(1, now))
+        if budget.tokens and tokens:
+            waits.append(budget.tokens.wait_time(tokens, now))
+        wait = max(waits)
+        if wait <= 0:
+            if budget.requests:
+                budget.requests.take(1)
+            if budget.tokens and tokens:
+                budget.tokens.take(tokens)
+            return 0.0
+        return wait
+
+    def acquire(self, provider, model, tokens=0, priority=DEFAULT_PRIORITY, stop_event=None, timeout=None):
+        """Block until the call may proceed. Returns False on cancellation or timeout."""
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._cond:
+            budget = self._budget(provider, model)
+            budget.waiting[priority] += 1
+            try:
+                while True:
+                    wait = self._reserve(budget, tokens, priority)
+                    if wait <= 0:
+                        return True
+                    budget.throttled += 1
+                    if stop_event and stop_event.is_set():
+                        return False
+                    if deadline and time.monotonic() + wait > deadline:
+                        return False
+                    self._cond.wait(timeout=min(wait, 1.0))
+            finally:
+                budget.waiting[priority] -= 1
+                self._cond.notify_all()
+
+    async def aacquire(self, provider, model, tokens=0, priority=DEFAULT_PRIORITY, stop_event=None):
+        """Coroutine version of acquire for core.llm_async"""
+        import asyncio
+        with self._cond:
+            budget = self._budget(provider, model)
+            budget.waiting[priority] += 1
+        try:
+            while True:
+                with self._cond:
+                    wait = self._reserve(budget, tokens, priority)
+                    if wait > 0:
+                        budget.throttled += 1
+                if wait <= 0:
+                    return True
+                if stop_event and stop_event.is_set():
+                    return False
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            with self._cond:
+                budget.waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def observe(self, provider, model, status_code, headers):
+        """Update budgets from a provider response"""
+        headers = {str(k).lower(): v for k, v in (headers or {}).items()}
+        with self._cond:
+            budget = self._budget(provider, model)
+            if budget.requests:
+                budget.requests.sync(
+                    self._num(headers.get("x-ratelimit-remaining-requests") or headers.get("anthropic-ratelimit-requests-remaining")),
+                    self._num(headers.get("x-ratelimit-limit-requests") or headers.get("anthropic-ratelimit-requests-limit"))
+                )
+            if budget.tokens:
+                budget.tokens.sync(
+                    self._num(headers.get("x-ratelimit-remaining-tokens") or headers.get("anthropic-ratelimit-tokens-remaining")),
+                    self._num(headers.get("x-ratelimit-limit-tokens") or headers.get("anthropic-ratelimit-tokens-limit"))
+                )
+            if status_code in RETRYABLE_STATUS:
+                delay = _parse_reset(headers.get("retry-after"))
+                if delay is None:
+                    delay = _parse_reset(headers.get("x-ratelimit-reset-requests") or headers.get("anthropic-ratelimit-requests-reset"))
+                if delay is not None:
+                    budget.blocked_until = max(budget.blocked_until, time.monotonic() + delay)
+            self._cond.notify_all()
+
+    @staticmethod
+    def _num(value):
+        try:
+            return float(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def backoff_delay(self, attempt):
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    # --- Call context so the HTTP layer can report responses to the request they belong to ---
+    def begin_call(self, provider, model):
+        """Start a ProviderCall served by the current thread; pass it to end_call()"""
+        call = ProviderCall(provider, model)
+        self._context.call = call
+        return call
+
+    def end_call(self, call):
+        """Status that decides a retry: the first 429/503 of the call, else its last response"""
+        if getattr(self._context, "call", None) is call:
+            self._context.call = None
+        return call.status
+
+    def current_call(self):
+        return getattr(self._context, "call", None)
+
+    @contextmanager
+    def serving(self, call):
+        """Report responses made by this (helper) thread to an existing call"""
+        previous = getattr(self._context, "call", None)
+        self._context.call = call
+        try:
+            yield call
+        finally:
+            self._context.call = previous
+
+    def on_http_response(self, response):
+        """Response hook registered on the shared ProviderClient"""
+        call = getattr(self._context, "call", None)
+        if call is None:
+            return
+        call.report(response.status_code)
+        if response.status_code in RETRYABLE_STATUS or any(
+                h.lower().startswith(("x-ratelimit", "anthropic-ratelimit")) for h in response.headers.keys()):
+            self.observe(call.key[0], call.key[1], response.status_code, response.headers)
+
+    def headroom(self):
+        """Current remaining budget per (provider, model)"""
+        out = {}
+        with self._cond:
+            now = time.monotonic()
+            for (provider, model), budget in self._budgets.items():
+                entry = {"blocked_for": round(max(0.0, budget.blocked_until - now), 1), "throttled": budget.throttled,
+                         "waiting": sum(budget.waiting.values())}
+                if budget.requests:
+                    budget.requests._refill(now)
+                    entry["requests_remaining"] = int(budget.requests.tokens)
+                    entry["requests_per_minute"] = int(budget.requests.capacity)
+                if budget.tokens:
+                    budget.tokens._refill(now)
+                    entry["tokens_remaining"] = int(budget.tokens.tokens)
+                    entry["tokens_per_minute"] = int(budget.tokens.capacity)
+                out[f"{provider}/{model}"] = entry
+        return out
+
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler shared by call_llm and acall_llm"""
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        with _SCHEDULER_LOCK:
+            if _SCHEDULER is None:
+                _SCHEDULER = RateLimitScheduler()
+                from core.http_client import get_client
+                get_client().add_response_hook(_SCHEDULER.on_http_response)
+    return _SCHEDULER
+
+
+def configure_scheduler(settings):
+    """Apply rate_limits / rate_limit_max_retries from the IDE settings dict"""
+    scheduler = get_scheduler()
+    if settings:
+        scheduler.configure(settings.get("rate_limits"), settings.get("rate_limit_max_retries"))
+    return scheduler
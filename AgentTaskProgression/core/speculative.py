@@ -0,0 +1,109 @@
+"""
+Speculative Execution - Race one coding task across several agents; the first valid result wins
+"""
+import re
+import time
+
+from core.metrics import get_metrics
+
+DEFAULT_WIDTH = 3               # Agents raced per task
+DEFAULT_TIMEOUT = 300           # Seconds before the race is abandoned
+CODE_BLOCK = re.compile(r"```([\w+-]*)\n(.*?)```", re.S)
+
+
+def pick_agents(agents, roles, cost, width=DEFAULT_WIDTH):
+    """
+    Up to `width` agents whose role is in roles, cheapest first by cost(agent).
+    Distinct provider/model pairs come first: racing two copies of one model buys little.
+    """
+    roles = {r.lower() for r in roles}
+    ranked = sorted((a for a in agents if a.role.lower() in roles), key=cost)
+    picked, seen = [], set()
+    for agent in ranked:
+        key = (agent.model_provider, agent.model_name)
+        if key not in seen:
+            picked.append(agent)
+            seen.add(key)
+    picked += [a for a in ranked if a not in picked]
+    return picked[:max(1, int(width))]
+
+
+class CodeValidator:
+    """
+    accept() for core.llm_async.llm_first: turns a reply into file content and checks it.
+
+    With file_path the reply may be a unified diff or a full file (dry-run apply_patch
+    against original); otherwise the first fenced code block, or the whole reply, is
+    taken. Python must compile. test(content) -> (ok, error) runs last when given;
+    llm_first validates one reply at a time, so a test may use the real file.
+    """
+
+    def __init__(self, file_path=None, original="", test=None, language="python"):
+        self.file_path = file_path
+        self.original = original
+        self.test = test
+        self.language = language
+
+    def __call__(self, index, text):
+        from agents.chat_agent import apply_patch, verify_code_syntax
+        if self.file_path:
+            result = apply_patch(self.file_path, self.original, text, dry_run=True)
+            if not result.get("success"):
+                return False, f"Patch rejected: {result.get('error', '')}"
+            content, check_name = result["modified_content"], self.file_path
+        else:
+            match = CODE_BLOCK.search(text)
+            language = (match.group(1) if match else "") or self.language
+            content = (match.group(2) if match else text).strip() + "\n"
+            check_name = "candidate.py" if language in ("python", "py") else "candidate.txt"
+        ok, error = verify_code_syntax(content, check_name)
+        if not ok:
+            return False, error
+        if self.test is not None:
+            ok, error = self.test(content)
+            if not ok:
+                return False, f"Tests failed: {error}"
+        return True, content
+
+
+def file_test(file_path, original, run):
+    """
+    test() for CodeValidator: write the candidate into file_path, run() -> (ok, output),
+    and put the original back unless it passed (the winner stays on disk).
+    """
+    def _test(content):
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        try:
+            ok, output = run()
+        except Exception as e:
+            ok, output = False, str(e)
+        if not ok:
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(original)
+        return ok, output[-500:] if isinstance(output, str) else output
+    return _test
+
+
+def speculate(agents, prompt, system_prompt, validator, timeout=DEFAULT_TIMEOUT, stop_event=None):
+    """
+    Send prompt to every agent's model at once and keep the first reply validator accepts.
+
+    Returns {"agent", "content", "seconds", "rejected": {agent name: reason}}; "agent" is
+    None when no candidate passed. Losing requests are cancelled, not awaited.
+    """
+    from core.agent_runtime import get_agent_executor
+    from core.llm_async import run_llm_first
+    started = time.monotonic()
+    requests = [agent.build_model_request(prompt, system_prompt) for agent in agents]
+    with get_agent_executor().parked():    # A drain waiting on the race frees its work slot
+        index, content, rejected = run_llm_first(requests, validator, timeout=timeout, stop_event=stop_event)
+    winner = agents[index] if index is not None else None
+    get_metrics().counter("speculative_runs_total", "Speculative races by outcome", ("outcome",)).inc(
+        outcome="won" if winner else "failed")
+    return {
+        "agent": winner.name if winner else None,
+        "content": content,
+        "seconds": round(time.monotonic() - started, 3),
+        "rejected": {agents[i].name: str(reason)[:300] for i, reason in rejected.items()}
+    }
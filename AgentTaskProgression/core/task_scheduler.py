@@ -0,0 +1,420 @@
+"""
+Task Scheduler - Priority/deadline dispatch of queued tasks to agents, with dependencies and work-stealing
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_PRIORITY = 5            # Lower = more urgent (matches submit_task)
+LATENCY_PRIOR = 3.0             # Seconds assumed for a model without telemetry samples
+FINISHED_HISTORY = 500          # Finished tasks kept for lookups and dependency resolution
+
+PENDING = "pending"             # Waiting on dependencies
+READY = "ready"                 # Queued for an agent
+ASSIGNED = "assigned"           # Handed to an agent's mailbox, not started yet
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+EXPIRED = "expired"             # Deadline passed before an agent started it
+FINISHED = (DONE, FAILED, CANCELLED, EXPIRED)
+
+_task_ids = itertools.count(1)
+
+
+class Task:
+    """A unit of work for an agent role (or a specific agent)"""
+
+    def __init__(self, content, role=None, agent=None, priority=DEFAULT_PRIORITY, deadline=None,
+                 depends_on=(), task_type=None, allow_steal=True, sender="scheduler"):
+        self.id = f"task-{next(_task_ids)}"
+        self.content = content
+        self.role = role
+        self.agent = agent
+        self.priority = priority
+        self.deadline = deadline            # time.time() by which an agent must start it
+        self.depends_on = list(depends_on or ())
+        self.type = task_type or "task"
+        self.allow_steal = allow_steal
+        self.sender = sender
+        self.state = PENDING
+        self.result = None
+        self.error = None
+        self.assigned_to = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.dependents = []
+        self._waiting_on = 0
+        self._scheduler = None
+        self._done = threading.Event()
+
+    def done(self):
+        return self.state in FINISHED
+
+    def wait(self, timeout=None):
+        """Block until the task finishes; returns its result (None if it did not complete)"""
+        self._done.wait(timeout)
+        return self.result
+
+    def start(self, agent_name):
+        """Called by the agent before processing; False if the task was cancelled/expired meanwhile"""
+        return self._scheduler._on_start(self, agent_name) if self._scheduler else True
+
+    def complete(self, result=None, error=None):
+        """Called by the agent with process()'s return value or the exception text"""
+        if self._scheduler:
+            self._scheduler._on_complete(self, result, error)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "type": self.type,
+            "role": self.role,
+            "agent": self.assigned_to or self.agent,
+            "priority": self.priority,
+            "state": self.state,
+            "depends_on": list(self.depends_on),
+            "deadline": self.deadline,
+            "error": self.error,
+            "wait_s": (self.started - self.created) if self.started else None,
+            "run_s": (self.finished - self.started) if self.finished and self.started else None
+        }
+
+
+class TaskScheduler:
+    """
+    Dispatches submitted tasks to the orchestrator's agents.
+
+    Ready tasks wait in one heap ordered by (priority, deadline, submission order) and
+    are only bound to an agent when it has a free slot, so any idle agent of the right
+    role takes the next task (late binding doubles as work-stealing: a task pinned to a
+    busy agent is stolen by an idle peer with the same role unless allow_steal=False).
+    Among free candidates the one with the lowest expected latency (telemetry p50 of its
+    model, times its load) wins; agents whose model circuit is open are used last.
+    Tasks with depends_on wait until every dependency is done; a failed, cancelled or
+    expired dependency cancels its dependents.
+    """
+
+    def __init__(self, orchestrator):
+        self.orchestrator = orchestrator
+        self._tasks = {}                    # id -> unfinished Task
+        self._finished = OrderedDict()      # id -> finished Task (bounded)
+        self._ready = []                    # heap of (priority, deadline, seq, task)
+        self._seq = itertools.count()
+        self._inflight = {}                 # agent name -> tasks assigned or running
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        if hasattr(orchestrator, "add_status_listener"):
+            orchestrator.add_status_listener(self._on_agent_status)
+
+    # --- Submission ---
+    def submit(self, content, role=None, agent=None, priority=DEFAULT_PRIORITY, deadline=None, timeout=None,
+               depends_on=(), task_type=None, allow_steal=True, sender="scheduler"):
+        """
+        Queue a task. role is matched like find_agent_by_role; agent pins a specific agent.
+        deadline is an absolute time.time(), timeout a relative alternative (seconds).
+        """
+        if deadline is None and timeout:
+            deadline = time.time() + float(timeout)
+        task = Task(content, role, agent, priority, deadline, depends_on, task_type, allow_steal, sender)
+        with self._cond:
+            self._add_locked(task)
+            self._ensure_thread()
+            self._cond.notify()
+        return task
+
+    def submit_graph(self, specs):
+        """
+        Submit a DAG of tasks. Each spec is a dict with "id" (local name), "content",
+        optional "role"/"agent"/"priority"/"timeout"/"type"/"from" and "depends_on" (local names).
+        Returns {local id: Task}, or {} when the graph has unknown references or a cycle.
+        """
+        by_id = {}
+        for spec in specs:
+            if spec.get("id") is None or spec["id"] in by_id:
+                self._log(f"Task graph rejected: missing or duplicate id {spec.get('id')!r}")
+                return {}
+            by_id[spec["id"]] = spec
+        order, state = [], {}
+
+        def visit(node):
+            if state.get(node) == "done":
+                return True
+            if state.get(node) == "visiting":
+                return False
+            state[node] = "visiting"
+            for dep in by_id[node].get("depends_on") or ():
+                if dep not in by_id or not visit(dep):
+                    return False
+            state[node] = "done"
+            order.append(node)
+            return True
+
+        for node in by_id:
+            if not visit(node):
+                self._log(f"Task graph rejected: unknown dependency or cycle at '{node}'")
+                return {}
+
+        submitted = {}
+        for node in order:
+            spec = by_id[node]
+            submitted[node] = self.submit(
+                spec.get("content", ""), role=spec.get("role"), agent=spec.get("agent"),
+                priority=spec.get("priority", DEFAULT_PRIORITY), deadline=spec.get("deadline"),
+                timeout=spec.get("timeout"), task_type=spec.get("type"),
+                depends_on=[submitted[d].id for d in spec.get("depends_on") or ()],
+                allow_steal=spec.get("allow_steal", True), sender=spec.get("from", "scheduler")
+            )
+        return submitted
+
+    def cancel(self, task_id, reason="cancelled"):
+        """Cancel a task and its dependents; a task already running finishes but its result is dropped"""
+        with self._cond:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return False
+            self._finish_locked(task, CANCELLED, error=reason)
+            self._cond.notify()
+        return True
+
+    def get(self, task_id):
+        with self._cond:
+            return self._tasks.get(task_id) or self._finished.get(task_id)
+
+    # --- Bookkeeping (caller holds _cond) ---
+    def _add_locked(self, task):
+        task._scheduler = self
+        self._tasks[task.id] = task
+        for dep_id in task.depends_on:
+            dep = self._tasks.get(dep_id) or self._finished.get(dep_id)
+            if dep is None:
+                self._finish_locked(task, FAILED, error=f"unknown dependency {dep_id}")
+                return
+            if dep.state in (FAILED, CANCELLED, EXPIRED):
+                self._finish_locked(task, CANCELLED, error=f"dependency {dep_id} {dep.state}")
+                return
+            if dep.state != DONE:
+                dep.dependents.append(task)
+                task._waiting_on += 1
+        if task._waiting_on == 0:
+            self._make_ready_locked(task)
+
+    def _make_ready_locked(self, task):
+        task.state = READY
+        deadline = task.deadline if task.deadline is not None else float("inf")
+        heapq.heappush(self._ready, (task.priority, deadline, next(self._seq), task))
+
+    def _finish_locked(self, task, state, result=None, error=None):
+        if task.done():
+            return
+        if task.assigned_to and task.state in (ASSIGNED, RUNNING):
+            remaining = self._inflight.get(task.assigned_to, 1) - 1
+            if remaining > 0:
+                self._inflight[task.assigned_to] = remaining
+            else:
+                self._inflight.pop(task.assigned_to, None)
+        task.state = state
+        task.result = result
+        task.error = error
+        task.finished = time.time()
+        self._tasks.pop(task.id, None)
+        self._finished[task.id] = task
+        while len(self._finished) > FINISHED_HISTORY:
+            self._finished.popitem(last=False)
+        task._done.set()
+        from core.metrics import get_metrics
+        get_metrics().counter("scheduler_tasks_total", "Scheduled tasks by final state", ("state",)).inc(state=state)
+        if state != DONE:
+            self._log(f"Task {task.id} ({task.type}) {state}" + (f": {str(error)[:100]}" if error else ""))
+        for dependent in task.dependents:
+            if dependent.done():
+                continue
+            if state == DONE:
+                dependent._waiting_on -= 1
+                if dependent._waiting_on == 0:
+                    self._make_ready_locked(dependent)
+            else:
+                self._finish_locked(dependent, CANCELLED, error=f"dependency {task.id} {state}")
+        task.dependents = []
+
+    # --- Agent callbacks ---
+    def _on_start(self, task, agent_name):
+        with self._cond:
+            if task.done():
+                return False
+            task.state = RUNNING
+            task.started = time.time()
+            if task.deadline is not None and task.started > task.deadline:
+                self._finish_locked(task, EXPIRED, error="deadline passed before start")
+                self._cond.notify()
+                return False
+            return True
+
+    def _on_complete(self, task, result, error):
+        if error is None and isinstance(result, str) and result.startswith("Error"):
+            error = result
+        with self._cond:
+            self._finish_locked(task, FAILED if error else DONE, result=result, error=error)
+            self._cond.notify()
+
+    def _on_agent_status(self, agent):
+        if agent.status == "idle":
+            self.wake()
+
+    def wake(self):
+        """Re-run assignment now: an agent was registered or started and may take ready tasks"""
+        with self._cond:
+            self._cond.notify()
+
+    # --- Dispatch ---
+    def _ensure_thread(self):
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name="task-scheduler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                now = time.time()
+                self._expire_locked(now)
+                assignments = self._assign_locked()
+                if not assignments:
+                    self._cond.wait(self._next_deadline_locked(now))
+                    continue
+            for task, agent in assignments:
+                self._dispatch(task, agent)
+
+    def _expire_locked(self, now):
+        for task in list(self._tasks.values()):
+            if task.deadline is not None and task.deadline <= now and task.state in (PENDING, READY, ASSIGNED):
+                self._finish_locked(task, EXPIRED, error="deadline passed before start")
+
+    def _next_deadline_locked(self, now):
+        deadlines = [t.deadline for t in self._tasks.values()
+                     if t.deadline is not None and t.state in (PENDING, READY, ASSIGNED)]
+        return max(0.01, min(deadlines) - now) if deadlines else None
+
+    def _free_slots(self):
+        """agent -> free slots for every running agent"""
+        from core.agent_runtime import get_agent_executor
+        executor = get_agent_executor()
+        free = {}
+        for agent in list(self.orchestrator.agents.values()):
+            if not agent.is_running():
+                continue
+            load = max(agent.message_queue.qsize() + executor.busy(agent), self._inflight.get(agent.name, 0))
+            slots = max(1, getattr(agent, "max_concurrency", 1)) - load
+            if slots > 0:
+                free[agent] = slots
+        return free
+
+    def _assign_locked(self):
+        if not self._ready:
+            return []
+        free = self._free_slots()
+        assignments, skipped = [], []
+        while self._ready and free:
+            entry = heapq.heappop(self._ready)
+            task = entry[3]
+            if task.state != READY:
+                continue
+            agent = self._pick_agent(task, free)
+            if agent is None:
+                skipped.append(entry)
+                continue
+            free[agent] -= 1
+            if free[agent] <= 0:
+                del free[agent]
+            task.state = ASSIGNED
+            task.assigned_to = agent.name
+            self._inflight[agent.name] = self._inflight.get(agent.name, 0) + 1
+            assignments.append((task, agent))
+        for entry in skipped:
+            heapq.heappush(self._ready, entry)
+        return assignments
+
+    def _matches(self, task, agent):
+        if task.agent:
+            if agent.name == task.agent:
+                return True
+            pinned = self.orchestrator.agents.get(task.agent)
+            return bool(task.allow_steal and pinned and pinned.role.lower() == agent.role.lower())
+        if task.role:
+            return task.role.lower() in agent.role.lower()
+        return True
+
+    def _pick_agent(self, task, free):
+        candidates = [a for a in free if self._matches(task, a)]
+        if not candidates:
+            return None
+        for agent in candidates:
+            if agent.name == task.agent:
+                return agent
+        best = min(candidates, key=self.agent_cost)
+        if task.agent:
+            self._log(f"Task {task.id} stolen from busy agent {task.agent} by {best.name}")
+        return best
+
+    def agent_cost(self, agent):
+        """(circuit open, expected seconds to finish one more task) for ranking agents"""
+        healthy, latency = True, LATENCY_PRIOR
+        try:
+            from core.telemetry import get_telemetry, MIN_SAMPLES
+            telemetry = get_telemetry()
+            healthy = telemetry.is_healthy(agent.model_provider, agent.model_name)
+            summary = telemetry.stats(agent.model_provider, agent.model_name).get(
+                f"{agent.model_provider}/{agent.model_name}")
+            if summary and summary["samples"] >= MIN_SAMPLES:
+                latency = summary["p50"]
+        except Exception:
+            pass
+        load = agent.message_queue.qsize() + self._inflight.get(agent.name, 0)
+        return (not healthy, latency * (1 + load))
+
+    def _dispatch(self, task, agent):
+        content = task.content
+        results = [self.get(dep_id) for dep_id in task.depends_on]
+        results = [dep for dep in results if dep is not None and dep.result]
+        if results:
+            content += "\n\n--- Results from prerequisite tasks ---\n" + "\n\n".join(
+                f"[{dep.id} by {dep.assigned_to}]\n{dep.result}" for dep in results)
+        try:
+            self.orchestrator.route_message(task.sender, agent.name, content, task=task)
+        except Exception as e:
+            with self._cond:
+                self._finish_locked(task, FAILED, error=f"dispatch failed: {e}")
+
+    # --- Introspection ---
+    def stats(self):
+        with self._cond:
+            counts = {}
+            for task in list(self._tasks.values()) + list(self._finished.values()):
+                counts[task.state] = counts.get(task.state, 0) + 1
+            return {"states": counts, "ready": len(self._ready), "inflight": dict(self._inflight)}
+
+    def list_tasks(self, include_finished=False):
+        with self._cond:
+            tasks = list(self._tasks.values())
+            if include_finished:
+                tasks += list(self._finished.values())
+            return [t.to_dict() for t in tasks]
+
+    def close(self):
+        """Stop dispatching; unfinished tasks are cancelled"""
+        with self._cond:
+            self._closed = True
+            for task in list(self._tasks.values()):
+                self._finish_locked(task, CANCELLED, error="scheduler shut down")
+            self._cond.notify_all()
+
+    def _log(self, message):
+        try:
+            self.orchestrator.log(f"[Scheduler] {message}")
+        except Exception:
+            print(f"[Scheduler] {message}")
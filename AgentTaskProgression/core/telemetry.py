@@ -0,0 +1,280 @@
+"""
+Provider Telemetry - Per provider/model latency and health, circuit breaking and adaptive tier routing
+"""
+import threading
+import time
+from collections import deque
+
+WINDOW_SIZE = 200               # Calls kept per (provider, model) ring buffer
+BREAKER_FAILURES = 5            # Consecutive failures that open the circuit
+BREAKER_COOLDOWN = 30.0         # Seconds before an open circuit lets a probe through
+MIN_SAMPLES = 3                 # Calls needed before measured latency beats the static prior
+
+# Failure classes that say nothing about endpoint health
+NON_HEALTH_ERRORS = ("cancelled", "auth", "rate_limit")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def classify_error(response):
+    """Map a call_llm result string to an error class (None for success)"""
+    if not isinstance(response, str) or not response.startswith("Error"):
+        return None
+    text = response.lower()
+    if "cancelled" in text:
+        return "cancelled"
+    if "api key" in text or "token required" in text or "401" in text[:12] or "403" in text[:12]:
+        return "auth"
+    if "rate limit" in text or "429" in text[:12]:
+        return "rate_limit"
+    if "connect" in text or "timed out" in text or "timeout" in text:
+        return "network"
+    if text.startswith("error 5"):
+        return "server"
+    return "error"
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class _ModelHealth:
+    def __init__(self):
+        self.calls = deque(maxlen=WINDOW_SIZE)   # (ts, latency, ttfb, error_class, tokens)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+
+class ProviderTelemetry:
+    """
+    Rolling per-call metrics with a circuit breaker per (provider, model).
+
+    record() is fed by core.llm after every provider call. allow() implements the
+    breaker: CLOSED passes everything, OPEN rejects until the cooldown expires, then
+    HALF_OPEN lets a single probe through whose outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, breaker_failures=BREAKER_FAILURES, breaker_cooldown=BREAKER_COOLDOWN):
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self._health = {}
+        self._lock = threading.Lock()
+        self._ttfb = threading.local()
+        self._listeners = []
+
+    def _entry(self, provider, model):
+        key = (provider, str(model))
+        entry = self._health.get(key)
+        if entry is None:
+            entry = _ModelHealth()
+            self._health[key] = entry
+        return entry
+
+    def configure(self, breaker_failures=None, breaker_cooldown=None):
+        with self._lock:
+            if breaker_failures:
+                self.breaker_failures = int(breaker_failures)
+            if breaker_cooldown:
+                self.breaker_cooldown = float(breaker_cooldown)
+
+    # --- Recording ---
+    def on_http_response(self, response):
+        """ProviderClient response hook: time-to-first-byte of the last response on this thread"""
+        try:
+            self._ttfb.value = response.elapsed.total_seconds()
+        except Exception:
+            self._ttfb.value = None
+
+    def take_ttfb(self):
+        value = getattr(self._ttfb, "value", None)
+        self._ttfb.value = None
+        return value
+
+    def add_listener(self, listener):
+        """Register listener(provider, model) called after each recorded call (e.g. status bar refresh)"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def record(self, provider, model, latency, ttfb=None, error=None, tokens=0):
+        self._record(provider, model, latency, ttfb, error, tokens)
+        _export_metrics(provider, model, latency, error, tokens)
+        for listener in list(self._listeners):
+            try:
+                listener(provider, model)
+            except Exception:
+                pass
+
+    def _record(self, provider, model, latency, ttfb, error, tokens):
+        with self._lock:
+            entry = self._entry(provider, model)
+            if error == "cancelled":
+                # Says nothing about health; just release a half-open probe slot
+                entry.probe_in_flight = False
+                return
+            entry.calls.append((time.time(), latency, ttfb, error, tokens))
+            if error is None or error in NON_HEALTH_ERRORS:
+                entry.consecutive_failures = 0
+                if entry.state != CLOSED and error is None:
+                    print(f"[Telemetry] Circuit closed for {provider}/{model}")
+                    entry.state = CLOSED
+            else:
+                entry.consecutive_failures += 1
+                if entry.state == HALF_OPEN or entry.consecutive_failures >= self.breaker_failures:
+                    if entry.state != OPEN:
+                        print(f"[Telemetry] Circuit opened for {provider}/{model} after {entry.consecutive_failures} failures ({error})")
+                    entry.state = OPEN
+                    entry.opened_at = time.monotonic()
+            entry.probe_in_flight = False
+
+    # --- Circuit breaker ---
+    def _available(self, entry, now):
+        if entry.state == OPEN and now - entry.opened_at >= self.breaker_cooldown:
+            entry.state = HALF_OPEN
+        if entry.state == HALF_OPEN:
+            return not entry.probe_in_flight
+        return entry.state == CLOSED
+
+    def allow(self, provider, model):
+        """May a call go to (provider, model) now? Claims the probe slot when half-open."""
+        with self._lock:
+            entry = self._health.get((provider, str(model)))
+            if entry is None:
+                return True
+            allowed = self._available(entry, time.monotonic())
+            if allowed and entry.state == HALF_OPEN:
+                entry.probe_in_flight = True
+            return allowed
+
+    def is_healthy(self, provider, model):
+        """Like allow() but without claiming the half-open probe"""
+        with self._lock:
+            entry = self._health.get((provider, str(model)))
+            return entry is None or self._available(entry, time.monotonic())
+
+    # --- Stats ---
+    def _summary(self, entry):
+        latencies = sorted(c[1] for c in entry.calls if c[3] is None)
+        ttfbs = sorted(c[2] for c in entry.calls if c[3] is None and c[2] is not None)
+        total = len(entry.calls)
+        errors = sum(1 for c in entry.calls if c[3] is not None and c[3] not in NON_HEALTH_ERRORS)
+        error_classes = {}
+        for c in entry.calls:
+            if c[3] is not None:
+                error_classes[c[3]] = error_classes.get(c[3], 0) + 1
+        return {
+            "calls": total,
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "ttfb_p50": _percentile(ttfbs, 50),
+            "error_rate": (errors / total) if total else 0.0,
+            "errors": error_classes,
+            "tokens": sum(c[4] or 0 for c in entry.calls),
+            "state": entry.state,
+            "samples": len(latencies)
+        }
+
+    def stats(self, provider=None, model=None):
+        """{"provider/model": summary} (optionally filtered)"""
+        out = {}
+        with self._lock:
+            now = time.monotonic()
+            for (p, m), entry in self._health.items():
+                if (provider and p != provider) or (model and m != str(model)):
+                    continue
+                self._available(entry, now)
+                out[f"{p}/{m}"] = self._summary(entry)
+        return out
+
+    # --- Adaptive routing ---
+    def choose_model(self, api_provider, tier="small", task_type=None):
+        """
+        Fastest healthy MODEL_TIERS model for api_provider that satisfies tier/task_type.
+
+        A model qualifies when its capability score (task_type, default "coding") is at
+        least that of the requested tier. The tier's own model is kept unless another
+        candidate beats it on measured p50 latency (inflated by error rate); both need
+        MIN_SAMPLES, since a never-sampled model has no latency comparable to a real
+        one. Only when the tier's model is unavailable do unsampled candidates compete,
+        by their static "speed" score. Returns None when the provider has no tier table.
+        """
+        from core.llm import MODEL_TIERS
+        tiers = MODEL_TIERS.get(api_provider)
+        if not tiers:
+            return None
+        capability = task_type if task_type in ("coding", "reasoning") else "coding"
+        wanted = tiers.get(tier) if isinstance(tiers.get(tier), dict) else tiers.get(tiers.get("default", "small"))
+        floor = wanted.get(capability, 0) if isinstance(wanted, dict) else 0
+        candidates = [t for name, t in tiers.items()
+                      if isinstance(t, dict) and t.get(capability, 0) >= floor]
+        if not candidates:
+            return wanted.get("name") if isinstance(wanted, dict) else None
+
+        ranked = []         # (healthy, measured score or None, info)
+        with self._lock:
+            now = time.monotonic()
+            for info in candidates:
+                entry = self._health.get((api_provider, info["name"]))
+                healthy = entry is None or self._available(entry, now)
+                summary = self._summary(entry) if entry else None
+                score = None
+                if summary and summary["samples"] >= MIN_SAMPLES:
+                    score = summary["p50"] * (1.0 + 4.0 * summary["error_rate"])
+                ranked.append((healthy, score, info))
+
+        default = next((r for r in ranked if r[2] is wanted), None)
+        if default is not None and default[0]:
+            if default[1] is None:
+                return wanted["name"]
+            measured = [r for r in ranked if r[0] and r[1] is not None]
+            # Prefer the requested tier itself on ties
+            return min(measured, key=lambda r: (r[1], r[2] is not wanted))[2]["name"]
+        # Tier model unavailable: fail over to the fastest healthy candidate, measured first
+        healthy = [r for r in ranked if r[0]] or ranked
+        best = min(healthy, key=lambda r: (r[1] is None, r[1] or 0.0, -r[2].get("speed", 3)))
+        return best[2]["name"]
+
+def _export_metrics(provider, model, latency, error, tokens):
+    """Mirror one recorded call into the core.metrics registry"""
+    from core.metrics import get_metrics
+    metrics = get_metrics()
+    model = str(model)
+    metrics.counter("llm_calls_total", "Provider calls by outcome", ("provider", "model", "outcome")).inc(
+        provider=provider, model=model, outcome=error or "ok")
+    if error != "cancelled":
+        metrics.histogram("llm_request_seconds", "Provider round-trip latency", ("provider", "model")).observe(
+            latency, provider=provider, model=model)
+    if tokens:
+        metrics.counter("llm_tokens_total", "Prompt + completion tokens", ("provider", "model")).inc(
+            tokens, provider=provider, model=model)
+
+
+_TELEMETRY = None
+_TELEMETRY_LOCK = threading.Lock()
+
+
+def get_telemetry():
+    """Process-wide telemetry shared by call_llm, acall_llm and AIManager"""
+    global _TELEMETRY
+    if _TELEMETRY is None:
+        with _TELEMETRY_LOCK:
+            if _TELEMETRY is None:
+                _TELEMETRY = ProviderTelemetry()
+                from core.http_client import get_client
+                get_client().add_response_hook(_TELEMETRY.on_http_response)
+    return _TELEMETRY
+
+
+def configure_telemetry(settings):
+    """Apply circuit_breaker_* values from the IDE settings dict"""
+    telemetry = get_telemetry()
+    if settings:
+        telemetry.configure(
+            breaker_failures=settings.get("circuit_breaker_failures"),
+            breaker_cooldown=settings.get("circuit_breaker_cooldown")
+        )
+    return telemetry
@@ -0,0 +1,264 @@
+"""
+Token Budget - Token counting, model context windows and priority-based prompt assembly
+"""
+import math
+import re
+import threading
+
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except Exception:
+    HAS_TIKTOKEN = False
+
+# Context window (tokens) by model-id prefix; longest matching prefix wins
+CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "o1": 128000,
+    "claude-3": 200000,
+    "claude": 100000,
+    "gemini-1.5-pro": 2000000,
+    "gemini-1.5-flash": 1000000,
+    "gemini": 32768,
+    "deepseek": 64000,
+    "qwen/qwen2.5": 32768,
+    "llama3": 8192,
+    "codellama": 16384,
+}
+PROVIDER_CONTEXT_WINDOWS = {
+    "openai": 128000,
+    "anthropic": 200000,
+    "google": 1000000,
+    "huggingface": 8192,
+    "ollama": 8192,      # matches the num_ctx core.llm sends to Ollama
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Section priorities for PromptBudget (lower = kept first)
+PRIORITY_SYSTEM = 0
+PRIORITY_TASK = 1
+PRIORITY_CURRENT_FILE = 2
+PRIORITY_HISTORY = 3
+PRIORITY_RETRIEVED = 4
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_ENCODERS = {}
+_ENCODER_LOCK = threading.Lock()
+
+
+def _encoder(model=None):
+    """tiktoken encoding for model (cl100k_base fallback), or None without tiktoken"""
+    if not HAS_TIKTOKEN:
+        return None
+    key = str(model or "")
+    enc = _ENCODERS.get(key)
+    if enc is None:
+        with _ENCODER_LOCK:
+            enc = _ENCODERS.get(key)
+            if enc is None:
+                try:
+                    enc = tiktoken.encoding_for_model(key)
+                except Exception:
+                    enc = tiktoken.get_encoding("cl100k_base")
+                _ENCODERS[key] = enc
+    return enc
+
+
+def _approx_tokens(text):
+    """BPE-like estimate: ~4 chars per token for words, one token per punctuation mark"""
+    if not text:
+        return 0
+    total = 0
+    for piece in _WORD_RE.findall(text):
+        total += max(1, math.ceil(len(piece) / 4)) if piece[0].isalnum() or piece[0] == "_" else 1
+    return total
+
+
+def count_tokens(text, model=None):
+    """Token count for text (a string or a chat message list)"""
+    if text is None:
+        return 0
+    if isinstance(text, list):
+        # ~4 tokens of framing per chat message
+        return sum(count_tokens(m.get("content", "") if isinstance(m, dict) else str(m), model) + 4 for m in text)
+    if not isinstance(text, str):
+        text = str(text)
+    enc = _encoder(model)
+    if enc is not None:
+        try:
+            return len(enc.encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    return _approx_tokens(text)
+
+
+def truncate_to_tokens(text, max_tokens, model=None, keep="head"):
+    """Cut text to at most max_tokens. keep="head" keeps the start, "tail" keeps the end."""
+    if max_tokens <= 0 or not text:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    enc = _encoder(model)
+    if enc is not None:
+        try:
+            ids = enc.encode(text, disallowed_special=())
+            ids = ids[:max_tokens] if keep == "head" else ids[-max_tokens:]
+            return enc.decode(ids)
+        except Exception:
+            pass
+    # Approximate: binary search the character cut so the estimate fits
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        piece = text[:mid] if keep == "head" else text[-mid:]
+        if _approx_tokens(piece) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo] if keep == "head" else text[len(text) - lo:]
+
+
+def context_window(model, api_provider=None):
+    """Context size for a model: MODEL_TIERS entry, known prefix, then provider default"""
+    try:
+        from core.llm import MODEL_TIERS
+        for tier in MODEL_TIERS.get(api_provider, {}).values():
+            if isinstance(tier, dict) and tier.get("name") == model and tier.get("context"):
+                return int(tier["context"])
+    except Exception:
+        pass
+    name = str(model or "").lower()
+    best = None
+    for prefix in CONTEXT_WINDOWS:
+        if name.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    if best:
+        return CONTEXT_WINDOWS[best]
+    return PROVIDER_CONTEXT_WINDOWS.get(api_provider, DEFAULT_CONTEXT_WINDOW)
+
+
+class PromptBudget:
+    """
+    Assemble a prompt from prioritized sections so it fits the model's context window.
+
+    Sections are granted tokens in priority order (system, task, current file, history,
+    retrieved context); a section that does not fit is trimmed to what is left, or
+    dropped once less than `min_tokens` remain. The output keeps insertion order.
+    """
+
+    def __init__(self, model=None, api_provider=None, reserve_output=512, window=None, safety_margin=0.05):
+        self.model = model
+        self.window = int(window or context_window(model, api_provider))
+        self.reserve_output = int(reserve_output or 0)
+        self.safety = int(self.window * safety_margin)
+        self._sections = []
+
+    @property
+    def available(self):
+        return max(0, self.window - self.reserve_output - self.safety)
+
+    def add(self, name, text, priority=PRIORITY_RETRIEVED, keep="head", min_tokens=16):
+        """Add a section; keep="tail" trims from the front (e.g. chat history)"""
+        if text:
+            self._sections.append({"name": name, "text": text, "priority": priority,
+                                   "keep": keep, "min_tokens": min_tokens})
+        return self
+
+    def add_messages(self, name, lines, priority=PRIORITY_HISTORY, separator="\n"):
+        """Add history lines, dropping the oldest whole lines first when trimmed"""
+        lines = [l for l in lines if l]
+        if lines:
+            self._sections.append({"name": name, "lines": lines, "separator": separator,
+                                   "priority": priority, "keep": "tail", "min_tokens": 0})
+        return self
+
+    def _fit_lines(self, section, budget):
+        kept, used = [], 0
+        sep_cost = count_tokens(section["separator"], self.model)
+        for line in reversed(section["lines"]):
+            cost = count_tokens(line, self.model) + sep_cost
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+        return section["separator"].join(reversed(kept)), used
+
+    def fit(self):
+        """Return {section name: fitted text} and a report of what was trimmed"""
+        remaining = self.available
+        fitted, report = {}, {}
+        for section in sorted(self._sections, key=lambda s: s["priority"]):
+            name = section["name"]
+            if "lines" in section:
+                text, used = self._fit_lines(section, remaining)
+                original = len(section["lines"])
+                kept = len(text.split(section["separator"])) if text else 0
+                report[name] = {"tokens": used, "dropped_lines": original - kept}
+            else:
+                text = section["text"]
+                used = count_tokens(text, self.model)
+                if used > remaining:
+                    if remaining < section["min_tokens"]:
+                        text, used = "", 0
+                    else:
+                        text = truncate_to_tokens(text, remaining, self.model, keep=section["keep"])
+                        used = count_tokens(text, self.model)
+                    report[name] = {"tokens": used, "trimmed": True}
+                else:
+                    report[name] = {"tokens": used}
+            fitted[name] = text
+            remaining = max(0, remaining - used)
+        return fitted, report
+
+    def build(self, template=None, separator="\n\n"):
+        """Join fitted sections in insertion order, or format them into template"""
+        fitted, _ = self.fit()
+        if template is not None:
+            return template.format(**fitted)
+        return separator.join(fitted[s["name"]] for s in self._sections if fitted.get(s["name"]))
+
+
+# --- Usage reporting ---
+_USAGE = threading.local()
+_USAGE_SINKS = []
+
+
+def note_provider_usage(data):
+    """Remember token usage from a provider JSON body (called by the response parsers)"""
+    if not isinstance(data, dict):
+        return
+    usage = data.get("usage") or data.get("usageMetadata") or {}
+    prompt = usage.get("prompt_tokens", usage.get("input_tokens", usage.get("promptTokenCount")))
+    completion = usage.get("completion_tokens", usage.get("output_tokens", usage.get("candidatesTokenCount")))
+    if prompt is None and "prompt_eval_count" in data:      # Ollama
+        prompt, completion = data.get("prompt_eval_count"), data.get("eval_count")
+    if prompt is not None or completion is not None:
+        _USAGE.reported = (int(prompt or 0), int(completion or 0))
+
+
+def take_provider_usage():
+    """Pop the usage noted on this thread since the last call, or None"""
+    reported = getattr(_USAGE, "reported", None)
+    _USAGE.reported = None
+    return reported
+
+
+def add_usage_sink(sink):
+    """Register sink(provider, model, prompt_tokens, completion_tokens), e.g. AIManager"""
+    if sink not in _USAGE_SINKS:
+        _USAGE_SINKS.append(sink)
+
+
+def report_usage(api_provider, model, prompt, response, reported=None):
+    """Send real (provider-reported) or counted token usage for one call to the sinks"""
+    if reported is None:
+        reported = (count_tokens(prompt, model), count_tokens(response, model))
+    for sink in list(_USAGE_SINKS):
+        try:
+            sink(api_provider, model, reported[0], reported[1])
+        except Exception:
+            pass
+    return reported
@@ -0,0 +1,243 @@
+"""
+WebSocket Broadcast - Snapshot-then-delta status stream owned by the websocket server loop
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+DEFAULT_HZ = 4.0                # Delta flushes per second
+CLIENT_BACKLOG = 32             # Deltas queued for one client before it is resynced with a snapshot
+MAX_LOG_LINES = 200             # Log lines carried per flush (older ones are counted as dropped)
+
+
+class _Client:
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.backlog = deque()
+        self.wakeup = asyncio.Event()
+        self.resync = True          # First message is always a snapshot
+        self.resyncs = 0
+
+
+class StatusBroadcaster:
+    """
+    Versioned status stream for dashboards on the orchestrator websocket.
+
+    Agent threads only mark what changed (mark_agent, add_log, request_snapshot); that
+    costs a set insert and, at most once per flush, a call_soon_threadsafe wake-up. The
+    server loop thread owns everything else: at most `hz` times a second it describes
+    the dirty agents, serializes one delta and appends it to every client's backlog.
+    A client whose backlog overflows (slow consumer) has it dropped and receives a
+    fresh snapshot instead. Nothing is recorded while no client is connected.
+    """
+
+    def __init__(self, snapshot_fn, agent_fn, command_fn=None, host="127.0.0.1", port=8765, hz=DEFAULT_HZ):
+        self.snapshot_fn = snapshot_fn      # () -> dict, full state
+        self.agent_fn = agent_fn            # (name) -> dict, or None once the agent is gone
+        self.command_fn = command_fn        # (raw text) -> reply text or None
+        self.host = host
+        self.port = port
+        self.min_interval = 1.0 / max(0.1, float(hz or DEFAULT_HZ))
+        self.version = 0
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._logs = deque(maxlen=MAX_LOG_LINES)
+        self._logs_dropped = 0
+        self._snapshot_requested = False
+        self._wake_pending = False
+        self._has_clients = False
+        self._clients = set()
+        self._loop = None
+        self._wake = None
+        self._server = None
+        self._thread = None
+        self._snapshot_cache = (None, None)
+
+    def configure(self, hz=None):
+        if hz:
+            self.min_interval = 1.0 / max(0.1, float(hz))
+
+    # --- Producers (any thread) ---
+    def mark_agent(self, name):
+        with self._lock:
+            if self._has_clients:
+                self._dirty.add(name)
+                self._kick()
+
+    def add_log(self, line):
+        with self._lock:
+            if self._has_clients:
+                if len(self._logs) == self._logs.maxlen:
+                    self._logs_dropped += 1
+                self._logs.append(line)
+                self._kick()
+
+    def request_snapshot(self):
+        """Send every client a full snapshot on the next flush (e.g. agent group loaded)"""
+        with self._lock:
+            if self._has_clients:
+                self._snapshot_requested = True
+                self._kick()
+
+    def _kick(self):
+        """Wake the flush loop once per flush. Caller holds _lock."""
+        if self._wake_pending or self._loop is None:
+            return
+        self._wake_pending = True
+        try:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            self._wake_pending = False  # Loop closed
+
+    # --- Server loop ---
+    def start(self):
+        """Start the server thread; False when the websockets package is missing"""
+        try:
+            import websockets  # noqa: F401
+        except ImportError:
+            return False
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ws-broadcast", daemon=True)
+            self._thread.start()
+        return True
+
+    def _run(self):
+        try:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self._serve(loop))
+        except Exception as e:
+            print(f"[WebSocket] Server stopped: {e}")
+
+    async def _serve(self, loop):
+        import websockets
+        self._wake = asyncio.Event()
+        self._loop = loop
+        flusher = asyncio.ensure_future(self._flush_loop())
+        try:
+            self._server = await websockets.serve(self._handler, self.host, self.port)
+            await self._server.wait_closed()
+        finally:
+            flusher.cancel()
+
+    async def _handler(self, websocket, path=None):
+        client = _Client(websocket)
+        client.wakeup.set()
+        self._clients.add(client)
+        with self._lock:
+            self._has_clients = True
+        sender = asyncio.ensure_future(self._client_sender(client))
+        try:
+            async for raw in websocket:
+                reply = self.command_fn(raw) if self.command_fn else None
+                if reply is not None:
+                    await websocket.send(reply)
+        except Exception:
+            pass
+        finally:
+            sender.cancel()
+            self._clients.discard(client)
+            with self._lock:
+                self._has_clients = bool(self._clients)
+                if not self._has_clients:
+                    self._dirty.clear()
+                    self._logs.clear()
+                    # Changes while nobody listens do not move the version; never serve this snapshot again
+                    self._snapshot_cache = (None, None)
+
+    async def _client_sender(self, client):
+        try:
+            while True:
+                await client.wakeup.wait()
+                client.wakeup.clear()
+                if client.resync:
+                    client.resync = False
+                    client.backlog.clear()
+                    await client.websocket.send(self._snapshot_text())
+                while client.backlog and not client.resync:
+                    await client.websocket.send(client.backlog.popleft())
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            pass
+
+    def _snapshot_text(self):
+        """Snapshot for the current version, serialized once however many clients resync"""
+        version, text = self._snapshot_cache
+        if version != self.version or text is None:
+            snapshot = dict(self.snapshot_fn(), type="snapshot", version=self.version)
+            text = json.dumps(snapshot)
+            self._snapshot_cache = (self.version, text)
+        return text
+
+    async def _flush_loop(self):
+        last = 0.0
+        while True:
+            await self._wake.wait()
+            delay = last + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)   # Rate limit: changes keep coalescing meanwhile
+            with self._lock:
+                self._wake.clear()
+                self._wake_pending = False
+                dirty, self._dirty = self._dirty, set()
+                logs, dropped = list(self._logs), self._logs_dropped
+                self._logs.clear()
+                self._logs_dropped = 0
+                resync_all, self._snapshot_requested = self._snapshot_requested, False
+            last = time.monotonic()
+            try:
+                self._flush(dirty, logs, dropped, resync_all)
+            except Exception as e:
+                print(f"[WebSocket] Broadcast error: {e}")
+
+    def _flush(self, dirty, logs, dropped, resync_all):
+        self.version += 1
+        if resync_all:
+            for client in self._clients:
+                client.resync = True
+                client.wakeup.set()
+            return
+        agents, removed = {}, []
+        for name in sorted(dirty):
+            state = self.agent_fn(name)
+            if state is None:
+                removed.append(name)
+            else:
+                agents[name] = state
+        delta = {"type": "delta", "version": self.version, "base": self.version - 1}
+        if agents:
+            delta["agents"] = agents
+        if removed:
+            delta["removed"] = removed
+        if logs:
+            delta["logs"] = logs
+        if dropped:
+            delta["logs_dropped"] = dropped
+        text = json.dumps(delta)
+        for client in self._clients:
+            if client.resync:
+                continue    # The pending snapshot already covers this change
+            if len(client.backlog) >= CLIENT_BACKLOG:
+                client.backlog.clear()
+                client.resync = True
+                client.resyncs += 1
+            else:
+                client.backlog.append(text)
+            client.wakeup.set()
+
+    def stats(self):
+        return {"clients": len(self._clients), "version": self.version,
+                "interval": self.min_interval,
+                "backlogs": [len(c.backlog) for c in list(self._clients)],
+                "resyncs": sum(c.resyncs for c in list(self._clients))}
+
+    def close(self):
+        loop, server = self._loop, self._server
+        if loop is not None and server is not None:
+            try:
+                loop.call_soon_threadsafe(server.close)
+            except RuntimeError:
+                pass
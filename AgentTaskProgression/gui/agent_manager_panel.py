@@ -147,9 +147,12 @@ class AgentManagerPanel(ttk.Frame):
             last_group = self.app.settings.get("last_agent_group", None)
             loaded = False
             if last_group:
-                self.append_log(f"[System] Loading last used group: {last_group}")
-                if self.orchestrator.load_config(last_group):
+                if self.orchestrator.restore_snapshot(last_group):
+                    self.append_log(f"[System] Restored last session of group: {last_group}")
                     loaded = True
+                else:
+                    self.append_log(f"[System] Loading last used group: {last_group}")
+                    loaded = self.orchestrator.load_config(last_group)
             
             # If no group loaded, load or create default
             if not loaded:
@@ -309,6 +312,8 @@ class AgentManagerPanel(ttk.Frame):
             self.app.settings["last_agent_group"] = name
             if hasattr(self.app, 'save_settings'):
                 self.app.save_settings(self.app.settings)
+            if hasattr(self.app, 'request_status_refresh'):
+                self.app.request_status_refresh()
             
             self.refresh_presets()
             messagebox.showinfo("Saved", f"Agent group '{name}' saved successfully.")
@@ -343,6 +348,8 @@ class AgentManagerPanel(ttk.Frame):
                 self.app.settings["last_agent_group"] = group_name
                 if hasattr(self.app, 'save_settings'):
                     self.app.save_settings(self.app.settings)
+                if hasattr(self.app, 'request_status_refresh'):
+                    self.app.request_status_refresh()
                 dialog.destroy()
                 
         ttk.Button(dialog, text="Load", command=do_load).pack(pady=10)
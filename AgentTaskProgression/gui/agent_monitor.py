@@ -34,6 +34,8 @@ class AgentMonitor(tk.Toplevel):
         """Cleanup when window is closed"""
         if hasattr(self.orchestrator, 'agent_monitor'):
             self.orchestrator.agent_monitor = None
+        if hasattr(self.orchestrator, 'remove_status_listener'):
+            self.orchestrator.remove_status_listener(self._on_agent_status)
         self.destroy()
         
     def setup_ui(self):
@@ -75,9 +77,38 @@ class AgentMonitor(tk.Toplevel):
         log_frame = ttk.LabelFrame(self.summary_frame, text="All Agent Communications")
         log_frame.pack(fill="both", expand=True, padx=5, pady=5)
         
+        # Page back through the message bus history (newest page first). Messages from
+        # now on are rendered live, so paging starts just before them.
+        bus = getattr(self.orchestrator, 'message_bus', None)
+        self._history_cursor = bus.next_seq if hasattr(bus, 'next_seq') else None
+        self.older_btn = ttk.Button(log_frame, text="⬆ Older messages", command=self.load_older_messages)
+        self.older_btn.pack(anchor="w", padx=2, pady=(2, 0))
+        if not self._history_cursor:
+            self.older_btn.configure(state="disabled")
+        
         self.all_logs_text = tk.Text(log_frame, height=10, wrap="word", state="disabled")
         self.all_logs_text.pack(fill="both", expand=True, padx=2, pady=2)
         
+    def load_older_messages(self, page_size=50):
+        """Prepend the next older page of inter-agent messages from the bus replay log"""
+        bus = getattr(self.orchestrator, 'message_bus', None)
+        if bus is None or not hasattr(bus, 'page') or not self._history_cursor:
+            return
+        entries, self._history_cursor = bus.page(before_seq=self._history_cursor, limit=page_size)
+        self.all_logs_text.configure(state="normal")
+        # entries are newest-first, so inserting each at the top leaves them oldest-first
+        for entry in entries:
+            msg = entry["message"]
+            stamp = entry["timestamp"][11:19]
+            if isinstance(msg, dict):
+                line = f"[{stamp}] {msg.get('from', '?')} -> {msg.get('to', entry['topic'])}: {str(msg.get('content', ''))[:200]}\n"
+            else:
+                line = f"[{stamp}] [{entry['topic']}] {str(msg)[:200]}\n"
+            self.all_logs_text.insert("1.0", line)
+        self.all_logs_text.configure(state="disabled")
+        if self._history_cursor is None:
+            self.older_btn.configure(state="disabled")
+        
     def refresh_agent_tabs(self):
         """Refresh tabs for all agents"""
         if not self.orchestrator:
@@ -232,13 +263,39 @@ class AgentMonitor(tk.Toplevel):
         self.all_logs_text.configure(state="disabled")
         
     def start_refresh(self):
-        """Start auto-refresh with safety check"""
-        def refresh():
-            if self.winfo_exists():
-                self.refresh_all()
-                self.after(2000, refresh)
-        
-        self.after(2000, refresh)
+        """Refresh when agents change status instead of on a fixed timer"""
+        self._refresh_pending = False
+        self._tick_id = None
+        if hasattr(self.orchestrator, 'add_status_listener'):
+            self.orchestrator.add_status_listener(self._on_agent_status)
+        self.after(0, self._refresh_now)
+
+    def _on_agent_status(self, agent):
+        """Status listener (runs on an agent worker thread): coalesce into one UI refresh"""
+        if self._refresh_pending:
+            return
+        self._refresh_pending = True
+        try:
+            self.after(50, self._refresh_now)
+        except Exception:
+            self._refresh_pending = False
+
+    def _refresh_now(self):
+        self._refresh_pending = False
+        if not self.winfo_exists():
+            return
+        self.refresh_all()
+        # Only tick the "Time Running" column while some agent is actually working
+        if self._tick_id is not None:
+            self.after_cancel(self._tick_id)
+            self._tick_id = None
+        if self.orchestrator and any(a.status == "working" for a in self.orchestrator.agents.values()):
+            interval = 2000
+            try:
+                interval = int(self.orchestrator.app.settings.get("agent_monitor_refresh_ms", 2000))
+            except Exception:
+                pass
+            self._tick_id = self.after(max(250, interval), self._refresh_now)
 
 
 
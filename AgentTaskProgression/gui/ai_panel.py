@@ -366,6 +366,8 @@ class AIPanel(ttk.Frame):
             if success:
                 self.app.settings["last_agent_group"] = group_name
                 self.app.save_settings(self.app.settings)
+                if hasattr(self.app, 'request_status_refresh'):
+                    self.app.request_status_refresh()
                 
                 # List models and roles in chat
                 groups = self.app.settings.get("agent_groups", {})
@@ -982,6 +984,8 @@ User Prompt:
             self.app.log_ai(f"Plan submitted to agents.")
             self.current_mode.set("chat")
             self.switch_mode()
+            if hasattr(self.app, 'request_status_refresh'):
+                self.app.request_status_refresh()
     
     def find_best_agent(self, mode):
         """Find the best active agent for the given mode"""
@@ -1328,6 +1332,52 @@ User Prompt:
         self.chat_history.config(state='disabled')
         self.chat_history.see("end")
 
+    def begin_stream_message(self, sender):
+        """Open an AI bubble that stream_chunk() appends to. Call from the main thread."""
+        self._stream_buffer = []
+        self._stream_flush_id = None
+        self._stream_lock = getattr(self, "_stream_lock", None) or threading.Lock()
+        self.chat_history.config(state='normal')
+        self.chat_history.insert("end", f"\n🤖 {sender}\n", ("header", "ai_msg"))
+        self.chat_history.mark_set("stream_end", "end-1c")
+        self.chat_history.mark_gravity("stream_end", "right")
+        self.chat_history.config(state='disabled')
+        self.chat_history.see("end")
+
+    def stream_chunk(self, text):
+        """Queue a streamed delta. Thread-safe; flushed to the widget in batches via after()."""
+        if not hasattr(self, "_stream_lock"):
+            return
+        with self._stream_lock:
+            self._stream_buffer.append(text)
+            if self._stream_flush_id is not None:
+                return
+            self._stream_flush_id = "pending"
+        self.after(self.app.settings.get("stream_flush_ms", 40), self._flush_stream)
+
+    def _flush_stream(self):
+        with self._stream_lock:
+            text = "".join(self._stream_buffer)
+            self._stream_buffer = []
+            self._stream_flush_id = None
+        if not text:
+            return
+        self.chat_history.config(state='normal')
+        self.chat_history.insert("stream_end", text, "ai_msg")
+        self.chat_history.config(state='disabled')
+        self.chat_history.see("end")
+
+    def end_stream_message(self):
+        """Flush any buffered deltas and close the streaming bubble"""
+        if not hasattr(self, "_stream_lock"):
+            return
+        self._flush_stream()
+        self.chat_history.config(state='normal')
+        self.chat_history.insert("stream_end", "\n", "ai_msg")
+        self.chat_history.mark_unset("stream_end")
+        self.chat_history.config(state='disabled')
+        self.chat_history.see("end")
+
     def toggle_task_list(self):
         """Toggle visibility of the task list"""
         if self.task_list_frame.winfo_ismapped():
@@ -1968,8 +2018,7 @@ User Prompt:
         content = ""
         try:
             if hasattr(self.app, "editor_tabs") and self.app.editor_tabs and self.app.editor_tabs.current_file in self.app.editor_tabs.open_files:
-                tw = self.app.editor_tabs.open_files[self.app.editor_tabs.current_file][0]
-                content = tw.get("1.0", "end-1c")
+                content = self.app.editor_tabs.get_file_content(self.app.editor_tabs.current_file)
         except Exception:
             content = ""
         import re
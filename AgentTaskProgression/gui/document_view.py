@@ -0,0 +1,150 @@
+"""
+Document View - Shows a core.document.Document in a tk.Text, materializing only a window of lines for large files
+"""
+from core.document import Document
+
+VIRTUAL_LINES = 20000           # Documents with more lines (or chars) are shown through a window
+VIRTUAL_CHARS = 4000000
+WINDOW_LINES = 3000             # Lines materialized in the widget for such documents
+EDGE_LINES = 300                # Re-window when the viewport comes this close to a window edge
+
+
+class DocumentView:
+    """
+    The editor widget as a view of a Document.
+
+    Small documents are materialized whole. Large ones only as WINDOW_LINES lines
+    around the viewport: the scrollbar is driven in document coordinates, and the
+    window is moved (after flushing edits back) when scrolling nears its edges or the
+    scrollbar is dragged elsewhere. Typing only touches the widget; flush() copies the
+    window back into the document when the widget reports it modified. set_content()
+    applies a new text as line-level edits, so an AI patch touches only changed lines
+    (and stays undoable) instead of replacing the buffer.
+    """
+
+    def __init__(self, widget, scrollbar=None):
+        self.widget = widget
+        self.scrollbar = scrollbar
+        self.document = Document()
+        self.first = 0                  # Document line (0-based) shown on widget line 1
+        self.count = 1                  # Document lines materialized at the last load/flush
+        self.virtual = False
+        self._recenter_job = None
+
+    # --- Loading and syncing ---
+    def load(self, document):
+        self.document = document
+        self.virtual = document.line_count() > VIRTUAL_LINES or len(document) > VIRTUAL_CHARS
+        self._materialize(0)
+
+    def _materialize(self, first):
+        total = self.document.line_count()
+        count = min(total, WINDOW_LINES) if self.virtual else total
+        first = max(0, min(first, total - count))
+        self.widget.delete("1.0", "end")
+        self.widget.insert("1.0", self.document.get_lines(first, count))
+        self.widget.edit_modified(False)
+        self.widget.edit_reset()
+        self.first, self.count = first, count
+
+    def flush(self):
+        """Copy edits made in the widget back into the document"""
+        if not self.widget.edit_modified():
+            return
+        lines = self.widget.get("1.0", "end-1c").split("\n")
+        self.document.replace_lines(self.first, self.count, lines)
+        self.count = len(lines)
+        self.widget.edit_modified(False)
+
+    def content(self):
+        self.flush()
+        return self.document.text()
+
+    def set_content(self, new_text):
+        """Change the document to new_text, editing only the widget lines that differ"""
+        self.flush()
+        total = self.document.line_count()
+        window_end = self.first + self.count
+        rewindow = False
+        for first, count, lines in self.document.diff(new_text):     # Last edit first
+            self.document.replace_lines(first, count, lines)
+            delta = len(lines) - count
+            if first + count <= self.first and (count or first < self.first):
+                self.first += delta                 # Entirely above the window
+                window_end += delta
+            elif first > window_end or (first == window_end and window_end < total):
+                pass                                # Entirely below the window
+            elif first >= self.first and first + count <= window_end:
+                self._edit_widget(first - self.first + 1, count, lines)
+                self.count += delta
+                window_end += delta
+            else:
+                rewindow = True
+            total += delta
+        if rewindow:
+            self._materialize(self.first)
+        self.widget.edit_modified(False)
+
+    def _edit_widget(self, line, count, lines):
+        """Document.replace_lines on the widget (1-based widget line)"""
+        w = self.widget
+        last = int(w.index("end-1c").split(".")[0])
+        if line + count <= last:
+            w.delete(f"{line}.0", f"{line + count}.0")
+            w.insert(f"{line}.0", "".join(text + "\n" for text in lines))
+        elif line > 1:
+            w.delete(f"{line - 1}.end", "end-1c")
+            w.insert("end-1c", "".join("\n" + text for text in lines))
+        else:
+            w.delete("1.0", "end-1c")
+            w.insert("1.0", "\n".join(lines))
+
+    # --- Scrolling ---
+    def _widget_lines(self):
+        return int(self.widget.index("end-1c").split(".")[0])
+
+    def on_yview(self, lo, hi):
+        """yscrollcommand of the widget: reports document-wide fractions to the scrollbar"""
+        lo, hi = float(lo), float(hi)
+        if not self.virtual:
+            if self.scrollbar is not None:
+                self.scrollbar.set(lo, hi)
+            return
+        shown = self._widget_lines()
+        total = self.document.line_count() - self.count + shown
+        if self.scrollbar is not None:
+            self.scrollbar.set((self.first + lo * shown) / total, (self.first + hi * shown) / total)
+        near_top = self.first > 0 and lo * shown < EDGE_LINES
+        near_bottom = self.first + shown < total and (1 - hi) * shown < EDGE_LINES
+        if (near_top or near_bottom) and self._recenter_job is None:
+            self._recenter_job = self.widget.after_idle(self._recenter)
+
+    def yview(self, *args):
+        """Scrollbar command: "moveto" is a document fraction for virtual documents"""
+        if not self.virtual or not args or args[0] != "moveto":
+            self.widget.yview(*args)
+            return
+        shown = self._widget_lines()
+        total = self.document.line_count() - self.count + shown
+        target = int(float(args[1]) * total)
+        if not (self.first <= target < self.first + shown):
+            self._move_window(target)
+        self.widget.yview(f"{target - self.first + 1}.0")
+
+    def _recenter(self):
+        self._recenter_job = None
+        try:
+            top = self.first + int(self.widget.index("@0,0").split(".")[0]) - 1
+        except Exception:
+            return
+        self._move_window(top)
+        self.widget.yview(f"{top - self.first + 1}.0")
+
+    def _move_window(self, line):
+        """Materialize the window around a document line, keeping the insert cursor where it was"""
+        self.flush()
+        cursor_line, cursor_col = map(int, self.widget.index("insert").split("."))
+        cursor_line += self.first - 1
+        self._materialize(line - WINDOW_LINES // 2)
+        if self.first <= cursor_line < self.first + self.count:
+            self.widget.mark_set("insert", f"{cursor_line - self.first + 1}.{cursor_col}")
@@ -7,18 +7,25 @@ from tkinter import ttk, scrolledtext, messagebox
 from pygments import lex
 from pygments.lexers import PythonLexer
 from pygments.token import Token
+from core.diagnostics import DIAGNOSTIC_TAGS, get_diagnostics, text_fingerprint
+from core.document import Document
+from gui.document_view import DocumentView
+from gui.highlight_engine import IncrementalHighlighter, lexer_for_filename
+from gui.line_gutter import LineGutter
+
+LINT_COLORS = {"error": "#f14c4c", "warning": "#cca700", "info": "#3794ff"}   # Gutter markers per issue type
+QUALITY_TAG_BATCH = 2000        # Ranges per tag_add call when applying a diagnostics delta
 
 class EditorTabs(ttk.Frame):
     def __init__(self, parent, app):
         super().__init__(parent)
         self.app = app
-        self.open_files = {}  # filename -> (text_widget, tab_id, original_hash)
+        self.open_files = {}  # filename -> (text_widget, tab_id, saved document fingerprint)
         self.current_file = None
-        self._ln_sched = {}
         self._quality_sched = {}
+        self._quality_touched = {}      # Check key -> (first, last) widget lines edited since the last check
+        self._quality_generation = {}   # Check key -> generation of the newest submitted check
         self._suggest_popup = None
-        self._spell_dict = set()
-        self._init_spell_dict()
         
         self.setup_styles()
         
@@ -75,9 +82,9 @@ class EditorTabs(ttk.Frame):
                 return text, start, end
             else:
                 # No selection, return whole file
-                return text_widget.get("1.0", "end-1c"), "1.0", "end-1c"
+                return self.get_file_content(self.current_file), "1.0", "end-1c"
         except tk.TclError:
-            return text_widget.get("1.0", "end-1c"), "1.0", "end-1c"
+            return self.get_file_content(self.current_file), "1.0", "end-1c"
 
     def replace_range(self, start, end, new_text):
         """Replace a range of text in the active editor"""
@@ -85,8 +92,12 @@ class EditorTabs(ttk.Frame):
             return False
         
         text_widget = self.open_files[self.current_file][0]
-        text_widget.delete(start, end)
-        text_widget.insert(start, new_text)
+        if (start, end) == ("1.0", "end-1c"):
+            # Whole file (see get_selection_info): edit only the lines that changed
+            text_widget._document_view.set_content(new_text)
+        else:
+            text_widget.delete(start, end)
+            text_widget.insert(start, new_text)
         self.on_text_modified(self.current_file, text_widget)
         return True
 
@@ -94,8 +105,7 @@ class EditorTabs(ttk.Frame):
         """Send current code to AI for optimization"""
         if not self.current_file: return
         
-        text_widget = self.open_files[self.current_file][0]
-        code = text_widget.get("1.0", "end-1c")
+        code = self.get_file_content(self.current_file)
         
         mode = self.opt_mode.get()
         minify = self.minify_var.get()
@@ -127,20 +137,6 @@ class EditorTabs(ttk.Frame):
         text_frame = ttk.Frame(frame)
         text_frame.pack(fill="both", expand=True)
         
-        line_numbers = tk.Text(
-            text_frame,
-            width=4,
-            padx=3,
-            takefocus=0,
-            border=0,
-            background="#1e1e1e",
-            foreground="#858585",
-            state='disabled',
-            font=('Consolas', 11),
-            wrap="none" # Line numbers should never wrap
-        )
-        line_numbers.pack(side="left", fill="y")
-        
         text = tk.Text(
             text_frame,
             wrap="word",
@@ -158,17 +154,25 @@ class EditorTabs(ttk.Frame):
         text.pack(side="left", fill="both", expand=True)
         
         def sync_yview(*args):
-            text.yview(*args)
-            line_numbers.yview_moveto(text.yview()[0])
+            view.yview(*args)
+            line_numbers.schedule()
 
         y_scroll = ttk.Scrollbar(text_frame, orient="vertical", command=sync_yview)
         y_scroll.pack(side="right", fill="y")
         
+        # The file's text lives in a Document; the widget shows it (or, for large files, a window of it)
+        view = DocumentView(text, y_scroll)
+        text._document_view = view
+        
+        # Line numbers (and diagnostic/git markers) for the visible lines only
+        line_numbers = LineGutter(text_frame, text, line_offset=lambda: view.first)
+        line_numbers.pack(side="left", fill="y", before=text)
+        text._gutter = line_numbers
+        
         # Configure text to update line numbers on scroll
         def on_scroll(*args):
-            y_scroll.set(*args)
-            line_numbers.yview_moveto(args[0])
-            self.update_line_numbers(text, line_numbers)
+            view.on_yview(*args)
+            line_numbers.schedule()
 
         text.configure(yscrollcommand=on_scroll)
         
@@ -182,14 +186,17 @@ class EditorTabs(ttk.Frame):
         text.bind("<Control-h>", lambda e: self.replace_text())
         
         # Line numbers updates
-        text.bind("<Key>", lambda e: self._schedule_line_numbers(text, line_numbers))
-        text.bind("<MouseWheel>", lambda e: self._schedule_line_numbers(text, line_numbers))
-        text.bind("<Configure>", lambda e: self._schedule_line_numbers(text, line_numbers))
+        text.bind("<Key>", line_numbers.schedule)
+        text.bind("<MouseWheel>", line_numbers.schedule)
+        text.bind("<Configure>", line_numbers.schedule)
         
         text.bind("<KeyRelease>", lambda e: (self.update_cursor_position(text), self._schedule_quality_check(filename, text)), add="+")
         text.bind("<ButtonRelease>", lambda e: self.update_cursor_position(text))
         text.bind("<Control-space>", lambda e: self._trigger_autocomplete(text))
         text.bind("<Alt-Return>", lambda e: self._open_correction_popup(text))
+        text.tag_configure("sp_error", underline=True, foreground="#ff6b6b")
+        text.tag_configure("gr_error", underline=True, foreground="#ffd166")
+        text.bind("<Destroy>", lambda e: get_diagnostics().forget(str(text) + ":q") if e.widget is text else None, add="+")
         
         # Context menu for text area
         text_context_menu = tk.Menu(text, tearoff=0)
@@ -234,15 +241,17 @@ class EditorTabs(ttk.Frame):
             with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
                 content = f.read()
             
+            document = Document(content)
+            
             # Create new tab
             tab_name = os.path.basename(filepath)
             editor_frame, text_widget, line_numbers = self.create_editor(filepath)
             
-            text_widget.insert("1.0", content)
+            text_widget._document_view.load(document)
             self.apply_syntax_highlighting(text_widget, filepath)
             
             self.notebook.add(editor_frame, text=tab_name)
-            self.open_files[filepath] = (text_widget, editor_frame, hash(content))
+            self.open_files[filepath] = (text_widget, editor_frame, document.fingerprint())
             self.notebook.select(editor_frame)
             self.current_file = filepath
             if self.app:
@@ -296,10 +305,8 @@ class EditorTabs(ttk.Frame):
             
             # Check for unsaved changes
             text_widget = self.open_files[filename][0]
-            current_content = text_widget.get("1.0", "end-1c")
-            original_hash = self.open_files[filename][2]
             
-            if hash(current_content) != original_hash:
+            if self.is_modified(filename):
                 # Ask user if they want to save
                 result = messagebox.askyesnocancel(
                     "Unsaved Changes",
@@ -358,10 +365,7 @@ class EditorTabs(ttk.Frame):
         for filename, (text_widget, tab_id, _) in list(self.open_files.items()):
             if filename != current_filename:
                 # Check for unsaved changes
-                current_content = text_widget.get("1.0", "end-1c")
-                original_hash = self.open_files[filename][2]
-                
-                if hash(current_content) != original_hash:
+                if self.is_modified(filename):
                     result = messagebox.askyesnocancel(
                         "Unsaved Changes",
                         f"Save changes to {os.path.basename(filename)}?"
@@ -382,9 +386,8 @@ class EditorTabs(ttk.Frame):
             return
         
         unsaved = []
-        for filename, (text_widget, _, original_hash) in self.open_files.items():
-            current_content = text_widget.get("1.0", "end-1c")
-            if hash(current_content) != original_hash:
+        for filename in self.open_files:
+            if self.is_modified(filename):
                 unsaved.append(filename)
         
         if unsaved:
@@ -438,15 +441,17 @@ class EditorTabs(ttk.Frame):
     def save_file(self, filename, text_widget):
         """Save a specific file"""
         try:
-            content = text_widget.get("1.0", "end-1c")
+            view = text_widget._document_view
+            view.flush()
             with open(filename, 'w', encoding='utf-8') as f:
-                f.write(content)
+                for chunk in view.document.chunks():
+                    f.write(chunk)
             
-            # Update hash
+            # Update saved fingerprint
             self.open_files[filename] = (
                 text_widget,
                 self.open_files[filename][1],
-                hash(content)
+                view.document.fingerprint()
             )
             
             if self.app:
@@ -477,6 +482,17 @@ class EditorTabs(ttk.Frame):
         """Get list of open files"""
         return list(self.open_files.keys())
     
+    def get_file_content(self, filename):
+        """Full text of an open file, including edits not saved yet"""
+        return self.open_files[filename][0]._document_view.content()
+    
+    def is_modified(self, filename):
+        """Whether an open file differs from what was last loaded or saved"""
+        text_widget, _, saved_fingerprint = self.open_files[filename]
+        view = text_widget._document_view
+        view.flush()
+        return view.document.fingerprint() != saved_fingerprint
+    
     def update_file_content(self, filename, new_content):
         """Update file content (for AI suggestions). Opens file if not open."""
         # Normalize path
@@ -486,12 +502,13 @@ class EditorTabs(ttk.Frame):
             # Create a new tab for it
             tab_name = os.path.basename(filename)
             editor_frame, text_widget, line_numbers = self.create_editor(filename)
+            document = Document(new_content)
             
-            text_widget.insert("1.0", new_content)
+            text_widget._document_view.load(document)
             self.apply_syntax_highlighting(text_widget, filename)
             
             self.notebook.add(editor_frame, text=tab_name)
-            self.open_files[filename] = (text_widget, editor_frame, hash(new_content))
+            self.open_files[filename] = (text_widget, editor_frame, document.fingerprint())
             self.notebook.select(editor_frame)
             self.current_file = filename
             if self.app:
@@ -504,26 +521,22 @@ class EditorTabs(ttk.Frame):
                 self.app.log_ai(f"📂 Created/Opened tab: {tab_name}")
             return
 
-        # If already open, just update
+        # If already open, edit only the lines that changed
         text_widget = self.open_files[filename][0]
-        text_widget.delete("1.0", "end")
-        text_widget.insert("1.0", new_content)
+        view = text_widget._document_view
+        view.set_content(new_content)
         
         self.apply_syntax_highlighting(text_widget, filename)
         
-        # Update hash
+        # Update saved fingerprint
         self.open_files[filename] = (
             text_widget,
             self.open_files[filename][1],
-            hash(new_content)
+            view.document.fingerprint()
         )
         
         # Update line numbers
-        parent = text_widget.master
-        for child in parent.winfo_children():
-            if isinstance(child, tk.Text) and child.cget("width") == 4:
-                self.update_line_numbers(text_widget, child)
-                break
+        self.update_line_numbers(text_widget, text_widget._gutter)
 
     def reload_file(self, filepath):
         """Reload a file from disk if it's open"""
@@ -552,35 +565,9 @@ class EditorTabs(ttk.Frame):
         pass
     
     def update_line_numbers(self, text_widget, line_numbers):
-        """Update line numbers with accurate alignment even with word wrap"""
+        """Redraw the gutter now (it skips the work if nothing visible changed)"""
         try:
-            line_numbers.config(state='normal')
-            line_numbers.delete("1.0", "end")
-            
-            # Get the first and last visible lines
-            first = text_widget.index("@0,0")
-            last = text_widget.index(f"@0,{text_widget.winfo_height()}")
-            
-            first_line = int(first.split('.')[0])
-            last_line = int(last.split('.')[0])
-            
-            # Draw line numbers only for visible lines
-            # This is more efficient and handles scrolling better
-            for i in range(first_line, last_line + 1):
-                dline = text_widget.dlineinfo(f"{i}.0")
-                if dline:
-                    # Line is visible, but might be a wrapped line
-                    # We only want to put a number at the start of a logical line
-                    line_numbers.insert("end", f"{i}\n")
-                else:
-                    # Line might be wrapped or not visible
-                    # If it's a wrapped part of a logical line, we don't put a number
-                    # But we need to keep the line numbers widget in sync vertically
-                    pass
-
-            # Precise sync: we use the same yview for both
-            line_numbers.yview_moveto(text_widget.yview()[0])
-            line_numbers.config(state='disabled')
+            line_numbers.redraw()
         except Exception:
             pass
 
@@ -594,13 +581,7 @@ class EditorTabs(ttk.Frame):
         pass
 
     def _schedule_line_numbers(self, text_widget, line_numbers):
-        try:
-            key = str(text_widget)
-            if key in self._ln_sched:
-                self.after_cancel(self._ln_sched[key])
-            self._ln_sched[key] = self.after(50, lambda: self.update_line_numbers(text_widget, line_numbers))
-        except Exception:
-            pass
+        line_numbers.schedule()
     
     def update_cursor_position(self, text_widget):
         """Update cursor position in status bar"""
@@ -608,89 +589,78 @@ class EditorTabs(ttk.Frame):
             cursor_pos = text_widget.index("insert")
             line, col = cursor_pos.split('.')
             if self.app:
-                self.app.update_cursor_position(int(line), int(col))
+                self.app.update_cursor_position(int(line) + text_widget._document_view.first, int(col))
         except:
             pass
 
-    def _init_spell_dict(self):
-        try:
-            common = [
-                "the","be","to","of","and","a","in","that","have","I","it","for","not","on","with","he","as","you","do","at",
-                "this","but","his","by","from","they","we","say","her","she","or","an","will","my","one","all","would","there","their",
-                "is","are","was","were","can","could","should","shall","may","might","must","if","else","elif","while","for","return","class","def","import","from"
-            ]
-            self._spell_dict = set(common)
-        except Exception:
-            self._spell_dict = set()
-
     def _schedule_quality_check(self, filename, text_widget):
         try:
             key = str(text_widget) + ":q"
+            line = int(text_widget.index("insert").split('.')[0]) - 1
+            touched = self._quality_touched.get(key)
+            self._quality_touched[key] = (min(touched[0], line), max(touched[1], line)) if touched else (line, line)
             if key in self._quality_sched:
                 self.after_cancel(self._quality_sched[key])
-            self._quality_sched[key] = self.after(120, lambda: self._check_grammar_spelling(filename, text_widget))
+            self._quality_sched[key] = self.after(120, lambda: self._submit_quality_check(text_widget))
         except Exception:
             pass
 
-    def _levenshtein(self, a, b):
+    def _submit_quality_check(self, text_widget):
+        """Hand a snapshot of the widget to the diagnostics worker"""
+        key = str(text_widget) + ":q"
+        self._quality_sched.pop(key, None)
+        touched = self._quality_touched.pop(key, None)
         try:
-            m, n = len(a), len(b)
-            dp = list(range(n+1))
-            for i in range(1, m+1):
-                prev = dp[0]
-                dp[0] = i
-                for j in range(1, n+1):
-                    temp = dp[j]
-                    dp[j] = min(
-                        dp[j] + 1,
-                        dp[j-1] + 1,
-                        prev + (0 if a[i-1] == b[j-1] else 1)
-                    )
-                    prev = temp
-            return dp[n]
-        except Exception:
-            return 999
+            content = text_widget.get("1.0", "end-1c")
+        except tk.TclError:
+            return
+        def on_delta(delta):        # Worker thread
+            self.after(0, lambda: self._apply_quality_delta(text_widget, delta))
+        self._quality_generation[key] = get_diagnostics().check(key, content, on_delta, touched)
+
+    def _apply_quality_delta(self, text_widget, delta):
+        """Retag the lines a check reported; dropped if the widget changed after its snapshot"""
+        if self._quality_generation.get(delta.key) != delta.generation or delta.key in self._quality_sched:
+            return
+        try:
+            # The line count alone misses same-size programmatic edits (update_file_content,
+            # a DocumentView window slide) that no key press rescheduled a check for
+            if (int(text_widget.index("end-1c").split('.')[0]) != delta.line_count
+                    or text_fingerprint(text_widget.get("1.0", "end-1c")) != delta.fingerprint):
+                self._quality_sched[delta.key] = self.after_idle(lambda: self._submit_quality_check(text_widget))
+                return
+            first = delta.first + 1
+            for tag in DIAGNOSTIC_TAGS:
+                text_widget.tag_remove(tag, f"{first}.0", f"{first + len(delta.lines)}.0")
+            ranges = {tag: [] for tag in DIAGNOSTIC_TAGS}
+            for line, problems in enumerate(delta.lines, first):
+                for tag, start, end in problems:
+                    ranges[tag] += (f"{line}.{start}", f"{line}.{end}")
+            for tag, indices in ranges.items():
+                for i in range(0, len(indices), 2 * QUALITY_TAG_BATCH):
+                    text_widget.tag_add(tag, *indices[i:i + 2 * QUALITY_TAG_BATCH])
+        except tk.TclError:
+            return
+        get_diagnostics().accept(delta.key, delta.generation)
 
     def _suggest_words(self, word, limit=5):
         try:
-            cands = sorted(self._spell_dict, key=lambda w: (self._levenshtein(word.lower(), w), len(w)))
-            return [w for w in cands[:limit]]
+            return get_diagnostics().suggest(word, limit)
         except Exception:
             return []
 
-    def _check_grammar_spelling(self, filename, text_widget):
-        try:
-            text_widget.tag_delete("sp_error")
-            text_widget.tag_delete("gr_error")
-            text_widget.tag_configure("sp_error", underline=True, foreground="#ff6b6b")
-            text_widget.tag_configure("gr_error", underline=True, foreground="#ffd166")
-            content = text_widget.get("1.0", "end-1c")
-            if not content:
-                return
-            lines = content.split('\n')
-            line_no = 1
-            import re
-            for line in lines:
-                for m in re.finditer(r"\s{3,}", line):
-                    start = f"{line_no}.{m.start()}"
-                    end = f"{line_no}.{m.end()}"
-                    text_widget.tag_add("gr_error", start, end)
-                if len(line.strip()) > 80 and line.strip()[-1] not in ".!?":
-                    start = f"{line_no}.{max(0, len(line)-1)}"
-                    end = f"{line_no}.{len(line)}"
-                    text_widget.tag_add("gr_error", start, end)
-                words = re.findall(r"[A-Za-z]{4,}", line)
-                idx = 0
-                for w in words:
-                    j = line.find(w, idx)
-                    idx = j + len(w)
-                    if w.lower() not in self._spell_dict:
-                        start = f"{line_no}.{j}"
-                        end = f"{line_no}.{j+len(w)}"
-                        text_widget.tag_add("sp_error", start, end)
-                line_no += 1
-        except Exception:
-            pass
+    def show_lint_issues(self, file_path, issues):
+        """Mark Linter issues ({'line', 'type', ...} dicts) in the gutter of the file's editor"""
+        path = os.path.abspath(file_path)
+        for filename, (text_widget, _, _) in self.open_files.items():
+            if os.path.abspath(filename) != path:
+                continue
+            markers = {}
+            for issue in issues:
+                line = issue.get('line')
+                if line and markers.get(line) != LINT_COLORS["error"]:
+                    markers[line] = LINT_COLORS.get(issue.get('type'), LINT_COLORS["info"])
+            text_widget._gutter.set_markers("diagnostic", markers)
 
     def _open_correction_popup(self, text_widget):
         try:
@@ -698,7 +668,7 @@ class EditorTabs(ttk.Frame):
             line = int(cursor.split('.')[0])
             tags = text_widget.tag_names(cursor)
             target_tag = None
-            for t in ("sp_error", "gr_error"):
+            for t in DIAGNOSTIC_TAGS:
                 if t in tags:
                     target_tag = t
                     break
@@ -832,118 +802,21 @@ class EditorTabs(ttk.Frame):
             return "break"
     
     def apply_syntax_highlighting(self, text_widget, filename):
-        """Apply syntax highlighting based on file extension"""
-        try:
-            from pygments.lexers import (
-                PythonLexer, LuaLexer, CppLexer, CSharpLexer, 
-                JavascriptLexer, HtmlLexer, CssLexer, MarkdownLexer
-            )
-            from pygments.lexers import get_lexer_for_filename
-        except ImportError:
-            # Fallback for core python only if pygments partially installed?
-            from pygments.lexers import PythonLexer
-            get_lexer_for_filename = None
-
+        """Apply syntax highlighting based on file extension; later edits are re-highlighted incrementally"""
         try:
-            # Determine lexer
-            lexer = None
-            if get_lexer_for_filename:
-                try:
-                    lexer = get_lexer_for_filename(filename)
-                except:
-                    pass
-            
-            # Manual fallback/override
-            if not lexer:
-                ext = os.path.splitext(filename)[1].lower()
-                if ext == '.py': lexer = PythonLexer()
-                elif ext == '.lua': lexer = LuaLexer() # Roblox uses Lua
-                elif ext in ['.cpp', '.c', '.h', '.hpp']: lexer = CppLexer()
-                elif ext == '.cs': lexer = CSharpLexer()
-                elif ext == '.js': lexer = JavascriptLexer()
-                elif ext in ['.html', '.htm']: lexer = HtmlLexer()
-                elif ext == '.css': lexer = CssLexer()
-                elif ext == '.md': lexer = MarkdownLexer()
-            
+            lexer = lexer_for_filename(filename)
             if not lexer:
                 return
 
-            text = text_widget.get("1.0", "end-1c")
-            
-            # Define generalized color map
-            color_map = {
-                Token.Keyword: "#569cd6",
-                Token.Keyword.Constant: "#569cd6",
-                Token.Keyword.Declaration: "#569cd6",
-                Token.Keyword.Namespace: "#569cd6",
-                Token.Keyword.Type: "#4ec9b0",
-                Token.Name.Class: "#4ec9b0",
-                Token.Name.Function: "#dcdcaa",
-                Token.Name.Builtin: "#4ec9b0",
-                Token.Name.Tag: "#569cd6",      # HTML tags
-                Token.Name.Attribute: "#9cdcfe", # HTML attributes
-                Token.String: "#ce9178",
-                Token.String.Double: "#ce9178",
-                Token.String.Single: "#ce9178",
-                Token.Comment: "#6a9955",
-                Token.Comment.Single: "#6a9955",
-                Token.Comment.Multiline: "#6a9955",
-                Token.Number: "#b5cea8",
-                Token.Number.Integer: "#b5cea8",
-                Token.Number.Float: "#b5cea8",
-                Token.Operator: "#d4d4d4",
-                Token.Name.Variable: "#9cdcfe",
-            }
-            
-            # Clear existing tags
-            for tag in list(text_widget.tag_names()):
-                if tag.startswith("pygments_"):
-                    text_widget.tag_delete(tag)
-            
-            lines = text.split('\n')
-            current_line = 1
-            
-            for line in lines:
-                try:
-                    tokens = list(lexer.get_tokens(line))
-                    current_col = 0
-                    
-                    for token_type, token_text in tokens:
-                        if token_text:
-                            end_col = current_col + len(token_text)
-                            
-                            # Find best matching color
-                            color = None
-                            if token_type in color_map:
-                                color = color_map[token_type]
-                            else:
-                                # Try to match parent token types
-                                parent = token_type.parent
-                                while parent:
-                                    if parent in color_map:
-                                        color = color_map[parent]
-                                        break
-                                    parent = parent.parent
-                            
-                            if color:
-                                tag_name = f"pygments_{token_type}"
-                                if tag_name not in text_widget.tag_names():
-                                    text_widget.tag_configure(
-                                        tag_name,
-                                        foreground=color
-                                    )
-                                
-                                start_index = f"{current_line}.{current_col}"
-                                end_index = f"{current_line}.{end_col}"
-                                
-                                text_widget.tag_add(tag_name, start_index, end_index)
-                            
-                            current_col = end_col
-                except:
-                    pass
-                
-                current_line += 1
-                
+            highlighter = getattr(text_widget, "_highlighter", None)
+            if highlighter is None:
+                text_widget._highlighter = IncrementalHighlighter(text_widget, lexer)
+            elif type(highlighter.lexer) is not type(lexer):
+                highlighter.set_lexer(lexer)
+            else:
+                # Edits were already picked up as they happened; re-check the rest in idle time
+                highlighter.refresh()
+
         except Exception as e:
             # Fallback to basic highlighting if anything fails
             print(f"Syntax highlighting error: {e}")
@@ -1061,15 +934,14 @@ class EditorTabs(ttk.Frame):
             if find_term:
                 replace_term = simpledialog.askstring("Replace", f"Replace '{find_term}' with:")
                 if replace_term is not None:
-                    content = text_widget.get("1.0", "end-1c")
+                    content = self.get_file_content(self.current_file)
                     new_content = content.replace(find_term, replace_term)
-                    text_widget.delete("1.0", "end")
-                    text_widget.insert("1.0", new_content)
+                    text_widget._document_view.set_content(new_content)
     
     def format_code(self):
         if self.current_file and self.current_file in self.open_files:
             text_widget = self.open_files[self.current_file][0]
-            content = text_widget.get("1.0", "end-1c")
+            content = self.get_file_content(self.current_file)
             
             # Simple formatting: adjust indentation
             lines = content.split('\n')
@@ -1091,15 +963,13 @@ class EditorTabs(ttk.Frame):
                 else:
                     formatted.append('')
             
-            text_widget.delete("1.0", "end")
-            text_widget.insert("1.0", '\n'.join(formatted))
+            text_widget._document_view.set_content('\n'.join(formatted))
             
             self.apply_syntax_highlighting(text_widget, self.current_file)
     
     def check_syntax(self):
         if self.current_file and self.current_file.endswith('.py'):
-            text_widget = self.open_files[self.current_file][0]
-            content = text_widget.get("1.0", "end-1c")
+            content = self.get_file_content(self.current_file)
             
             try:
                 compile(content, '<string>', 'exec')
@@ -1119,12 +989,9 @@ class EditorTabs(ttk.Frame):
                 selectbackground=color_map.get("editor_selection", "#264f78")
             )
             
-            parent = text_widget.master
-            for child in parent.winfo_children():
-                if isinstance(child, tk.Text) and child.cget("width") == 4:
-                    child.configure(
-                        bg=color_map.get("editor_gutter", "#1e1e1e"),
-                        fg=color_map.get("editor_gutter_fg", "#858585")
-                    )
+            text_widget._gutter.configure_colors(
+                background=color_map.get("editor_gutter", "#1e1e1e"),
+                foreground=color_map.get("editor_gutter_fg", "#858585")
+            )
             
             self.apply_syntax_highlighting(text_widget, filename)
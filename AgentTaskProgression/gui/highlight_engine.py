@@ -0,0 +1,421 @@
+"""
+Highlight Engine - Incremental, viewport-first pygments highlighting for tk.Text editors
+"""
+import os
+import time
+
+from pygments.lexer import RegexLexer, ExtendedRegexLexer
+from pygments.token import Token, _TokenType
+
+COLOR_MAP = {
+    Token.Keyword: "#569cd6",
+    Token.Keyword.Constant: "#569cd6",
+    Token.Keyword.Declaration: "#569cd6",
+    Token.Keyword.Namespace: "#569cd6",
+    Token.Keyword.Type: "#4ec9b0",
+    Token.Name.Class: "#4ec9b0",
+    Token.Name.Function: "#dcdcaa",
+    Token.Name.Builtin: "#4ec9b0",
+    Token.Name.Tag: "#569cd6",      # HTML tags
+    Token.Name.Attribute: "#9cdcfe", # HTML attributes
+    Token.String: "#ce9178",
+    Token.String.Double: "#ce9178",
+    Token.String.Single: "#ce9178",
+    Token.Comment: "#6a9955",
+    Token.Comment.Single: "#6a9955",
+    Token.Comment.Multiline: "#6a9955",
+    Token.Number: "#b5cea8",
+    Token.Number.Integer: "#b5cea8",
+    Token.Number.Float: "#b5cea8",
+    Token.Operator: "#d4d4d4",
+    Token.Name.Variable: "#9cdcfe",
+}
+
+SLICE_MS = 8                    # Work per idle slice before yielding to the event loop
+VISIBLE_MARGIN = 20             # Lines past the viewport highlighted synchronously after an edit
+IDLE_LINES = 500                # Lines read per idle slice
+LOOKAHEAD_LINES = 1000          # Extra lines read past those being committed, for tokens spanning lines
+
+# Replaces the widget command so insert/delete/replace report the first touched line, the
+# line-count change and the last line the edited range covers afterwards. Other subcommands
+# (and errors) never leave Tcl.
+_PROXY = """
+proc %(widget)s {args} {
+    set cmd [lindex $args 0]
+    if {$cmd ni {insert delete replace} || [llength $args] < 2} {
+        return [uplevel 1 [linsert $args 0 %(orig)s]]
+    }
+    set first [lindex [split [%(orig)s index [lindex $args 1]] .] 0]
+    set last $first
+    if {$cmd eq "replace" || ($cmd eq "delete" && [llength $args] > 2)} {
+        set last [lindex [split [%(orig)s index [lindex $args [expr {$cmd eq "replace" ? 2 : "end"}]]] .] 0]
+    }
+    set before [lindex [split [%(orig)s index end] .] 0]
+    set result [uplevel 1 [linsert $args 0 %(orig)s]]
+    set delta [expr {[lindex [split [%(orig)s index end] .] 0] - $before}]
+    if {$cmd eq "insert"} {
+        set last [expr {$first + $delta}]
+    } else {
+        set last [expr {max($first, $last + $delta)}]
+    }
+    %(callback)s $first $delta $last
+    return $result
+}
+"""
+
+
+def lexer_for_filename(filename):
+    """Pygments lexer for a file name (extension overrides for the IDE's languages), or None"""
+    try:
+        from pygments.lexers import get_lexer_for_filename
+        return get_lexer_for_filename(filename)
+    except Exception:
+        pass
+    from pygments.lexers import (PythonLexer, LuaLexer, CppLexer, CSharpLexer,
+                                 JavascriptLexer, HtmlLexer, CssLexer, MarkdownLexer)
+    ext = os.path.splitext(filename)[1].lower()
+    lexers = {'.py': PythonLexer, '.lua': LuaLexer, '.cpp': CppLexer, '.c': CppLexer, '.h': CppLexer,
+              '.hpp': CppLexer, '.cs': CSharpLexer, '.js': JavascriptLexer, '.html': HtmlLexer,
+              '.htm': HtmlLexer, '.css': CssLexer, '.md': MarkdownLexer}
+    return lexers[ext]() if ext in lexers else None
+
+
+class IncrementalHighlighter:
+    """
+    Keeps one tk.Text highlighted as it is edited.
+
+    For regex lexers the lexer state stack at the start of every line is remembered.
+    An edit re-lexes from its first line and stops as soon as a line ends in the state
+    already recorded for the next one, so typing costs a line or two whatever the file
+    size. Lines up to just past the viewport are done immediately; anything further
+    (a newly opened file, an unclosed docstring) continues in after_idle slices.
+    Lexers with custom tokenizers are re-lexed as a whole document, also in slices.
+    Tags are applied in one tag_add call per token type per slice.
+
+    A rule that failed to match because its closing text did not exist yet (an
+    unterminated string far above the edit) is only revisited by refresh().
+    """
+
+    def __init__(self, widget, lexer, color_map=COLOR_MAP):
+        self.widget = widget
+        self.color_map = color_map
+        self._tags = {}                 # token type -> tag name or None (uncolored)
+        self._job = None
+        self._proxied = False
+        self.set_lexer(lexer)
+        self._install_proxy()
+        widget.bind("<Destroy>", lambda e: self.close() if e.widget is widget else None, add="+")
+
+    def set_lexer(self, lexer):
+        self.lexer = lexer
+        cls = type(lexer)
+        self.incremental = (isinstance(lexer, RegexLexer) and not isinstance(lexer, ExtendedRegexLexer)
+                            and cls.get_tokens_unprocessed is RegexLexer.get_tokens_unprocessed)
+        self._tokendefs = getattr(lexer, "_tokens", None) if self.incremental else None
+        self.rehighlight()
+
+    # --- Edit tracking ---
+    def _install_proxy(self):
+        w = self.widget
+        orig = w._w + "_hl_orig"
+        try:
+            w.tk.call("rename", w._w, orig)
+            callback = w.register(self._on_edit)
+            w.tk.eval(_PROXY % {"widget": w._w, "orig": orig, "callback": callback})
+            self._orig = orig
+            self._proxied = True
+        except Exception as e:
+            print(f"[Highlight] Edit tracking unavailable, highlighting on demand only: {e}")
+
+    def _on_edit(self, first, delta, last):
+        try:
+            self.invalidate(int(first), int(delta), int(last))
+        except Exception as e:
+            print(f"[Highlight] {e}")
+
+    def invalidate(self, first_line, delta=0, last_line=None):
+        """
+        Lines first_line..last_line (after the edit) changed and delta lines were added
+        (negative: removed). last_line defaults to the lines a pure insert/delete touches.
+        """
+        if not self.incremental:
+            self._restart_document()
+            return
+        first_line = max(1, min(first_line, self._line_count() - max(delta, 0)))  # "end" is one past the last line
+        index = first_line - 1          # _states[i] is the stack at the start of line i + 1
+        if delta > 0:
+            self._states[index + 1:index + 1] = [None] * delta
+        elif delta < 0:
+            del self._states[index + 1:index + 1 - delta]
+        if self._dirty_to >= first_line:
+            self._dirty_to += delta
+        if last_line is None:
+            last_line = first_line + max(delta, 0)
+        self._dirty_to = max(self._dirty_to, last_line)
+        if self._frontier > first_line:
+            self._frontier = first_line
+        self._run(sync_until=self._last_visible_line() + VISIBLE_MARGIN)
+
+    def rehighlight(self):
+        """Forget all state and highlight the whole buffer again (viewport first)"""
+        self._cancel()
+        self._clear_tags("1.0", "end")
+        if self.incremental:
+            self._states = [("root",)] + [None] * (self._line_count() - 1)
+            self._frontier = 1          # First line whose tags/state are not known to be current
+            self._dirty_to = 0          # Last edited line; convergence only counts past it
+            self._run(sync_until=self._last_visible_line() + VISIBLE_MARGIN)
+        else:
+            self._restart_document()
+
+    def refresh(self):
+        """Re-lex the whole buffer in idle time, keeping the current tags until replaced"""
+        if not self.incremental:
+            self._restart_document()
+            return
+        self._frontier = 1
+        self._dirty_to = self._line_count()
+        self._run()
+
+    # --- Scheduling ---
+    def _run(self, sync_until=0):
+        """Lex synchronously up to sync_until, then continue in idle slices"""
+        self._cancel()
+        if self.incremental:
+            self._lex_lines(until=sync_until)
+            if self._frontier <= self._line_count():
+                self._job = self.widget.after_idle(self._idle_step)
+        elif self._doc_tokens is not None:
+            self._job = self.widget.after_idle(self._idle_step)
+
+    def _idle_step(self):
+        self._job = None
+        try:
+            if not self.widget.winfo_exists():
+                return
+        except Exception:
+            return
+        deadline = time.perf_counter() + SLICE_MS / 1000.0
+        if self.incremental:
+            self._lex_lines(deadline=deadline)
+            pending = self._frontier <= self._line_count()
+        else:
+            pending = self._lex_document(deadline)
+        if pending:
+            self._job = self.widget.after_idle(self._idle_step)
+
+    def _cancel(self):
+        if self._job is not None:
+            try:
+                self.widget.after_cancel(self._job)
+            except Exception:
+                pass
+            self._job = None
+
+    def close(self):
+        self._cancel()
+        if self._proxied:
+            self._proxied = False
+            try:
+                w = self.widget
+                w.tk.call("rename", w._w, "")
+                w.tk.call("rename", self._orig, w._w)
+            except Exception:
+                pass
+
+    # --- Incremental (regex lexers) ---
+    def _lex_lines(self, until=0, deadline=None):
+        """
+        Re-lex from the frontier, recording the state stack at each line start that no
+        token spans. Stops once `until` is passed or the deadline is hit, or when a line
+        past the edit starts in the state already recorded for it: everything up to the
+        next never-lexed line is then current and the frontier jumps there.
+
+        Only the lines up to `until` (IDLE_LINES per idle slice) plus LOOKAHEAD_LINES are
+        read from the widget; states are committed up to the former, so a token spanning
+        more than the lookahead is treated like one whose end is not typed yet.
+        """
+        states, total = self._states, self._line_count()
+        start = self._frontier
+        if start > total:
+            return
+        stop = max(until, start) if deadline is None else start + IDLE_LINES
+        while not states[start - 1]:        # Resume only where no token spans the line start
+            start -= 1
+        read_to = stop + LOOKAHEAD_LINES
+        if read_to >= total:
+            read_to = stop = total
+            text = self.widget.get(f"{start}.0", "end-1c") + "\n"
+        else:
+            text = self.widget.get(f"{start}.0", f"{read_to}.end") + "\n"
+        ranges = {}
+        tline, tstart, tnext = start, 0, text.find("\n") + 1
+        bline, bnext = start, tnext
+        frontier, converged = None, False
+        for pos, token_type, value in self._lex(text, states[start - 1]):
+            if token_type is None:          # Between matches at or past a line break; value is the stack
+                while bnext and bnext <= pos:
+                    line_start, bline = bnext, bline + 1
+                    bnext = text.find("\n", line_start) + 1
+                    if bline > total:
+                        break
+                    if bline > stop:            # Past the committed lines (the read text may end early)
+                        if line_start != pos:
+                            states[bline - 1] = False   # Resume from the token's start, not a stale state
+                        frontier = bline
+                        break
+                    if line_start != pos:       # A token runs across this line start
+                        states[bline - 1] = False
+                        continue
+                    if bline > self._dirty_to and states[bline - 1] == value:
+                        converged = True
+                        try:
+                            frontier = states.index(None, bline - 1)
+                        except ValueError:
+                            frontier = total + 1
+                        break
+                    states[bline - 1] = value
+                    if (bline > until if deadline is None else time.perf_counter() >= deadline):
+                        frontier = bline
+                        break
+                if frontier is not None:
+                    break
+                continue
+            tag = self._tag_for(token_type)
+            if not tag or not value:
+                continue
+            while tnext and tnext <= pos:
+                tline, tstart = tline + 1, tnext
+                tnext = text.find("\n", tnext) + 1
+            col = pos - tstart
+            for i, part in enumerate(value.split("\n")):
+                if tline + i > stop:
+                    break                   # Beyond the committed lines; lexed again next time
+                if part:
+                    c = 0 if i else col
+                    ranges.setdefault(tag, []).extend((f"{tline + i}.{c}", f"{tline + i}.{c + len(part)}"))
+        if frontier is None:
+            frontier, converged = total + 1, True
+        if converged:
+            self._dirty_to = 0
+        self._clear_tags(f"{start}.0", f"{bline - 1}.end" if bline <= total else "end")
+        for tag, indices in ranges.items():
+            self.widget.tag_add(tag, *indices)
+        self._frontier = frontier
+
+    def _lex(self, text, stack):
+        """
+        RegexLexer.get_tokens_unprocessed from a given state stack. After a match ends on or
+        past a line break it also yields (pos, None, state stack) so callers can record it.
+        """
+        tokendefs = self._tokendefs
+        statestack = list(stack)
+        statetokens = tokendefs[statestack[-1]]
+        pos, end = 0, len(text)
+        next_line = text.find("\n") + 1
+        while pos < end:
+            if pos >= next_line:
+                yield pos, None, tuple(statestack)
+                next_line = text.find("\n", pos) + 1
+            for rexmatch, action, new_state in statetokens:
+                m = rexmatch(text, pos)
+                if m:
+                    if action is not None:
+                        if type(action) is _TokenType:
+                            yield pos, action, m.group()
+                        else:
+                            yield from action(self.lexer, m)
+                    if m.end() == pos and new_state is None:
+                        continue            # Empty match without a transition would never advance
+                    pos = m.end()
+                    if new_state is not None:
+                        if isinstance(new_state, tuple):
+                            for state in new_state:
+                                if state == '#pop':
+                                    if len(statestack) > 1:
+                                        statestack.pop()
+                                elif state == '#push':
+                                    statestack.append(statestack[-1])
+                                else:
+                                    statestack.append(state)
+                        elif isinstance(new_state, int):
+                            if abs(new_state) >= len(statestack):
+                                del statestack[1:]
+                            else:
+                                del statestack[new_state:]
+                        elif new_state == '#push':
+                            statestack.append(statestack[-1])
+                        statetokens = tokendefs[statestack[-1]]
+                    break
+            else:
+                if text[pos] == "\n":
+                    statestack = ["root"]       # Same end-of-line recovery as pygments
+                    statetokens = tokendefs["root"]
+                    yield pos, Token.Text, "\n"
+                else:
+                    yield pos, Token.Error, text[pos]
+                pos += 1
+        yield pos, None, tuple(statestack)
+
+    # --- Whole-document fallback ---
+    def _restart_document(self):
+        self._cancel()
+        text = self.widget.get("1.0", "end-1c")
+        self._doc_tokens = self.lexer.get_tokens_unprocessed(text)
+        self._doc_line, self._doc_col = 1, 0
+        self._doc_cleared = 1           # Lines below this still carry old tags
+        self._run()
+
+    def _lex_document(self, deadline):
+        ranges = {}
+        line, col = self._doc_line, self._doc_col
+        done = True
+        for _, token_type, value in self._doc_tokens:
+            tag = self._tag_for(token_type)
+            for i, part in enumerate(value.split("\n")):
+                if i:
+                    line, col = line + 1, 0
+                if tag and part:
+                    ranges.setdefault(tag, []).extend((f"{line}.{col}", f"{line}.{col + len(part)}"))
+                col += len(part)
+            if time.perf_counter() >= deadline:
+                done = False
+                break
+        self._clear_tags(f"{self._doc_cleared}.0", "end" if done else f"{line}.end")
+        self._doc_cleared = line + 1
+        for tag, indices in ranges.items():
+            self.widget.tag_add(tag, *indices)
+        self._doc_line, self._doc_col = line, col
+        if done:
+            self._doc_tokens = None
+        return not done
+
+    # --- Tags and widget helpers ---
+    def _tag_for(self, token_type):
+        tag = self._tags.get(token_type, False)
+        if tag is False:
+            color, parent = None, token_type
+            while parent is not None:
+                if parent in self.color_map:
+                    color = self.color_map[parent]
+                    break
+                parent = parent.parent
+            tag = f"pygments_{token_type}" if color else None
+            if tag:
+                self.widget.tag_configure(tag, foreground=color)
+            self._tags[token_type] = tag
+        return tag
+
+    def _clear_tags(self, start, end):
+        for tag in self.widget.tag_names():
+            if tag.startswith("pygments_"):
+                self.widget.tag_remove(tag, start, end)
+
+    def _line_count(self):
+        return int(self.widget.index("end-1c").split(".")[0])
+
+    def _last_visible_line(self):
+        try:
+            return int(self.widget.index(f"@0,{self.widget.winfo_height()}").split(".")[0])
+        except Exception:
+            return 0
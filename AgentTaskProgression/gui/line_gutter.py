@@ -0,0 +1,150 @@
+"""
+Line Gutter - Canvas line-number gutter for an editor text widget, with diagnostic and git markers
+"""
+import tkinter as tk
+import tkinter.font as tkfont
+
+MARKER_KINDS = ("diagnostic", "git")    # Diagnostics: dot left of the number; git: bar on the right edge
+
+
+class LineGutter(tk.Canvas):
+    """
+    Line numbers for the lines currently on screen.
+
+    schedule() coalesces any number of scroll/key/configure events into one idle
+    redraw, and a redraw returns at once unless the viewport, the line count, the
+    numbering offset, the markers or the layout (position of the last visible line,
+    which moves when a line above it wraps or unwraps) changed. Numbers are placed from dlineinfo of each
+    visible logical line, so wrapped continuation lines get none. Canvas items are
+    pooled per screen slot and only moved or relabelled when their line or y changed.
+    """
+
+    def __init__(self, parent, text_widget, line_offset=None, font=('Consolas', 11),
+                 background="#1e1e1e", foreground="#858585", **kwargs):
+        super().__init__(parent, background=background, highlightthickness=0, borderwidth=0,
+                         takefocus=0, **kwargs)
+        self.text_widget = text_widget
+        self.line_offset = line_offset or (lambda: 0)   # Added to widget line numbers (windowed documents)
+        self.font = tkfont.Font(font=font)
+        self.foreground = foreground
+        self.markers = {kind: {} for kind in MARKER_KINDS}  # kind -> {document line: color}
+        self._markers_version = 0
+        self._slots = []                # [(text item, y, label)] reused top to bottom
+        self._marker_items = []
+        self._key = None
+        self._digits = 0
+        self._job = None
+        self._fit_width(1)
+
+    # --- Public API ---
+    def schedule(self, event=None):
+        """Redraw once the event loop is idle (any number of calls before that cost one redraw)"""
+        if self._job is None:
+            self._job = self.after_idle(self._idle_redraw)
+
+    def redraw(self):
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+        self._draw()
+
+    def set_markers(self, kind, lines):
+        """Replace one kind of markers: {1-based document line: color}"""
+        lines = dict(lines)
+        if self.markers.get(kind) != lines:
+            self.markers[kind] = lines
+            self._markers_version += 1
+            self.schedule()
+
+    def configure_colors(self, background=None, foreground=None):
+        if background:
+            self.configure(background=background)
+        if foreground and foreground != self.foreground:
+            self.foreground = foreground
+            for item, _, _ in self._slots:
+                self.itemconfigure(item, fill=foreground)
+
+    # --- Drawing ---
+    def _idle_redraw(self):
+        self._job = None
+        try:
+            self._draw()
+        except tk.TclError:
+            pass                        # Widget destroyed while the redraw was pending
+
+    def _draw(self):
+        text = self.text_widget
+        height = text.winfo_height()
+        offset = self.line_offset()
+        last_line = int(text.index("end-1c").split(".")[0])
+        bottom = text.index(f"@0,{height}")
+        bottom_info = text.dlineinfo(bottom)   # Moves when a line above it wraps or unwraps
+        key = (text.index("@0,0"), text.yview()[0], height, last_line, offset, self._markers_version,
+               bottom, bottom_info[1] if bottom_info else None)
+        if key == self._key:
+            return
+        self._key = key
+        self._fit_width(last_line + offset)
+
+        positions = []                  # (widget line, y) of numbers to show
+        line = int(key[0].split(".")[0])
+        while line <= last_line:
+            info = text.dlineinfo(f"{line}.0")
+            if info is not None:
+                if info[1] > height:
+                    break
+                positions.append((line, info[1]))
+            elif positions:
+                break                   # Past the bottom of the viewport
+            line += 1
+
+        width = int(self.cget("width"))
+        x = width - 6
+        for i, (line, y) in enumerate(positions):
+            label = str(line + offset)
+            if i < len(self._slots):
+                item, old_y, old_label = self._slots[i]
+                if old_y != y:
+                    self.coords(item, x, y)
+                if old_label != label:
+                    self.itemconfigure(item, text=label)
+                if old_y is None:
+                    self.itemconfigure(item, state="normal")
+            else:
+                item = self.create_text(x, y, anchor="ne", text=label, font=self.font, fill=self.foreground)
+                self._slots.append(None)
+            self._slots[i] = (item, y, label)
+        for i in range(len(positions), len(self._slots)):
+            item, old_y, _ = self._slots[i]
+            if old_y is not None:
+                self.itemconfigure(item, state="hidden")
+                self._slots[i] = (item, None, None)
+        self._draw_markers(positions, offset, width)
+
+    def _draw_markers(self, positions, offset, width):
+        for item in self._marker_items:
+            self.delete(item)
+        self._marker_items = []
+        if not any(self.markers.values()):
+            return
+        line_height = self.font.metrics("linespace")
+        diagnostics, git = self.markers["diagnostic"], self.markers["git"]
+        for line, y in positions:
+            doc_line = line + offset
+            color = diagnostics.get(doc_line)
+            if color:
+                mid = y + line_height // 2
+                self._marker_items.append(self.create_oval(2, mid - 3, 8, mid + 3, fill=color, outline=""))
+            color = git.get(doc_line)
+            if color:
+                self._marker_items.append(self.create_rectangle(width - 3, y, width, y + line_height,
+                                                                fill=color, outline=""))
+
+    def _fit_width(self, max_line):
+        digits = max(3, len(str(max_line)))
+        if digits != self._digits:
+            self._digits = digits
+            self.configure(width=self.font.measure("9" * digits) + 18)
+            for item, y, _ in self._slots:
+                if y is not None:
+                    self.coords(item, int(self.cget("width")) - 6, y)
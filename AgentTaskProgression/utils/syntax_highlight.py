@@ -3,12 +3,88 @@ Syntax Highlighting Utilities
 """
 import tkinter as tk
 import re
+from bisect import bisect_right
+
+PYTHON_KEYWORDS = [
+    'and', 'as', 'assert', 'async', 'await', 'break', 'class', 'continue',
+    'def', 'del', 'elif', 'else', 'except', 'finally', 'for', 'from',
+    'global', 'if', 'import', 'in', 'is', 'lambda', 'nonlocal', 'not',
+    'or', 'pass', 'raise', 'return', 'try', 'while', 'with', 'yield'
+]
+PYTHON_BUILTINS = ['print', 'len', 'range', 'list', 'dict', 'set', 'str', 'int', 'float']
+
+# (tag, pattern) per language, earlier rules win where they overlap. A rule with a
+# capture group tags only that group.
+LANGUAGE_RULES = {
+    "python": [
+        ("string", r'"""[\s\S]*?"""'),
+        ("string", r"'''[\s\S]*?'''"),
+        ("string", r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"'),
+        ("string", r"'[^'\\\n]*(?:\\.[^'\\\n]*)*'"),
+        ("comment", r'#[^\n]*'),
+        ("function", r'(?<=\bdef)\s+(\w+)'),
+        ("keyword", r'\b(?:' + '|'.join(PYTHON_KEYWORDS) + r')\b'),
+        ("builtin", r'\b(?:' + '|'.join(PYTHON_BUILTINS) + r')\b'),
+        ("number", r'\b\d+\.?\d*\b'),
+    ],
+    "json": [
+        ("json_key", r'"(?:[^"\\\n]|\\.)*"(?=\s*:)'),
+        ("json_string", r'"(?:[^"\\\n]|\\.)*"'),
+        ("json_number", r'-?\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b'),
+        ("json_boolean", r'\b(?i:true|false|null)\b'),
+    ],
+    "markdown": [
+        ("md_code", r'```[\s\S]*?```'),
+        ("md_code", r'`.+?`'),
+        ("md_header", r'^#+.+$'),
+        ("md_bold", r'\*\*.+?\*\*|__.+?__'),
+        ("md_italic", r'\*.+?\*|_.+?_'),
+    ],
+}
+LANGUAGE_TAGS = {
+    "python": ["keyword", "string", "comment", "function", "number", "builtin"],
+    "json": ["json_key", "json_string", "json_number", "json_boolean"],
+    "markdown": ["md_header", "md_bold", "md_italic", "md_code"],
+}
+TAG_BATCH = 2000                # Ranges per tag_add call
+
+_NEWLINE = re.compile("\n")
+_SCANNERS = {}
+
+
+def get_scanner(language):
+    """One alternation regex for a language's rules, and match group -> (tag, group to tag)"""
+    scanner = _SCANNERS.get(language)
+    if scanner is None:
+        parts, groups, index = [], {}, 1
+        for tag, pattern in LANGUAGE_RULES[language]:
+            inner = re.compile(pattern).groups
+            parts.append(f"({pattern})")
+            groups[index] = (tag, index + 1 if inner else index)
+            index += 1 + inner
+        scanner = _SCANNERS[language] = (re.compile("|".join(parts), re.MULTILINE), groups)
+    return scanner
+
+
+def scan(text, language):
+    """Single pass over text: {tag: [(start offset, end offset), ...]}"""
+    pattern, groups = get_scanner(language)
+    ranges = {tag: [] for tag in LANGUAGE_TAGS[language]}
+    for match in pattern.finditer(text):
+        tag, group = groups[match.lastindex]
+        start, end = match.span(group)
+        if start < end:
+            ranges[tag].append((start, end))
+    return ranges
+
 
 class SyntaxHighlighter:
     def __init__(self, text_widget):
         self.text_widget = text_widget
+        self._snapshot = None           # (text, line start offsets) of the last read
+        self._applied = None            # Language whose tags match the snapshot
         self.setup_tags()
-        
+
     def setup_tags(self):
         """Setup syntax highlighting tags"""
         # Python
@@ -18,111 +94,72 @@ class SyntaxHighlighter:
         self.text_widget.tag_configure("function", foreground="#dcdcaa")
         self.text_widget.tag_configure("number", foreground="#b5cea8")
         self.text_widget.tag_configure("builtin", foreground="#569cd6")
-        
+
         # JSON
         self.text_widget.tag_configure("json_key", foreground="#9cdcfe")
         self.text_widget.tag_configure("json_string", foreground="#ce9178")
         self.text_widget.tag_configure("json_number", foreground="#b5cea8")
         self.text_widget.tag_configure("json_boolean", foreground="#569cd6")
-        
+
         # Markdown
         self.text_widget.tag_configure("md_header", foreground="#569cd6", font=("Consolas", 11, "bold"))
         self.text_widget.tag_configure("md_bold", foreground="#dcdcaa", font=("Consolas", 11, "bold"))
         self.text_widget.tag_configure("md_italic", foreground="#dcdcaa", font=("Consolas", 11, "italic"))
         self.text_widget.tag_configure("md_code", foreground="#ce9178", background="#1e1e1e")
-        
+
     def highlight_python(self, event=None):
         """Highlight Python syntax"""
-        # Remove previous tags
-        for tag in ["keyword", "string", "comment", "function", "number", "builtin"]:
-            self.text_widget.tag_remove(tag, "1.0", "end")
-        
-        # Get text
-        text = self.text_widget.get("1.0", "end-1c")
-        
-        # Keywords
-        python_keywords = [
-            'and', 'as', 'assert', 'async', 'await', 'break', 'class', 'continue',
-            'def', 'del', 'elif', 'else', 'except', 'finally', 'for', 'from',
-            'global', 'if', 'import', 'in', 'is', 'lambda', 'nonlocal', 'not',
-            'or', 'pass', 'raise', 'return', 'try', 'while', 'with', 'yield'
-        ]
-        
-        # Find and tag keywords
-        for keyword in python_keywords:
-            pattern = r'\b' + keyword + r'\b'
-            self.highlight_pattern(pattern, "keyword")
-        
-        # Strings
-        self.highlight_pattern(r'"[^"\\]*(\\.[^"\\]*)*"', "string")
-        self.highlight_pattern(r"'[^'\\]*(\\.[^'\\]*)*'", "string")
-        self.highlight_pattern(r'"""[^"]*"""', "string", regex_flags=re.DOTALL)
-        self.highlight_pattern(r"'''[^']*'''", "string", regex_flags=re.DOTALL)
-        
-        # Comments
-        self.highlight_pattern(r'#.*$', "comment", regex_flags=re.MULTILINE)
-        
-        # Functions
-        self.highlight_pattern(r'\bdef\s+(\w+)', "function")
-        
-        # Numbers
-        self.highlight_pattern(r'\b\d+\.?\d*\b', "number")
-        
-        # Builtins
-        builtins = ['print', 'len', 'range', 'list', 'dict', 'set', 'str', 'int', 'float']
-        for builtin in builtins:
-            pattern = r'\b' + builtin + r'\b'
-            self.highlight_pattern(pattern, "builtin")
-    
+        self.highlight("python")
+
     def highlight_json(self, event=None):
         """Highlight JSON syntax"""
-        # Remove previous tags
-        for tag in ["json_key", "json_string", "json_number", "json_boolean"]:
-            self.text_widget.tag_remove(tag, "1.0", "end")
-        
-        # Keys
-        self.highlight_pattern(r'"([^"]+)"\s*:', "json_key")
-        
-        # Strings (values)
-        self.highlight_pattern(r':\s*"([^"]+)"', "json_string")
-        
-        # Numbers
-        self.highlight_pattern(r':\s*(\d+\.?\d*)', "json_number")
-        
-        # Booleans and null
-        self.highlight_pattern(r':\s*(true|false|null)', "json_boolean", regex_flags=re.IGNORECASE)
-    
+        self.highlight("json")
+
     def highlight_markdown(self, event=None):
         """Highlight Markdown syntax"""
-        # Remove previous tags
-        for tag in ["md_header", "md_bold", "md_italic", "md_code"]:
+        self.highlight("markdown")
+
+    def highlight(self, language):
+        """Scan the text once and retag it; nothing is done if text and language are unchanged"""
+        text, line_starts = self._read()
+        if self._applied == language:
+            return
+        ranges = scan(text, language)
+        for tag in LANGUAGE_TAGS[language]:
             self.text_widget.tag_remove(tag, "1.0", "end")
-        
-        # Headers
-        self.highlight_pattern(r'^#+.+$', "md_header", regex_flags=re.MULTILINE)
-        
-        # Bold
-        self.highlight_pattern(r'\*\*.+?\*\*', "md_bold")
-        self.highlight_pattern(r'__.+?__', "md_bold")
-        
-        # Italic
-        self.highlight_pattern(r'\*.+?\*', "md_italic")
-        self.highlight_pattern(r'_.+?_', "md_italic")
-        
-        # Code
-        self.highlight_pattern(r'`.+?`', "md_code")
-        self.highlight_pattern(r'```[\s\S]*?```', "md_code")
-    
+        self._apply(ranges, line_starts)
+        self._applied = language
+
     def highlight_pattern(self, pattern, tag, regex_flags=0):
         """Highlight a regex pattern with a tag"""
+        text, line_starts = self._read()
+        self._applied = None
+        self._apply({tag: [m.span() for m in re.finditer(pattern, text, regex_flags)]}, line_starts)
+
+    def _read(self):
+        """Widget text and its line start offsets, reusing the previous snapshot if unchanged"""
         text = self.text_widget.get("1.0", "end-1c")
-        matches = re.finditer(pattern, text, regex_flags)
-        
-        for match in matches:
-            start = f"1.0+{match.start()}c"
-            end = f"1.0+{match.end()}c"
-            self.text_widget.tag_add(tag, start, end)
-    
+        if self._snapshot is None or self._snapshot[0] != text:
+            self._snapshot = (text, [0] + [m.end() for m in _NEWLINE.finditer(text)])
+            self._applied = None
+        return self._snapshot
+
+    def _apply(self, ranges, line_starts):
+        """Tag offset ranges using line.col indices, many ranges per tag_add call"""
+        last = len(line_starts) - 1
+        for tag, spans in ranges.items():
+            line = 0                    # Spans are ascending, so the line only moves forward
+            for i in range(0, len(spans), TAG_BATCH):
+                indices = []
+                for start, end in spans[i:i + TAG_BATCH]:
+                    while line < last and line_starts[line + 1] <= start:
+                        line += 1
+                    end_line = line if line == last or end < line_starts[line + 1] else \
+                        bisect_right(line_starts, end, line) - 1
+                    indices += (f"{line + 1}.{start - line_starts[line]}",
+                                f"{end_line + 1}.{end - line_starts[end_line]}")
+                self.text_widget.tag_add(tag, *indices)
+
     def auto_highlight(self, filename):
         """Auto-detect language and highlight"""
         if filename.endswith('.py'):
@@ -130,4 +167,4 @@ class SyntaxHighlighter:
         elif filename.endswith('.json'):
             self.highlight_json()
         elif filename.endswith('.md'):
-            self.highlight_markdown()
\ No newline at end of file
+            self.highlight_markdown()